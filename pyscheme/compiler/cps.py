@@ -17,15 +17,43 @@
 
 
 # This code originally translated from Andrew Appel "Compiling with Continuations"
+#
+# Beyond the IR itself this module has the rest of a CPS backend:
+#
+# * a Converter from resolved Expr trees to the IR. Each Expr class converts itself with its `convert` method,
+#   much as it compiles itself with `compile`.
+# * optimisation passes over the IR, in the optimise module,
+# * closure conversion, which turns each FIX into RECORDs of a function's label and the free variables it needs,
+#   leaving only closed functions that fetch their free variables from their closure record with SELECT.
+# * an assembler from closed functions to flat tuples of instructions over numbered registers,
+# * and `run`, the machine that executes them, jumping from function to function in a loop.
+#
+# pyscheme closures, continuations and everything else the rest of the interpreter deals in are unchanged:
+# a converted lambda is still an ordinary Closure, with a body that runs on the machine when applied,
+# so converted and compiled code can call each other freely.
 
 from enum import Enum, auto
-from typing import List, Tuple
+from typing import Callable, List, Tuple
+from .. import ambivalence
+from .. import environment
+from .. import expr
+from .. import trampoline
+from .. import types
+from ..exceptions import PySchemeInternalError
+from . import optimise
+
+
+class Config:
+    enabled = False  # run top-level expressions on the CPS machine instead of as compiled closures
 
 
 class var:
     def __init__(self, name: str):
         self.name = name
 
+    def __repr__(self):
+        return self.name
+
 
 class value:
     """
@@ -60,6 +88,14 @@ class STRING(value):
         self.string = s
 
 
+class CONST(value):
+    """
+    any pyscheme value known at conversion time, i.e. a constant, a symbol or a builtin operator
+    """
+    def __init__(self, e: 'expr.Expr'):
+        self.expr = e
+
+
 class accesspath:
     pass
 
@@ -88,7 +124,43 @@ class primop(Enum):
     lt = auto()
     ge = auto()
     le = auto()
-    # etc.
+    xor = auto()
+    not_ = auto()
+    cons = auto()
+    append = auto()
+    head = auto()
+    tail = auto()
+    length = auto()
+    list = auto()  # the arguments as a pyscheme list
+    istrue = auto()  # branches, booleans are three-valued so neither is the negation of the other
+    isfalse = auto()
+    lookup = auto()  # [env, CONST(symbol), INT(depth)] or [env, CONST(symbol), INT(depth), INT(index)]
+    define = auto()  # [env, CONST(symbol), value], no results
+    extend = auto()  # [env, CONST(layout)], a new frame
+    closure = auto()  # [CONST(maker), values...], a pyscheme closure made by calling maker(values...)
+    wrap = auto()  # [env], an EnvironmentWrapper
+    unwrap = auto()  # [wrapper], the environment in it
+    primitive = auto()  # [function], branches on whether the function takes evaluated arguments
+    choice = auto()  # [alternative], like Appel's sethdlr: backtracking continues with alternative()
+    back = auto()  # no arguments and no continuation, backtracks
+    special = auto()  # [function, CONST(arguments), env, k], applies a special form, no continuation
+    eval = auto()  # [CONST(code), env, k], runs compiled code, no continuation
+
+
+# the number of arguments of the primops that take a fixed number of them
+arity = {
+    primop.mul: 2, primop.add: 2, primop.sub: 2, primop.div: 2, primop.mod: 2, primop.exp: 2,
+    primop.eq: 2, primop.ne: 2, primop.gt: 2, primop.lt: 2, primop.ge: 2, primop.le: 2,
+    primop.xor: 2, primop.not_: 1,
+    primop.cons: 2, primop.append: 2, primop.head: 1, primop.tail: 1, primop.length: 1,
+}
+
+# the primops that have no effect and can't fail, so can be dropped when their result is unused
+pure = {
+    primop.mul, primop.add, primop.sub,
+    primop.eq, primop.ne, primop.gt, primop.lt, primop.ge, primop.le, primop.xor, primop.not_,
+    primop.cons, primop.list, primop.extend, primop.closure, primop.wrap, primop.unwrap,
+}
 
 
 class cexp:
@@ -216,3 +288,524 @@ class PRIMOP(cexp):
         self.args = args
         self.results = results
         self.cexps = cexps
+
+
+MetaContinuation = Callable[[value], cexp]  # makes the rest of a CPS expression from a value
+
+
+class Tail:
+    """
+    the meta-continuation of an expression in tail position: pass its value to the continuation k
+    """
+    def __init__(self, k: value):
+        self.k = k
+
+    def __call__(self, v: value) -> cexp:
+        return APP(self.k, [v])
+
+
+class Converter:
+    """
+    converts resolved expressions to CPS, and runs them.
+    Builtin operators found in `globals`, the top-level frame, are applied in-line where possible.
+    """
+
+    def __init__(self, globals: 'environment.Frame'):
+        self.globals = globals
+        self.counter = 0
+        self.optimiser = optimise.Optimiser()
+
+    def var(self, name: str) -> var:
+        self.counter += 1
+        return var(name + str(self.counter))
+
+    @classmethod
+    def tail(cls, k: value) -> Tail:
+        return Tail(k)
+
+    def reify(self, c: MetaContinuation, f: Callable[[value], cexp]) -> cexp:
+        """
+        call f with a continuation function for c, which is just k if c is already Tail(k).
+        used wherever the rest of the expression would otherwise be duplicated or has to be passed as a value
+        """
+        if type(c) is Tail:
+            return f(c.k)
+        k = self.var('k')
+        x = self.var('x')
+        return FIX([(k, [x], c(VAR(x)))], f(VAR(k)))
+
+    def each(self, exprs: list, env: value, c: Callable[[List[value]], cexp]) -> cexp:
+        """
+        convert each expression in turn, then pass the list of their values to c
+        """
+        def convert_from(index: int, values: list) -> cexp:
+            while index < len(exprs) and exprs[index].self_evaluating():  # no need to nest for constants
+                values = values + [CONST(exprs[index])]
+                index += 1
+            if index == len(exprs):
+                return c(values)
+            return exprs[index].convert(self, env, lambda v: convert_from(index + 1, values + [v]))
+        return convert_from(0, [])
+
+    def primop(self, prim: primop, args: List[value], c: MetaContinuation) -> cexp:
+        result = self.var('w')
+        return PRIMOP(prim, args, [result], [c(VAR(result))])
+
+    @classmethod
+    def branch(cls, prim: primop, v: value, consequent: cexp, alternative: cexp) -> cexp:
+        return PRIMOP(prim, [v], [], [consequent, alternative])
+
+    def lookup(self, env: value, symbol: 'expr.Symbol', depth: int, index: 'types.Maybe[int]',
+               c: MetaContinuation) -> cexp:
+        address = [INT(depth)] if index is None else [INT(depth), INT(index)]
+        return self.primop(primop.lookup, [env, CONST(symbol)] + address, c)
+
+    def apply(self, function: value, operands: list, env: value, c: MetaContinuation,
+              primitive: 'types.Maybe[bool]'=None) -> cexp:
+        """
+        apply a function, evaluating the operands first unless it turns out to be a special form.
+        `primitive` says which it is if that is already known.
+        """
+        def evaluated(k: value) -> cexp:
+            return self.each(operands, env, lambda args: APP(function, args + [k]))
+
+        def unevaluated(k: value) -> cexp:
+            args = expr.make_list([self.compiled(operand) for operand in operands])
+            return PRIMOP(primop.special, [function, CONST(args), env, k], [], [])
+
+        def applied(k: value) -> cexp:
+            if primitive is None:
+                return self.branch(primop.primitive, function, evaluated(k), unevaluated(k))
+            return evaluated(k) if primitive else unevaluated(k)
+        return self.reify(c, applied)
+
+    def foreign(self, e: 'expr.Expr', env: value, c: MetaContinuation) -> cexp:
+        """
+        evaluate an expression with no conversion of its own by running its compiled code
+        """
+        return self.reify(c, lambda k: PRIMOP(primop.eval, [CONST(e.compile()), env, k], [], []))
+
+    def builtin(self, operation: 'expr.Expr') -> 'types.Maybe[expr.Op]':
+        """
+        the builtin operator an operation refers to, if it does.
+        The top level can't redefine a builtin, so a reference that reaches it always finds the same one.
+        """
+        if type(operation) is expr.Reference and operation.top_level:
+            value = self.globals.local(operation.symbol)
+            if isinstance(value, expr.Op) and value.static_type():
+                return value
+        return None
+
+    def compiled(self, e: 'expr.Expr') -> 'expr.Compiled':
+        """
+        stands in for an expression where an Expr is wanted, i.e. the body of a closure,
+        converting it the first time it is evaluated
+        """
+        code = None
+
+        def evaluate(env: 'environment.Environment', ret: 'types.Continuation',
+                     amb: ambivalence.Amb) -> 'types.Promise':
+            nonlocal code
+            if code is None:
+                code = self.program(e)
+            return code(env, ret, amb)
+        return expr.Compiled(evaluate, e)
+
+    def convert(self, e: 'expr.Expr') -> Tuple[var, var, cexp]:
+        """
+        the CPS expression for a whole expression, with its environment and continuation
+        """
+        env = self.var('env')
+        k = self.var('k')
+        return env, k, e.convert(self, VAR(env), Tail(VAR(k)))
+
+    def program(self, e: 'expr.Expr') -> 'types.Code':
+        """
+        convert an expression to code for the machine, a function of (env, ret, amb) like any other
+        """
+        env, k, body = self.convert(e)
+        body = self.optimiser.optimise(body)
+        closure = (assemble(ClosureConverter().convert_program([env, k], body)),)
+
+        def evaluate(env: 'environment.Environment', ret: 'types.Continuation',
+                     amb: ambivalence.Amb) -> 'types.Promise':
+            return run(closure, (env, ret), amb)
+        return evaluate
+
+
+def variables(v: value) -> list:
+    return [v.var] if type(v) is VAR else []
+
+
+def free_variables(c: cexp, memo: dict) -> dict:
+    """
+    the variables c uses but does not bind, in order of first use, as the keys of a dict.
+    Every variable is bound exactly once, which the converter guarantees by making them all fresh.
+    """
+    key = id(c)
+    if key in memo:
+        return memo[key]
+    free = {}
+    if type(c) is RECORD:
+        for v, _ in c.tuples:
+            free.update(dict.fromkeys(variables(v)))
+        free.update((v, None) for v in free_variables(c.cexp, memo) if v is not c.var)
+    elif type(c) in (SELECT, OFFSET):
+        free.update(dict.fromkeys(variables(c.value)))
+        free.update((v, None) for v in free_variables(c.cexp, memo) if v is not c.var)
+    elif type(c) is APP:
+        free.update(dict.fromkeys(variables(c.function)))
+        for v in c.arguments:
+            free.update(dict.fromkeys(variables(v)))
+    elif type(c) is FIX:
+        bound = {f for f, _, _ in c.functions}
+        for f, params, body in c.functions:
+            free.update((v, None) for v in free_variables(body, memo) if v not in params)
+        free.update(free_variables(c.cexp, memo))
+        free = {v: None for v in free if v not in bound}
+    elif type(c) is SWITCH:
+        free.update(dict.fromkeys(variables(c.value)))
+        for branch in c.cexps:
+            free.update(free_variables(branch, memo))
+    elif type(c) is PRIMOP:
+        for v in c.args:
+            free.update(dict.fromkeys(variables(v)))
+        for branch in c.cexps:
+            free.update((v, None) for v in free_variables(branch, memo) if v not in c.results)
+    else:
+        raise PySchemeInternalError("unrecognised cexp " + str(type(c)))
+    memo[key] = free
+    return free
+
+
+class ClosureConverter:
+    """
+    Appel's closure conversion, simplified by the converter never making a recursive FIX:
+    recursion in pyscheme goes through the environment.
+
+    Each function defined by a FIX is lifted out as a closed function with an extra last parameter,
+    its closure. The FIX becomes a RECORD for each function of its label followed by its free variables,
+    which the lifted function SELECTs from its closure on entry.
+    A function is called by APP of its closure record, the machine finds the label in field 0.
+    """
+
+    def __init__(self):
+        self.functions = []
+        self.memo = {}
+
+    def convert_program(self, params: List[var], body: cexp) -> list:
+        """
+        returns the closed functions as (label, params, body), starting with the one for the program itself
+        """
+        free = free_variables(body, self.memo)
+        if any(v not in params for v in free):
+            raise PySchemeInternalError("free variables in program " + str(list(free)))
+        self.function(var('program'), params, [], body)
+        self.functions.insert(0, self.functions.pop())
+        return self.functions
+
+    def function(self, label: var, params: List[var], free: List[var], body: cexp):
+        closure = var('closure')
+        body = self.convert(body)
+        for index in reversed(range(len(free))):
+            body = SELECT(index + 1, VAR(closure), free[index], body)
+        self.functions.append((label, params + [closure], body))
+
+    def convert(self, c: cexp) -> cexp:
+        if type(c) is RECORD:
+            return RECORD(c.tuples, c.var, self.convert(c.cexp))
+        elif type(c) in (SELECT, OFFSET):
+            return type(c)(c.int, c.value, c.var, self.convert(c.cexp))
+        elif type(c) is APP:
+            return c
+        elif type(c) is FIX:
+            bound = {f for f, _, _ in c.functions}
+            records = []
+            for f, params, body in c.functions:
+                free = [v for v in free_variables(body, self.memo) if v not in params]
+                if any(v in bound for v in free):
+                    raise PySchemeInternalError("recursive FIX " + str(f))
+                label = var(f.name)
+                self.function(label, params, free, body)
+                records.append((f, label, free))
+            result = self.convert(c.cexp)
+            for f, label, free in reversed(records):
+                fields = [(LABEL(label), OFFp(0))] + [(VAR(v), OFFp(0)) for v in free]
+                result = RECORD(fields, f, result)
+            return result
+        elif type(c) is SWITCH:
+            return SWITCH(c.value, [self.convert(branch) for branch in c.cexps])
+        elif type(c) is PRIMOP:
+            return PRIMOP(c.primop, c.args, c.results, [self.convert(branch) for branch in c.cexps])
+        raise PySchemeInternalError("unrecognised cexp " + str(type(c)))
+
+
+# Machine instructions are tuples of an opcode then its operands, mostly register numbers,
+# with the instruction to continue with last. They are made from cexps by the Assembler.
+
+RECORD_ = 0  # (RECORD_, registers, result, next)
+SELECT_ = 1  # (SELECT_, index, record, result, next)
+APP_ = 2  # (APP_, function, registers)
+SWITCH_ = 3  # (SWITCH_, register, branches)
+CALL1 = 4  # (CALL1, fn, a, result, next)  result = fn(a)
+CALL2 = 5  # (CALL2, fn, a, b, result, next)  result = fn(a, b)
+CALLN = 6  # (CALLN, fn, registers, result, next)  result = fn(*registers)
+BRANCH = 7  # (BRANCH, fn, a, consequent, alternative)  consequent if fn(a) else alternative
+LOOKUP = 8  # (LOOKUP, env, symbol, depth, index, result, next)
+DEFINE = 9  # (DEFINE, env, symbol, value, next)
+CHOICE = 10  # (CHOICE, alternative, next)
+BACK = 11  # (BACK,)
+SPECIAL = 12  # (SPECIAL, function, arguments, env, k)
+EVAL = 13  # (EVAL, code, env, k)
+EXTEND = 14  # (EXTEND, env, layout, result, next)
+
+
+class Function:
+    """
+    an assembled closed function.
+    `registers` is the initial content of its registers: its parameters and results first, then its constants
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.registers = []
+        self.body = None
+
+    def __repr__(self):
+        return 'Function(' + self.name + ')'
+
+
+def operations() -> dict:
+    """
+    the primops that just compute a value or test one, by the machine instruction and python function for each
+    """
+    def make_list(*values) -> 'expr.LinkedList':
+        return expr.make_list(values)
+
+    return {
+        primop.add: (CALL2, lambda a, b: a + b),
+        primop.sub: (CALL2, lambda a, b: a - b),
+        primop.mul: (CALL2, lambda a, b: a * b),
+        primop.div: (CALL2, lambda a, b: a // b),
+        primop.mod: (CALL2, lambda a, b: a % b),
+        primop.exp: (CALL2, lambda a, b: a ** b),
+        primop.eq: (CALL2, lambda a, b: a.eq(b)),
+        primop.ne: (CALL2, lambda a, b: a.ne(b)),
+        primop.gt: (CALL2, lambda a, b: a.gt(b)),
+        primop.lt: (CALL2, lambda a, b: a.lt(b)),
+        primop.ge: (CALL2, lambda a, b: a.ge(b)),
+        primop.le: (CALL2, lambda a, b: a.le(b)),
+        primop.xor: (CALL2, lambda a, b: a ^ b),
+        primop.not_: (CALL1, lambda a: ~a),
+        primop.cons: (CALL2, expr.Pair),
+        primop.append: (CALL2, lambda a, b: a.concat(b)),
+        primop.head: (CALL1, lambda a: a.car()),
+        primop.tail: (CALL1, lambda a: a.cdr()),
+        primop.length: (CALL1, lambda a: expr.make_number(len(a))),
+        primop.list: (CALLN, make_list),
+        primop.wrap: (CALL1, expr.EnvironmentWrapper),
+        primop.unwrap: (CALL1, lambda wrapper: wrapper.env()),
+        primop.istrue: (BRANCH, lambda a: a.is_true()),
+        primop.isfalse: (BRANCH, lambda a: a.is_false()),
+        primop.primitive: (BRANCH, lambda f: isinstance(f, expr.Primitive)),
+    }
+
+
+class Assembler:
+    """
+    assembles one closed function, giving each of its variables and constants a register
+    """
+
+    def __init__(self, function: Function, labels: dict, operations: dict):
+        self.function = function
+        self.labels = labels
+        self.operations = operations
+        self.registers = {}
+
+    def assemble(self, params: List[var], body: cexp):
+        for param in params:
+            self.bind(param)
+        self.function.body = self.instruction(body)
+
+    def bind(self, v: var) -> int:
+        self.registers[v] = len(self.function.registers)
+        self.function.registers.append(None)
+        return self.registers[v]
+
+    def constant(self, value) -> int:
+        self.function.registers.append(value)
+        return len(self.function.registers) - 1
+
+    def operand(self, v: value) -> int:
+        if type(v) is VAR:
+            if v.var not in self.registers:
+                raise PySchemeInternalError("unbound variable " + repr(v.var))
+            return self.registers[v.var]
+        return self.constant(self.literal(v))
+
+    def literal(self, v: value):
+        if type(v) is CONST:
+            return v.expr
+        elif type(v) is INT:
+            return v.int
+        elif type(v) is STRING:
+            return v.string
+        elif type(v) is REAL:
+            return float(v.real)
+        elif type(v) is LABEL:
+            return self.labels[v.var]
+        raise PySchemeInternalError("not a literal " + str(type(v)))
+
+    def instruction(self, c: cexp) -> tuple:
+        if type(c) is RECORD:
+            if any(type(path) is not OFFp or path.int != 0 for _, path in c.tuples):
+                raise PySchemeInternalError("unsupported access path")
+            fields = tuple(self.operand(v) for v, _ in c.tuples)
+            return RECORD_, fields, self.bind(c.var), self.instruction(c.cexp)
+        elif type(c) is SELECT:
+            record = self.operand(c.value)
+            return SELECT_, c.int, record, self.bind(c.var), self.instruction(c.cexp)
+        elif type(c) is APP:
+            return APP_, self.operand(c.function), tuple(self.operand(v) for v in c.arguments)
+        elif type(c) is SWITCH:
+            return SWITCH_, self.operand(c.value), tuple(self.instruction(branch) for branch in c.cexps)
+        elif type(c) is PRIMOP:
+            return self.primop(c)
+        raise PySchemeInternalError("cannot assemble " + str(type(c)))
+
+    def primop(self, c: PRIMOP) -> tuple:
+        prim = c.primop
+        args = c.args
+        if prim in self.operations:
+            opcode, fn = self.operations[prim]
+            if opcode is BRANCH:
+                return BRANCH, fn, self.operand(args[0]), self.instruction(c.cexps[0]), self.instruction(c.cexps[1])
+            operands = tuple(self.operand(v) for v in args)
+            if opcode is CALL1:
+                return (CALL1, fn) + operands + (self.bind(c.results[0]), self.instruction(c.cexps[0]))
+            elif opcode is CALL2:
+                return (CALL2, fn) + operands + (self.bind(c.results[0]), self.instruction(c.cexps[0]))
+            return CALLN, fn, operands, self.bind(c.results[0]), self.instruction(c.cexps[0])
+        elif prim is primop.closure:
+            maker = self.literal(args[0])
+            operands = tuple(self.operand(v) for v in args[1:])
+            if len(operands) == 1:
+                return CALL1, maker, operands[0], self.bind(c.results[0]), self.instruction(c.cexps[0])
+            return CALLN, maker, operands, self.bind(c.results[0]), self.instruction(c.cexps[0])
+        elif prim is primop.lookup:
+            env = self.operand(args[0])
+            symbol = self.literal(args[1])
+            depth = self.literal(args[2])
+            index = self.literal(args[3]) if len(args) == 4 else None
+            return LOOKUP, env, symbol, depth, index, self.bind(c.results[0]), self.instruction(c.cexps[0])
+        elif prim is primop.extend:
+            return EXTEND, self.operand(args[0]), self.literal(args[1]), self.bind(c.results[0]), \
+                self.instruction(c.cexps[0])
+        elif prim is primop.define:
+            return DEFINE, self.operand(args[0]), self.literal(args[1]), self.operand(args[2]), \
+                self.instruction(c.cexps[0])
+        elif prim is primop.choice:
+            return CHOICE, self.operand(args[0]), self.instruction(c.cexps[0])
+        elif prim is primop.back:
+            return BACK,
+        elif prim is primop.special:
+            return (SPECIAL,) + tuple(self.operand(v) for v in args)
+        elif prim is primop.eval:
+            return EVAL, self.literal(args[0]), self.operand(args[1]), self.operand(args[2])
+        raise PySchemeInternalError("cannot assemble " + str(prim))
+
+
+def assemble(functions: list) -> Function:
+    """
+    assemble the closed functions from a ClosureConverter, returning the first
+    """
+    labels = {label: Function(label.name) for label, _, _ in functions}
+    table = operations()
+    for label, params, body in functions:
+        Assembler(labels[label], labels, table).assemble(params, body)
+    return labels[functions[0][0]]
+
+
+def continuation(k) -> 'types.Continuation':
+    """
+    a continuation for the rest of the interpreter from a machine value passed as k,
+    either a closure record to resume the machine with or a continuation from outside it already
+    """
+    if type(k) is tuple:
+        return lambda value, amb: run(k, (value,), amb)
+    return k
+
+
+def backtrack(alternative: tuple, amb: ambivalence.Amb) -> ambivalence.Amb:
+    def alternative_amb() -> 'types.Promise':
+        return trampoline.call(run, alternative, (), amb)
+    return ambivalence.Amb(alternative_amb, amb.cut())
+
+
+def run(closure: tuple, args: tuple, amb: ambivalence.Amb) -> 'types.Promise':
+    """
+    call the function in a closure record with args, and run until control leaves the machine:
+    to apply a pyscheme function, to continue with a continuation from outside, or to backtrack.
+    Calls between the machine's own functions are jumps round the outer loop, the python stack does not grow.
+    """
+    while True:
+        function = closure[0]
+        regs = function.registers.copy()
+        arity = len(args)
+        regs[:arity] = args
+        regs[arity] = closure
+        instruction = function.body
+        while True:
+            op = instruction[0]
+            if op == LOOKUP:
+                regs[instruction[5]] = regs[instruction[1]].value_at(instruction[2], instruction[3], instruction[4])
+                instruction = instruction[6]
+            elif op == CALL2:
+                regs[instruction[4]] = instruction[1](regs[instruction[2]], regs[instruction[3]])
+                instruction = instruction[5]
+            elif op == APP_:
+                f = regs[instruction[1]]
+                args = tuple([regs[register] for register in instruction[2]])
+                if type(f) is tuple:
+                    closure = f
+                    break
+                elif isinstance(f, expr.Expr):
+                    return f.apply_evaluated_args(expr.make_arguments(args[:-1]), continuation(args[-1]), amb)
+                else:
+                    return trampoline.call(f, args[0], amb)
+            elif op == BRANCH:
+                if instruction[1](regs[instruction[2]]):
+                    instruction = instruction[3]
+                else:
+                    instruction = instruction[4]
+            elif op == RECORD_:
+                regs[instruction[2]] = tuple([regs[register] for register in instruction[1]])
+                instruction = instruction[3]
+            elif op == SELECT_:
+                regs[instruction[3]] = regs[instruction[2]][instruction[1]]
+                instruction = instruction[4]
+            elif op == CALL1:
+                regs[instruction[3]] = instruction[1](regs[instruction[2]])
+                instruction = instruction[4]
+            elif op == CALLN:
+                regs[instruction[3]] = instruction[1](*[regs[register] for register in instruction[2]])
+                instruction = instruction[4]
+            elif op == DEFINE:
+                amb = regs[instruction[1]].define_value(instruction[2], regs[instruction[3]], amb)
+                instruction = instruction[4]
+            elif op == EXTEND:
+                regs[instruction[3]] = regs[instruction[1]].extend(layout=instruction[2], amb=amb)
+                instruction = instruction[4]
+            elif op == CHOICE:
+                amb = backtrack(regs[instruction[1]], amb)
+                instruction = instruction[2]
+            elif op == SWITCH_:
+                instruction = instruction[2][regs[instruction[1]]]
+            elif op == BACK:
+                return amb
+            elif op == SPECIAL:
+                f, arguments, env, k = [regs[register] for register in instruction[1:]]
+                return f.apply(arguments, env, continuation(k), amb)
+            elif op == EVAL:
+                return instruction[1](regs[instruction[2]], continuation(regs[instruction[3]]), amb)
+            else:
+                raise PySchemeInternalError("bad instruction " + str(op))
@@ -0,0 +1,265 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Compiles the formal arguments of the components of a composite function into a decision tree,
+# after Maranget "Compiling Pattern Matching to Good Decision Trees", as docs/compiler.md sketches.
+#
+# At run time the tree works on a list of registers, starting with the actual arguments.
+# A Switch looks at one register and picks a branch by its constructor's tag, list shape or constant value,
+# appending the fields of the value to the registers as it goes, so each value is only ever examined once.
+# A Leaf names the component that matches, and the registers holding each of its variables.
+# A variable that appears twice in the same formal arguments, like `item` in `(item, item @ t)`,
+# becomes a guard on the leaf, with the rest of the components as its alternative.
+
+from typing import Dict, List, Optional
+from ..exceptions import PySchemeInternalError
+
+
+class Config:
+    enabled = True  # otherwise composite functions try each component in turn
+
+
+class Unsupported(Exception):
+    """
+    raised while building a tree from formal arguments it can't handle,
+    the composite function then just tries each component in turn
+    """
+    pass
+
+
+class Kind:
+    """
+    a family of tests on a value, i.e. list shapes, constructor tags or constants
+    """
+
+    def __init__(self, name: str, key: callable, fields: callable):
+        self.name = name
+        self.key = key  # value -> the key to pick a branch with
+        self.fields = fields  # value -> list of the values inside it
+
+    def __repr__(self):
+        return self.name
+
+
+LIST = Kind('list', lambda value: value.is_null(), lambda value: [] if value.is_null() else [value.car(), value.cdr()])
+TAG = Kind('tag', lambda value: value.tag, lambda value: list(value.values))
+CONSTANT = Kind('constant', lambda value: value.value(), lambda value: [])
+
+
+class Test:
+    """
+    what Expr.split returns for a formal argument that some values fail to match:
+    the value must have the key, then its fields must match the sub-patterns
+    """
+
+    def __init__(self, kind: Kind, key, patterns: list):
+        self.kind = kind
+        self.key = key
+        self.patterns = patterns
+
+
+class Bind:
+    """
+    what Expr.split returns for a formal argument that binds a symbol to the value,
+    which must also match pattern
+    """
+
+    def __init__(self, symbol, pattern):
+        self.symbol = symbol
+        self.pattern = pattern
+
+
+class Row:
+    """
+    one component part-way through matching: the tests still to make on each register,
+    and the registers its variables are bound to so far
+    """
+
+    def __init__(self, index: int, tests: Dict[int, Test], bindings: list):
+        self.index = index
+        self.tests = tests
+        self.bindings = bindings
+
+    def add(self, register: int, pattern, constructors: dict):
+        while pattern is not None:
+            split = pattern.split(constructors)
+            if type(split) is Bind:
+                self.bindings.append((split.symbol, register))
+                pattern = split.pattern
+            elif type(split) is Test:
+                self.tests[register] = split
+                pattern = None
+            elif split is not None:
+                raise PySchemeInternalError("bad split " + repr(split))
+            else:
+                pattern = None
+
+    def without(self, register: int) -> 'Row':
+        tests = dict(self.tests)
+        del tests[register]
+        return Row(self.index, tests, list(self.bindings))
+
+
+class Leaf:
+    def __init__(self, index: int, bindings: list, guards: list, otherwise: 'Tree'):
+        self.index = index  # of the component
+        self.bindings = bindings  # (symbol, register)
+        self.guards = guards  # (register, register) that must hold equal values
+        self.otherwise = otherwise  # if they don't
+
+    def __repr__(self):
+        return 'Leaf(' + str(self.index) + ')'
+
+
+class Switch:
+    def __init__(self, register: int, kind: Kind, branches: dict, default: 'Tree'):
+        self.register = register
+        self.kind = kind
+        self.branches = branches  # key -> Tree
+        self.default = default
+
+    def __repr__(self):
+        return 'Switch(' + str(self.register) + ', ' + repr(self.kind) + ', ' + repr(self.branches) +\
+               ', ' + repr(self.default) + ')'
+
+
+Tree = Optional[object]  # a Switch, a Leaf, or None for no match
+Split = Optional[object]  # a Test, a Bind, or None for a formal argument that matches anything
+
+
+def compile_rows(rows: List[Row], size: int, constructors: dict) -> Tree:
+    """
+    size is the number of registers in use at this point in the tree
+    """
+    if len(rows) == 0:
+        return None
+    first = rows[0]
+    if len(first.tests) == 0:
+        bindings = []
+        guards = []
+        seen = {}
+        for symbol, register in first.bindings:
+            if symbol in seen:
+                guards.append((seen[symbol], register))
+            else:
+                seen[symbol] = register
+                bindings.append((symbol, register))
+        otherwise = compile_rows(rows[1:], size, constructors) if guards else None
+        return Leaf(first.index, bindings, guards, otherwise)
+
+    register = min(first.tests)
+    kind = first.tests[register].kind
+    branches = {}
+    defaults = []
+    for row in rows:
+        test = row.tests.get(register)
+        if test is None:
+            defaults.append(row)
+        elif test.kind is not kind:
+            raise Unsupported()
+        elif test.key not in branches:
+            branches[test.key] = len(test.patterns)
+
+    for key, arity in branches.items():
+        specialised = []
+        for row in rows:
+            test = row.tests.get(register)
+            if test is None:
+                specialised.append(row)
+            elif test.key == key:
+                if len(test.patterns) != arity:
+                    raise Unsupported()
+                new_row = row.without(register)
+                for offset, pattern in enumerate(test.patterns):
+                    new_row.add(size + offset, pattern, constructors)
+                specialised.append(new_row)
+        branches[key] = compile_rows(specialised, size + arity, constructors)
+
+    return Switch(register, kind, branches, compile_rows(defaults, size, constructors))
+
+
+def compile_components(formal_args: list, constructors: dict) -> Tree:
+    """
+    formal_args is the LinkedList of formal arguments of each component, in order.
+    constructors maps the symbols in the formal arguments that name type constructors
+    to their tag and number of arguments.
+    """
+    rows = []
+    for index, fargs in enumerate(formal_args):
+        row = Row(index, {}, [])
+        for register, farg in enumerate(fargs):
+            row.add(register, farg, constructors)
+        rows.append(row)
+    size = max([len(fargs) for fargs in formal_args] + [0])
+    return compile_rows(rows, size, constructors)
+
+
+def select(tree: Tree, registers: list) -> 'Optional[Leaf]':
+    """
+    run the tree over the actual arguments, which it extends with their fields.
+    returns the Leaf of the first component that matches, or None
+    """
+    node = tree
+    while node is not None:
+        if type(node) is Switch:
+            value = registers[node.register]
+            branch = node.branches.get(node.kind.key(value), node)
+            if branch is node:
+                node = node.default
+            else:
+                registers.extend(node.kind.fields(value))
+                node = branch
+        else:
+            for first, second in node.guards:
+                if registers[first] != registers[second]:
+                    node = node.otherwise
+                    break
+            else:
+                return node
+    return None
+
+
+class Matcher:
+    """
+    the decision trees for one composite function.
+    Symbols in the formal arguments are constructors or variables depending on what they are defined as
+    where the function is created, and that also gives the constructors their tags,
+    so there's a tree for each combination seen.
+    """
+
+    def __init__(self, formal_args: list):
+        self.formal_args = formal_args
+        self.symbols = set()
+        for fargs in formal_args:
+            for farg in fargs:
+                farg.collect_symbols(self.symbols)
+        self.trees = {}
+
+    def tree(self, constructors: dict) -> Tree:
+        """
+        constructors maps those of self.symbols that name type constructors where the components were created
+        to their tag and number of arguments.
+        returns False if the formal arguments can't be compiled
+        """
+        key = frozenset(constructors.items())
+        if key not in self.trees:
+            try:
+                self.trees[key] = compile_components(self.formal_args, constructors)
+            except Unsupported:
+                self.trees[key] = False
+        return self.trees[key]
@@ -0,0 +1,353 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Optimisation passes over the CPS IR, after Appel "Compiling with Continuations" chapter 6.
+#
+# Each pass rewrites a whole cexp tree, and the Optimiser runs the configured passes in turn
+# for a few rounds, since each pass tends to expose more work for the others.
+# The passes rely on the converter making every variable fresh, so no substitution can capture a variable.
+
+from typing import Dict, List
+from . import cps
+from .. import expr
+from ..exceptions import PySchemeInternalError
+
+
+class Config:
+    passes = ['contract', 'fold', 'eliminate']  # in the order they run in each round
+    rounds = 4  # the most rounds, the optimiser stops early once a round changes nothing
+
+
+class Statistics:
+    def __init__(self):
+        self.programs = 0  # cexps optimised
+        self.rounds = 0  # rounds run over all of them
+        self.changes = {}  # rewrites made, by pass name
+
+    def __str__(self) -> str:
+        return 'programs: %d, rounds: %d, ' % (self.programs, self.rounds) + ', '.join(
+            '%s: %d' % (name, count) for name, count in self.changes.items()
+        )
+
+
+class Census:
+    """
+    counts the uses of each variable in a cexp, and how many of those are calls
+    """
+
+    def __init__(self, c: 'cps.cexp'):
+        self.uses = {}  # type: Dict['cps.var', int]
+        self.calls = {}  # type: Dict['cps.var', int]
+        self.count(c)
+
+    def use(self, v: 'cps.value'):
+        if type(v) is cps.VAR:
+            self.uses[v.var] = self.uses.get(v.var, 0) + 1
+
+    def count(self, c: 'cps.cexp'):
+        if type(c) is cps.RECORD:
+            for v, _ in c.tuples:
+                self.use(v)
+            self.count(c.cexp)
+        elif type(c) in (cps.SELECT, cps.OFFSET):
+            self.use(c.value)
+            self.count(c.cexp)
+        elif type(c) is cps.APP:
+            self.use(c.function)
+            if type(c.function) is cps.VAR:
+                self.calls[c.function.var] = self.calls.get(c.function.var, 0) + 1
+            for v in c.arguments:
+                self.use(v)
+        elif type(c) is cps.FIX:
+            for _, _, body in c.functions:
+                self.count(body)
+            self.count(c.cexp)
+        elif type(c) is cps.SWITCH:
+            self.use(c.value)
+            for branch in c.cexps:
+                self.count(branch)
+        elif type(c) is cps.PRIMOP:
+            for v in c.args:
+                self.use(v)
+            for branch in c.cexps:
+                self.count(branch)
+        else:
+            raise PySchemeInternalError("unrecognised cexp " + str(type(c)))
+
+    def unused(self, v: 'cps.var') -> bool:
+        return v not in self.uses
+
+
+class Pass:
+    """
+    rebuilds a cexp, substituting values for variables as it goes.
+    Subclasses override the methods for the nodes they rewrite, calling `changed` for each rewrite.
+    """
+    name = None
+
+    def __init__(self, statistics: Statistics):
+        self.statistics = statistics
+        self.census = None
+        self.substitution = {}  # type: Dict['cps.var', 'cps.value']
+
+    def run(self, c: 'cps.cexp') -> 'cps.cexp':
+        self.census = Census(c)
+        self.substitution = {}
+        return self.rewrite(c)
+
+    def changed(self):
+        self.statistics.changes[self.name] = self.statistics.changes.get(self.name, 0) + 1
+
+    def value(self, v: 'cps.value') -> 'cps.value':
+        while type(v) is cps.VAR and v.var in self.substitution:
+            v = self.substitution[v.var]
+        return v
+
+    def values(self, vs: 'List[cps.value]') -> 'List[cps.value]':
+        return [self.value(v) for v in vs]
+
+    def rewrite(self, c: 'cps.cexp') -> 'cps.cexp':
+        if type(c) is cps.RECORD:
+            return self.record(c)
+        elif type(c) is cps.SELECT:
+            return self.select(c)
+        elif type(c) is cps.OFFSET:
+            return cps.OFFSET(c.int, self.value(c.value), c.var, self.rewrite(c.cexp))
+        elif type(c) is cps.APP:
+            return self.app(c)
+        elif type(c) is cps.FIX:
+            return self.fix(c)
+        elif type(c) is cps.SWITCH:
+            return self.switch(c)
+        elif type(c) is cps.PRIMOP:
+            return self.primop(c)
+        raise PySchemeInternalError("unrecognised cexp " + str(type(c)))
+
+    def record(self, c: 'cps.RECORD') -> 'cps.cexp':
+        return cps.RECORD([(self.value(v), path) for v, path in c.tuples], c.var, self.rewrite(c.cexp))
+
+    def select(self, c: 'cps.SELECT') -> 'cps.cexp':
+        return cps.SELECT(c.int, self.value(c.value), c.var, self.rewrite(c.cexp))
+
+    def app(self, c: 'cps.APP') -> 'cps.cexp':
+        return cps.APP(self.value(c.function), self.values(c.arguments))
+
+    def fix(self, c: 'cps.FIX') -> 'cps.cexp':
+        return self.make_fix(c.functions, c.cexp)
+
+    def make_fix(self, functions: list, c: 'cps.cexp') -> 'cps.cexp':
+        functions = [(f, params, self.rewrite(body)) for f, params, body in functions]
+        c = self.rewrite(c)
+        if len(functions) == 0:
+            return c
+        return cps.FIX(functions, c)
+
+    def switch(self, c: 'cps.SWITCH') -> 'cps.cexp':
+        return cps.SWITCH(self.value(c.value), [self.rewrite(branch) for branch in c.cexps])
+
+    def primop(self, c: 'cps.PRIMOP') -> 'cps.cexp':
+        return cps.PRIMOP(c.primop, self.values(c.args), c.results, [self.rewrite(branch) for branch in c.cexps])
+
+
+class Contract(Pass):
+    """
+    beta-contraction: a function called exactly once and used nowhere else is inlined at the call,
+    and eta-reduction: a function that only passes its arguments on to another is replaced by that other.
+    Most of these are the continuations the converter reifies for the rest of a conditional or an application.
+    The converter never makes a recursive FIX, so an inlined body can't contain its own call.
+    """
+    name = 'contract'
+
+    def __init__(self, statistics: Statistics):
+        super().__init__(statistics)
+        self.inline = {}
+
+    def run(self, c: 'cps.cexp') -> 'cps.cexp':
+        self.inline = {}
+        return super().run(c)
+
+    def fix(self, c: 'cps.FIX') -> 'cps.cexp':
+        kept = []
+        for f, params, body in c.functions:
+            if self.census.uses.get(f, 0) == 1 and self.census.calls.get(f, 0) == 1:
+                self.inline[f] = (params, body)
+            elif self.forwards(f, params, body):
+                self.substitution[f] = body.function
+                self.changed()
+            else:
+                kept.append((f, params, body))
+        return self.make_fix(kept, c.cexp)
+
+    def forwards(self, f: 'cps.var', params: 'List[cps.var]', body: 'cps.cexp') -> bool:
+        """
+        whether f(params) just calls another function with the same params,
+        which mustn't be one about to be inlined at what would no longer be its only call
+        """
+        if type(body) is not cps.APP or len(body.arguments) != len(params):
+            return False
+        if not all(type(arg) is cps.VAR and arg.var is param for arg, param in zip(body.arguments, params)):
+            return False
+        target = body.function
+        return not (type(target) is cps.VAR and (target.var is f or target.var in params or target.var in self.inline))
+
+    def app(self, c: 'cps.APP') -> 'cps.cexp':
+        function = self.value(c.function)
+        if type(function) is cps.VAR and function.var in self.inline:
+            params, body = self.inline.pop(function.var)
+            if len(params) != len(c.arguments):
+                raise PySchemeInternalError("wrong number of arguments to " + repr(function.var))
+            for param, arg in zip(params, c.arguments):
+                self.substitution[param] = self.value(arg)
+            self.changed()
+            return self.rewrite(body)
+        return cps.APP(function, self.values(c.arguments))
+
+
+class Fold(Pass):
+    """
+    constant folding: arithmetic, comparisons and tests of constant numbers and booleans are done now,
+    and branches on them become the branch taken.
+    Constants are propagated through definitions too: a lookup in the frame a definition was just made in,
+    anywhere in the rest of the code after that definition, is replaced by the value defined,
+    since a definition can't be changed.
+    Closures made here are known not to be special forms, so applications of them need only evaluate their
+    arguments, which leaves the continuation of the application called just once, ready for contraction.
+    """
+    name = 'fold'
+
+    foldable = {  # primop names, the primops themselves aren't defined yet when this module is imported
+        'mul', 'add', 'sub', 'div', 'mod',
+        'eq', 'ne', 'gt', 'lt', 'ge', 'le', 'xor', 'not_', 'istrue', 'isfalse',
+    }
+
+    def __init__(self, statistics: Statistics):
+        super().__init__(statistics)
+        self.operations = cps.operations()
+        self.defined = {}  # type: Dict[tuple, 'cps.value']
+        self.closures = set()
+
+    def run(self, c: 'cps.cexp') -> 'cps.cexp':
+        self.defined = {}
+        self.closures = set()
+        return super().run(c)
+
+    @classmethod
+    def constant(cls, v: 'cps.value') -> bool:
+        return type(v) is cps.CONST and isinstance(v.expr, (expr.Number, expr.Boolean))
+
+    def primop(self, c: 'cps.PRIMOP') -> 'cps.cexp':
+        args = self.values(c.args)
+        if c.primop.name in self.foldable and all(self.constant(arg) for arg in args):
+            _, fn = self.operations[c.primop]
+            try:
+                result = fn(*[arg.expr for arg in args])
+            except ArithmeticError:  # i.e. division by zero, left to fail at run time
+                result = None
+            if result is not None:
+                self.changed()
+                if len(c.results) == 0:
+                    return self.rewrite(c.cexps[0 if result else 1])
+                self.substitution[c.results[0]] = cps.CONST(result)
+                return self.rewrite(c.cexps[0])
+        if c.primop is cps.primop.primitive:
+            if type(args[0]) is cps.CONST:
+                self.changed()
+                return self.rewrite(c.cexps[0 if isinstance(args[0].expr, expr.Primitive) else 1])
+            if type(args[0]) is cps.VAR and args[0].var in self.closures:
+                self.changed()
+                return self.rewrite(c.cexps[0])
+        elif c.primop is cps.primop.closure:
+            self.closures.add(c.results[0])
+        elif c.primop is cps.primop.lookup and type(args[0]) is cps.VAR and args[2].int == 0:
+            key = (args[0].var, args[1].expr)
+            if key in self.defined:
+                self.changed()
+                self.substitution[c.results[0]] = self.defined[key]
+                return self.rewrite(c.cexps[0])
+        elif c.primop is cps.primop.define and type(args[0]) is cps.VAR:
+            key = (args[0].var, args[1].expr)
+            self.defined[key] = args[2]
+            try:
+                return cps.PRIMOP(c.primop, args, c.results, [self.rewrite(c.cexps[0])])
+            finally:
+                del self.defined[key]
+        return cps.PRIMOP(c.primop, args, c.results, [self.rewrite(branch) for branch in c.cexps])
+
+    def switch(self, c: 'cps.SWITCH') -> 'cps.cexp':
+        v = self.value(c.value)
+        if type(v) is cps.INT:
+            self.changed()
+            return self.rewrite(c.cexps[v.int])
+        return cps.SWITCH(v, [self.rewrite(branch) for branch in c.cexps])
+
+
+class Eliminate(Pass):
+    """
+    dead-variable elimination: records, selections, functions and pure primops whose results are never used
+    """
+    name = 'eliminate'
+
+    def record(self, c: 'cps.RECORD') -> 'cps.cexp':
+        if self.census.unused(c.var):
+            self.changed()
+            return self.rewrite(c.cexp)
+        return super().record(c)
+
+    def select(self, c: 'cps.SELECT') -> 'cps.cexp':
+        if self.census.unused(c.var):
+            self.changed()
+            return self.rewrite(c.cexp)
+        return super().select(c)
+
+    def fix(self, c: 'cps.FIX') -> 'cps.cexp':
+        kept = [function for function in c.functions if not self.census.unused(function[0])]
+        if len(kept) < len(c.functions):
+            self.changed()
+        return self.make_fix(kept, c.cexp)
+
+    def primop(self, c: 'cps.PRIMOP') -> 'cps.cexp':
+        if c.primop in cps.pure and all(self.census.unused(result) for result in c.results):
+            self.changed()
+            return self.rewrite(c.cexps[0])
+        return super().primop(c)
+
+
+class Optimiser:
+    """
+    runs the passes named in Config.passes over each cexp it is given, keeping statistics across all of them
+    """
+    passes = {
+        Contract.name: Contract,
+        Fold.name: Fold,
+        Eliminate.name: Eliminate,
+    }
+
+    def __init__(self):
+        self.statistics = Statistics()
+
+    def optimise(self, c: 'cps.cexp') -> 'cps.cexp':
+        self.statistics.programs += 1
+        passes = [self.passes[name](self.statistics) for name in Config.passes]
+        for _ in range(Config.rounds):
+            self.statistics.rounds += 1
+            before = sum(self.statistics.changes.values())
+            for p in passes:
+                c = p.run(c)
+            if sum(self.statistics.changes.values()) == before:
+                break
+        return c
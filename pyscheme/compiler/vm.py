@@ -0,0 +1,395 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# A register machine for the abstract machine sketched in docs/compiler.md.
+#
+# The machine's registers are
+#
+# * PC, an index into one flat list of instructions shared by everything the machine has compiled,
+# * ENV, the current environment,
+# * CONT, the continuation: a Continuation record of the PC, ENV, CONT and temps to return to,
+#   or at the bottom of the machine's own records, a python continuation from the rest of the interpreter,
+# * AM, the failure continuation: a Failure record for the machine to backtrack to directly,
+#   or any other ambivalence.Amb, i.e. one from `define` or from outside the machine,
+# * VAL, the value of the last expression (RET in the notes),
+# * and temps, a stack of values waiting to be used, i.e. the function and arguments of an application in progress.
+#
+# Each Expr class emits its own instructions with its `emit` method, much as it compiles itself with `compile`,
+# and builtin operators may emit their applications directly, as `then`, `back`, `here` and `spawn` do.
+# Expressions with nothing better to emit run their compiled code, and a lambda is still an ordinary Closure,
+# with a body that runs on the machine, so code on the machine and off it can call each other freely.
+# Calls to closures made here stay on the machine, only bouncing through the trampoline as every closure call does.
+
+from typing import List
+from .. import ambivalence
+from .. import environment
+from .. import expr
+from .. import trampoline
+from .. import types
+from ..exceptions import PySchemeInternalError
+from . import cps
+
+# opcodes, and the operands of each instruction
+CONST = 0  # value: VAL = value
+GETENV = 1  # symbol, depth, index: VAL = the variable at that lexical address
+PUSH = 2  # push VAL on temps
+PRIM1 = 3  # fn: VAL = fn(VAL)
+PRIM2 = 4  # fn: VAL = fn(pop, VAL)
+PRIMN = 5  # fn, n: VAL = fn(the top n temps), popping them
+MAKEREC = 6  # n: VAL = a list of the top n temps, popping them
+JMP = 7  # label
+JFALSE = 8  # label: jump unless VAL is true
+LOGIC = 9  # proceed, stop, unknown, done: `and` and `or`, see Machine.run
+DECIDE = 10  # decisive: VAL = VAL if decisive(VAL) else pop
+MAKECLOS = 11  # maker: VAL = maker(ENV), a closure over ENV
+PUSHENV = 12  # layout: push ENV then extend it with a new frame
+POPENV = 13  # pop ENV
+EXTEND = 14  # layout: extend ENV with a new frame, in tail position where ENV need not be restored
+DEFINE = 15  # symbol: define symbol as VAL in ENV, VAL = nothing
+SPECIAL = 16  # operands, label: if VAL is a special form apply it to the unevaluated operands, returning to label
+#              or to CONT if label is None
+CALL = 17  # n: pop n arguments and a function and apply it, returning to the next instruction
+TAILCALL = 18  # n: pop n arguments and a function and apply it, returning to CONT
+CONTINUE = 19  # return VAL to CONT
+MAKEBACK = 20  # label: backtracking resumes at label with the current registers
+BACK = 21  # backtrack to AM
+HERE = 22  # tail: apply VAL to the current continuation
+SPAWN = 23  # continue twice, in two threads, with VAL true and false
+FOREIGN = 24  # code, tail: run compiled code
+
+names = {
+    CONST: 'CONST', GETENV: 'GETENV', PUSH: 'PUSH', PRIM1: 'PRIM1', PRIM2: 'PRIM2', PRIMN: 'PRIMN',
+    MAKEREC: 'MAKEREC', JMP: 'JMP', JFALSE: 'JFALSE', LOGIC: 'LOGIC', DECIDE: 'DECIDE', MAKECLOS: 'MAKECLOS',
+    PUSHENV: 'PUSHENV', POPENV: 'POPENV', EXTEND: 'EXTEND', DEFINE: 'DEFINE', SPECIAL: 'SPECIAL', CALL: 'CALL',
+    TAILCALL: 'TAILCALL', CONTINUE: 'CONTINUE', MAKEBACK: 'MAKEBACK', BACK: 'BACK', HERE: 'HERE',
+    SPAWN: 'SPAWN', FOREIGN: 'FOREIGN',
+}
+
+
+class Continuation:
+    """
+    where to return a value to
+    """
+    __slots__ = ('pc', 'env', 'cont', 'temps')
+
+    def __init__(self, pc: int, env: 'environment.Environment', cont, temps: tuple):
+        self.pc = pc
+        self.env = env
+        self.cont = cont
+        self.temps = temps
+
+
+class Failure(ambivalence.Amb):
+    """
+    where to backtrack to, an Amb so that the rest of the interpreter can backtrack to it too
+    """
+
+    def __init__(self, machine: 'Machine', pc: int, env: 'environment.Environment', cont, temps: tuple,
+                 am: ambivalence.Amb):
+        super().__init__(self.resume, am.cut())
+        self.machine = machine
+        self.pc = pc
+        self.env = env
+        self.cont = cont
+        self.temps = temps
+        self.am = am
+
+    def resume(self) -> 'types.Promise':
+        return self.machine.run(self.pc, self.env, self.cont, list(self.temps), None, self.am)
+
+
+class Entry(expr.Compiled):
+    """
+    the body of a closure, or a top-level expression, starting at `pc` on the machine.
+    `variables` are the closure's arguments if they are all plain symbols.
+    """
+
+    def __init__(self, machine: 'Machine', source: 'expr.Expr', variables: 'types.Maybe[tuple]'=None):
+        super().__init__(self.enter, source)
+        self.machine = machine
+        self.pc = None
+        self.variables = variables
+
+    def enter(self, env: 'environment.Environment', ret: 'types.Continuation',
+              amb: ambivalence.Amb) -> 'types.Promise':
+        return self.machine.run(self.pc, env, ret, [], None, amb)
+
+
+class Label:
+    def __init__(self):
+        self.pc = None
+
+
+class Emitter:
+    """
+    appends the instructions for expressions to the machine's code.
+    Instructions are lists while they are being emitted, with Labels for jump targets,
+    and become tuples with plain pcs once everything is placed.
+    """
+
+    def __init__(self, machine: 'Machine'):
+        self.machine = machine
+        self.code = []
+        self.pending = []
+
+    def emit(self, op: int, *operands):
+        self.code.append([op, *operands])
+
+    def label(self) -> Label:
+        return Label()
+
+    def place(self, label: Label):
+        label.pc = self.pc()
+
+    def pc(self) -> int:
+        return len(self.machine.code) + len(self.code)
+
+    def value(self, tail: bool):
+        """
+        VAL is the value of the expression, which must return it if it is in tail position
+        """
+        if tail:
+            self.emit(CONTINUE)
+
+    def constant(self, value: 'expr.Expr', tail: bool):
+        self.emit(CONST, value)
+        self.value(tail)
+
+    def builtin(self, operation: 'expr.Expr') -> 'types.Maybe[expr.Op]':
+        return self.machine.builtin(operation)
+
+    def operation(self, prim: 'cps.primop') -> callable:
+        return self.machine.operations[prim][1]
+
+    def each(self, exprs: list):
+        """
+        push the value of each expression on temps
+        """
+        for e in exprs:
+            e.emit(self, False)
+            self.emit(PUSH)
+
+    def call(self, operands: list, tail: bool):
+        """
+        apply the primitive in VAL to the operands
+        """
+        self.emit(PUSH)
+        self.each(operands)
+        self.emit(TAILCALL if tail else CALL, len(operands))
+
+    def apply(self, operands: list, tail: bool):
+        """
+        apply the operator in VAL to the operands, whether it is primitive or a special form
+        """
+        unevaluated = expr.make_list([expr.Compiled(operand.compile(), operand) for operand in operands])
+        after = None if tail else self.label()
+        self.emit(SPECIAL, unevaluated, after)
+        self.call(operands, tail)
+        if after is not None:
+            self.place(after)
+
+    def foreign(self, e: 'expr.Expr', tail: bool):
+        """
+        run the compiled code of an expression with nothing better to emit
+        """
+        self.emit(FOREIGN, e.compile(), tail)
+
+    def function(self, body: 'expr.Expr', variables: 'types.Maybe[tuple]') -> Entry:
+        """
+        the entry point of a closure body, emitted after the code currently being emitted
+        """
+        entry = Entry(self.machine, body, variables)
+        self.pending.append(entry)
+        return entry
+
+    def entry(self, e: 'expr.Expr') -> Entry:
+        entry = Entry(self.machine, e)
+        self.pending.append(entry)
+        self.finish()
+        return entry
+
+    def finish(self):
+        while len(self.pending) > 0:
+            entry = self.pending.pop(0)
+            entry.pc = self.pc()
+            entry.source.emit(self, True)
+        for instruction in self.code:
+            self.machine.code.append(tuple(operand.pc if type(operand) is Label else operand
+                                           for operand in instruction))
+        self.code = []
+
+
+class Machine:
+    """
+    compiles resolved expressions to instructions, and runs them.
+    Builtin operators found in `globals`, the top-level frame, are applied in-line where possible.
+    """
+
+    def __init__(self, globals: 'environment.Frame'):
+        self.globals = globals
+        self.code = []
+        self.operations = cps.operations()
+
+    def builtin(self, operation: 'expr.Expr') -> 'types.Maybe[expr.Op]':
+        """
+        the builtin operator an operation refers to, if it does.
+        The top level can't redefine a builtin, so a reference that reaches it always finds the same one.
+        """
+        if type(operation) is expr.Reference and operation.top_level:
+            value = self.globals.local(operation.symbol)
+            if isinstance(value, expr.Op) and value.static_type():
+                return value
+        return None
+
+    def compiled(self, e: 'expr.Expr') -> Entry:
+        """
+        stands in for a top-level expression with its code on the machine
+        """
+        return Emitter(self).entry(e)
+
+    def continuation(self, cont) -> 'types.Continuation':
+        """
+        a continuation for the rest of the interpreter from the CONT register
+        """
+        if type(cont) is Continuation:
+            return lambda value, amb: self.run(cont.pc, cont.env, cont.cont, list(cont.temps), value, amb)
+        return cont
+
+    def apply(self, f: 'expr.Primitive', args: list, cont, am: ambivalence.Amb) -> 'types.Promise':
+        """
+        apply a function to evaluated arguments, bouncing before the body of a closure
+        like Closure.apply_evaluated_args. Closures with bodies on the machine, and just the arguments
+        they expect, are entered directly with cont as their continuation.
+        """
+        if type(f) is expr.Closure:
+            body = f._body
+            if type(body) is Entry and body.machine is self and body.variables is not None \
+                    and len(body.variables) == len(args):
+                env = f._env.extend(dict(zip(body.variables, args)), amb=am)
+                return trampoline.bounce(self.run, body.pc, env, cont, [], None, am)
+        return f.apply_evaluated_args(expr.make_arguments(tuple(args)), self.continuation(cont), am)
+
+    def run(self, pc: int, env: 'environment.Environment', cont, temps: list, val: 'types.Maybe[expr.Expr]',
+            am: ambivalence.Amb) -> 'types.Promise':
+        """
+        execute instructions from pc until control leaves the machine:
+        to call a function, to continue with a continuation from outside, to run compiled code, or to backtrack.
+        Returning to the machine's own continuations and backtracking to its own failures stay in the loop.
+        """
+        code = self.code
+        while True:
+            instruction = code[pc]
+            op = instruction[0]
+            pc += 1
+            if op == GETENV:
+                val = env.value_at(instruction[1], instruction[2], instruction[3])
+            elif op == PUSH:
+                temps.append(val)
+            elif op == CONST:
+                val = instruction[1]
+            elif op == PRIM2:
+                val = instruction[1](temps.pop(), val)
+            elif op == JFALSE:
+                if not val.is_true():
+                    pc = instruction[1]
+            elif op == CONTINUE:
+                if type(cont) is Continuation:
+                    pc = cont.pc
+                    env = cont.env
+                    temps = list(cont.temps)
+                    cont = cont.cont
+                else:
+                    return trampoline.call(cont, val, am)
+            elif op == CALL or op == TAILCALL:
+                n = instruction[1]
+                args = temps[len(temps) - n:]
+                f = temps[-n - 1]
+                del temps[-n - 1:]
+                if op == CALL:
+                    cont = Continuation(pc, env, cont, tuple(temps))
+                return self.apply(f, args, cont, am)
+            elif op == JMP:
+                pc = instruction[1]
+            elif op == SPECIAL:
+                if not isinstance(val, expr.Primitive):
+                    if instruction[2] is not None:
+                        cont = Continuation(instruction[2], env, cont, tuple(temps))
+                    return val.apply(instruction[1], env, self.continuation(cont), am)
+            elif op == PRIM1:
+                val = instruction[1](val)
+            elif op == PRIMN:
+                n = instruction[2]
+                args = temps[len(temps) - n:]
+                del temps[len(temps) - n:]
+                val = instruction[1](*args)
+            elif op == MAKEREC:
+                n = instruction[1]
+                val = expr.make_list(temps[len(temps) - n:])
+                del temps[len(temps) - n:]
+            elif op == MAKECLOS:
+                val = instruction[1](env)
+            elif op == LOGIC:
+                if instruction[1](val):
+                    pass
+                elif instruction[2](val):
+                    pc = instruction[4]
+                else:
+                    temps.append(val)
+                    pc = instruction[3]
+            elif op == DECIDE:
+                lhs = temps.pop()
+                if not instruction[1](val):
+                    val = lhs
+            elif op == PUSHENV:
+                temps.append(env)
+                env = env.extend(layout=instruction[1], amb=am)
+            elif op == POPENV:
+                env = temps.pop()
+            elif op == EXTEND:
+                env = env.extend(layout=instruction[1], amb=am)
+            elif op == DEFINE:
+                am = env.define_value(instruction[1], val, am)
+                val = expr.Nothing()
+            elif op == MAKEBACK:
+                am = Failure(self, instruction[1], env, cont, tuple(temps), am)
+            elif op == BACK:
+                if type(am) is Failure:
+                    pc = am.pc
+                    env = am.env
+                    cont = am.cont
+                    temps = list(am.temps)
+                    am = am.am
+                else:
+                    return am
+            elif op == HERE:
+                if not instruction[1]:
+                    cont = Continuation(pc, env, cont, tuple(temps))
+                return self.apply(val, [expr.Cont(self.continuation(cont))], cont, am)
+            elif op == SPAWN:
+                resume = self.continuation(Continuation(pc, env, cont, tuple(temps)))
+                return [trampoline.bounce(resume, expr.T(), am), trampoline.bounce(resume, expr.F(), am)]
+            elif op == FOREIGN:
+                if not instruction[2]:
+                    cont = Continuation(pc, env, cont, tuple(temps))
+                return instruction[1](env, self.continuation(cont), am)
+            else:
+                raise PySchemeInternalError("bad instruction " + str(instruction))
+
+    def disassemble(self, start: int=0, end: 'types.Maybe[int]'=None) -> List[str]:
+        return ['%5d %-9s %s' % (pc, names[instruction[0]], ' '.join(str(operand) for operand in instruction[1:]))
+                for pc, instruction in enumerate(self.code[start:end], start)]
@@ -21,23 +21,84 @@ from .exceptions import SymbolNotFoundError, SymbolAlreadyDefinedError, PyScheme
 from . import types
 from typing import Dict
 from . import ambivalence
+from . import trampoline
+
+
+class Unbound:
+    """
+    marks a slot whose name has not been defined yet
+    """
+
+    def __repr__(self):
+        return 'UNBOUND'
+
+
+UNBOUND = Unbound()
+
+
+class Layout:
+    """
+    the names a frame is statically known to bind, in slot order.
+    shared by every frame created for the same scope.
+    """
+
+    def __init__(self, names: tuple):
+        self.names = names
+        self.index = {name: index for index, name in enumerate(names)}
+
+    def __len__(self):
+        return len(self.names)
+
+
+NO_LAYOUT = Layout(())
 
 
 class Environment:
-    counter = [0]
+    __slots__ = ()
+    _parent = None
+    _layout = NO_LAYOUT
 
-    def extend(self, dictionary: 'types.Maybe[Dict]'=None) -> 'Frame':
-        return Frame(self, dictionary)
+    def extend(self, dictionary: 'types.Maybe[Dict]'=None, layout: Layout=NO_LAYOUT,
+               amb: 'types.Maybe[ambivalence.Amb]'=None) -> 'Frame':
+        return Frame(self, dictionary, layout, amb)
 
     def lookup(self, symbol, ret: 'types.Continuation', amb: 'types.Amb') -> 'types.Promise':
         raise SymbolNotFoundError(symbol)
 
+    def lookup_address(self, symbol, depth: int, index: 'types.Maybe[int]',
+                       ret: 'types.Continuation', amb: 'types.Amb') -> 'types.Promise':
+        return trampoline.call(ret, self.value_at(symbol, depth, index), amb)
+
+    def value_at(self, symbol, depth: int, index: 'types.Maybe[int]') -> 'expr.Expr':
+        """
+        the value of a symbol resolved by a Scope to slot `index` of the frame `depth` levels up,
+        or if index is None to an ordinary lookup starting from that frame.
+        Anything unexpected, like a slot not yet defined, falls back to an ordinary lookup from here.
+        """
+        frame = self
+        while depth > 0 and frame is not None:
+            frame = frame._parent
+            depth -= 1
+        if frame is not None:
+            if index is None:
+                return frame[symbol]
+            value = frame.slot(index, symbol)
+            if value is not UNBOUND:
+                return value
+        return self[symbol]
+
+    def slot(self, index: int, symbol) -> 'expr.Expr':
+        return UNBOUND
+
     def define(self, symbol, value, ret: 'types.Continuation', amb: 'types.Amb', error=False) -> 'types.Promise':
         pass
 
     def contains(self, symbol: 'expr.Symbol'):
         return False
 
+    def depth(self) -> int:
+        return 0
+
     def __str__(self) -> str:
         return '[0]'
 
@@ -49,43 +110,105 @@ class Environment:
 
 
 class Frame(Environment):
-    def __init__(self, parent: Environment, dictionary: 'types.Maybe[Dict]'):
+    """
+    Names in the frame's Layout, the arguments of a function or the local definitions of a block,
+    are kept in a list of slots. Anything else, like the definitions of a top-level or `env` body,
+    goes in a dictionary that is only created when the first such name is defined.
+
+    A frame made for evaluating something straight away is given the amb it is evaluated with.
+    Until that amb changes, nothing could backtrack into the frame, so definitions in it need no undoing.
+    """
+
+    __slots__ = ('_parent', '_layout', '_values', '_dictionary', '_amb')
+
+    def __init__(self, parent: Environment, dictionary: 'types.Maybe[Dict]', layout: Layout=NO_LAYOUT,
+                 amb: 'types.Maybe[ambivalence.Amb]'=None):
         self._parent = parent
-        if dictionary is None:
-            dictionary = {}
-        self._dictionary = dictionary
-        self.counter[0] += 1
-        self._number = self.counter[0]
+        self._layout = layout
+        self._values = [UNBOUND] * len(layout)
+        self._dictionary = dictionary or None
+        self._amb = amb
+
+    def local(self, symbol):
+        """
+        the value bound to symbol in this frame only, or UNBOUND
+        """
+        index = self._layout.index.get(symbol)
+        if index is not None:
+            return self._values[index]
+        if self._dictionary is None:
+            return UNBOUND
+        return self._dictionary.get(symbol, UNBOUND)
+
+    def bind(self, symbol, value):
+        index = self._layout.index.get(symbol)
+        if index is not None:
+            self._values[index] = value
+        elif self._dictionary is None:
+            self._dictionary = {symbol: value}
+        else:
+            self._dictionary[symbol] = value
+
+    def unbind(self, symbol):
+        index = self._layout.index.get(symbol)
+        if index is None:
+            del self._dictionary[symbol]
+        else:
+            self._values[index] = UNBOUND
+
+    def slot(self, index: int, symbol) -> 'expr.Expr':
+        if index < len(self._values) and self._layout.names[index] is symbol:
+            return self._values[index]
+        return UNBOUND
 
     def lookup(self, symbol, ret: 'types.Continuation', amb: 'types.Amb') -> 'types.Promise':
-        if symbol in self._dictionary:
-            return lambda: ret(self._dictionary.get(symbol), amb)
+        value = self.local(symbol)
+        if value is not UNBOUND:
+            return trampoline.call(ret, value, amb)
         else:
-            return lambda: self._parent.lookup(symbol, ret, amb)
+            return trampoline.call(self._parent.lookup, symbol, ret, amb)
 
     def define(self, symbol: 'expr.Symbol',
                value: 'expr.Expr',
                ret: 'types.Continuation',
                amb: ambivalence.Amb,
                error: bool=False) -> 'types.Promise':
-        if symbol in self._dictionary:
-            if value != self._dictionary[symbol]:
-                if error:
-                    raise SymbolAlreadyDefinedError(symbol)
-                else:
-                    return lambda: amb()
-            else:
-                return lambda: ret(symbol, amb)
-        else:
-            self._dictionary[symbol] = value
+        current = self.local(symbol)
+        if current is not UNBOUND and value != current and not error:
+            return trampoline.call(amb)
+        return trampoline.call(ret, symbol, self.define_value(symbol, value, amb))
+
+    def define_value(self, symbol: 'expr.Symbol', value: 'expr.Expr', amb: ambivalence.Amb) -> ambivalence.Amb:
+        """
+        define without a continuation: it is an error if symbol is already defined as something else.
+        returns the amb to continue with, which undoes the definition before backtracking further
+        """
+        current = self.local(symbol)
+        if current is not UNBOUND:
+            if value != current:
+                raise SymbolAlreadyDefinedError(symbol)
+            return amb
+        self.bind(symbol, value)
+        if amb is self._amb:
+            # backtracking goes to before this frame was made, so a tail-recursive loop
+            # defining things doesn't grow a chain of undos
+            return amb
+
+        def undo_amb() -> 'types.Promise':
+            self.unbind(symbol)
+            return trampoline.call(amb)
+        return ambivalence.Amb(undo_amb, amb.cut())
 
-            def undo_amb() -> 'types.Promise':
-                del self._dictionary[symbol]
-                return lambda: amb()
-            return lambda: ret(symbol, ambivalence.Amb(undo_amb, amb.cut()))
+    def copy(self) -> 'Frame':
+        """
+        a sibling of this frame with the same bindings, so far
+        """
+        frame = Frame(self._parent, self._dictionary and self._dictionary.copy(), self._layout)
+        frame._values = self._values.copy()
+        return frame
 
     def contains(self, symbol: 'expr.Symbol'):
-        return symbol in self._dictionary or self._parent.contains(symbol)
+        return self.local(symbol) is not UNBOUND or self._parent.contains(symbol)
 
     def non_eval_context_define(self, symbol: 'expr.Symbol', value: 'expr.Expr'):
         """
@@ -93,18 +216,93 @@ class Frame(Environment):
         it is for internal use by set-up code in the repl.
         normal evaluation requires calling define() above.
         """
-        if symbol in self._dictionary:
+        if self.local(symbol) is not UNBOUND:
             raise PySchemeInternalError("symbol already defined: " + str(symbol))
-        self._dictionary[symbol] = value
+        self.bind(symbol, value)
         
     def __getitem__(self, symbol):
-        if symbol in self._dictionary:
-            return self._dictionary[symbol]
+        value = self.local(symbol)
+        if value is not UNBOUND:
+            return value
         else:
             return self._parent[symbol]
 
+    def depth(self) -> int:
+        return self._parent.depth() + 1
+
     def __str__(self) -> str:
-        return '[' + str(self._number) + '] -> ' + str(self._parent)
+        return '[' + str(self.depth()) + '] -> ' + str(self._parent)
 
     def contents(self):
-        return self._dictionary.copy()
+        contents = {} if self._dictionary is None else self._dictionary.copy()
+        for name, value in zip(self._layout.names, self._values):
+            if value is not UNBOUND:
+                contents[name] = value
+        return contents
+
+
+class Scope:
+    """
+    The static counterpart of a Frame, used by Expr.resolve to give each symbol reference its lexical address:
+    the number of frames up to the one binding it, and its slot in that frame's Layout.
+
+    A scope with no parent stands for the frame a top-level statement is evaluated in,
+    whose contents are dynamic so nothing is resolved to it by index.
+    An opaque scope is one whose frame's parent is not the lexically enclosing frame (i.e. `env x extends y`)
+    so nothing is resolved beyond it by index either.
+    """
+
+    def __init__(self, parent: 'types.Maybe[Scope]'=None, opaque: bool=False):
+        self.parent = parent
+        self.opaque = opaque
+        self.names = []
+        self.references = [] if parent is None else parent.references
+
+    def extend(self, opaque: bool=False) -> 'Scope':
+        return Scope(self, opaque)
+
+    def bind(self, symbol: 'expr.Symbol'):
+        if self.parent is not None and symbol not in self.names:
+            self.names.append(symbol)
+
+    def layout(self) -> Layout:
+        """
+        called once all of the scope's bindings have been seen
+        """
+        return Layout(tuple(self.names))
+
+    def reference(self, reference: 'expr.Reference') -> 'expr.Reference':
+        self.references.append((reference, self))
+        return reference
+
+    def address(self, symbol: 'expr.Symbol') -> tuple:
+        depth = 0
+        scope = self
+        while scope.parent is not None:
+            if symbol in scope.names:
+                return depth, scope.names.index(symbol)
+            depth += 1
+            if scope.opaque:
+                break
+            scope = scope.parent
+        return depth, None
+
+    def top_level(self, symbol: 'expr.Symbol') -> bool:
+        """
+        true if a reference to symbol from here finds whatever the top-level frame binds it to,
+        with no scope on the way binding it or opaque
+        """
+        scope = self
+        while scope.parent is not None:
+            if symbol in scope.names or scope.opaque:
+                return False
+            scope = scope.parent
+        return True
+
+    def finalise(self):
+        """
+        called on the outermost scope once the whole expression has been seen
+        """
+        for reference, scope in self.references:
+            reference.set_address(*scope.address(reference.symbol), top_level=scope.top_level(reference.symbol))
+        self.references.clear()
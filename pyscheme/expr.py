@@ -25,9 +25,16 @@ from .singleton import Singleton, FlyWeight
 from . import types
 from . import inference
 from . import ambivalence
+from . import package_cache
+from . import trampoline
+from . import hamt
+from .compiler import cps
+from .compiler import match
+from array import array
 from pathlib import Path
 from typing import Union
 import inspect
+import operator
 import os
 import sys
 
@@ -43,16 +50,111 @@ def hlDebug(*args, **kwargs):
 class Config:
     debug = False
     hlDebug = False
+    compile = True
+    strings = True  # string literals are Strings, otherwise lists of Char built pair by pair
+    flat_strings = 256  # @@ copies strings shorter than this, and makes a Concat of longer ones
 
 def verify(amb: ambivalence.Amb):
     assert isinstance(amb, ambivalence.Amb)
 
+
+def make_list(values) -> 'LinkedList':
+    """
+    iteratively build a LinkedList from a python sequence
+    """
+    result = Null()
+    for value in reversed(values):
+        result = Pair(value, result)
+    return result
+
+
+def make_string(value: str) -> 'LinkedList':
+    """
+    a LinkedList of Char from a python str
+    """
+    if len(value) == 0:
+        return Null()
+    if Config.strings:
+        return String(value)
+    return make_list([Char(c) for c in value])
+
+
+def make_number(value: int) -> 'Number':
+    """
+    a Number, the same one every time for small values
+    """
+    number = small_numbers.get(value)
+    if number is None:
+        return Number(value)
+    return number
+
+
+def reverse_list(lst: 'LinkedList') -> 'LinkedList':
+    """
+    iteratively build a LinkedList of the elements of lst in reverse order
+    """
+    result = Null()
+    for value in lst:
+        result = Pair(value, result)
+    return result
+
+
+def make_vector(values) -> 'Vector':
+    """
+    a Vector of the python ints in values
+    """
+    try:
+        return Vector(array('q', values))
+    except OverflowError:
+        raise PySchemeRunTimeError("vector element out of range")
+
+
+def make_arguments(values: tuple) -> 'LinkedList':
+    """
+    the LinkedList of evaluated arguments passed to a primitive
+    """
+    if len(values) == 0:
+        return Null()
+    return Arguments(values)
+
+
+def compile_each(exprs: list) -> callable:
+    """
+    compile a list of expressions to a function of (env, ret, amb)
+    that evaluates each in turn and passes a tuple of the results to ret
+    """
+    values = [expr.compile_value() for expr in exprs]
+    if all(value is not None for value in values):
+        def evaluate_values(env: 'environment.Environment', ret: callable, amb: ambivalence.Amb) -> types.Promise:
+            return ret(tuple([value(env) for value in values]), amb)
+        return evaluate_values
+
+    codes = [expr.compile() for expr in exprs]
+
+    def evaluate_from(index: int, env: 'environment.Environment', evaluated: tuple,
+                      ret: callable, amb: ambivalence.Amb) -> types.Promise:
+        while index < len(values) and values[index] is not None:
+            evaluated += (values[index](env),)
+            index += 1
+        if index == len(values):
+            return trampoline.call(ret, evaluated, amb)
+
+        def next_continuation(value: Expr, amb: ambivalence.Amb) -> types.Promise:
+            return evaluate_from(index + 1, env, evaluated + (value,), ret, amb)
+
+        return codes[index](env, next_continuation, amb)
+
+    def evaluate_codes(env: 'environment.Environment', ret: callable, amb: ambivalence.Amb) -> types.Promise:
+        return evaluate_from(0, env, (), ret, amb)
+    return evaluate_codes
+
+
 class Expr:
     current_analysis = None
 
     def eval(self, env: 'environment.Environment', ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        return lambda: ret(self, amb)
+        return trampoline.call(ret, self, amb)
 
     def apply(self,
               args: 'LinkedList',
@@ -61,7 +163,7 @@ class Expr:
               amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
         if len(args) == 0:
-            return lambda: ret(self, amb)
+            return trampoline.call(ret, self, amb)
         else:
             raise PySchemeInternalError("non-op " + str(type(self)) + " called with arguments")
 
@@ -86,17 +188,65 @@ class Expr:
     def value(self):
         pass
 
+    def native(self, num_args: int) -> 'types.Maybe[callable]':
+        """
+        a python function from num_args evaluated arguments to the value of applying this to them, if there is one
+        """
+        return None
+
+    def hash_key(self):
+        """
+        a hashable python value, equal for equal expressions, identifying this one as a key of a HashMap
+        """
+        raise PySchemeRunTimeError("cannot use " + str(self) + " as a map key")
+
     def match(self, other: 'Expr', env: 'environment.Environment', ret: types.Continuation,
               amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
         raise PySchemeInferenceError("cannot match " + str(type(self)))
 
+    def split(self, constructors: dict) -> 'match.Split':
+        """
+        how a decision tree tests a value against this formal argument, see compiler/match.py.
+        constructors maps the symbols that name type constructors where the function is created
+        to their tag and number of arguments
+        """
+        raise match.Unsupported()
+
+    def collect_symbols(self, symbols: set):
+        """
+        add the symbols in this formal argument to symbols
+        """
+        pass
+
     def prepare_analysis(self, env: inference.TypeEnvironment):
         pass
 
     def analyse_farg(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
         raise PySchemeInferenceError(str(type(self)) + " cannot be used as a formal argument")
 
+    def resolve(self, scope: 'environment.Scope') -> 'Expr':
+        """
+        lexical addressing, after analysis:
+        return this expression with the symbol references it evaluates replaced by References
+        """
+        return self
+
+    def resolve_farg(self, scope: 'environment.Scope'):
+        """
+        bind the symbols this formal argument defines when matched in the scope
+        """
+        pass
+
+    def resolved(self) -> 'Expr':
+        """
+        resolve a top-level expression
+        """
+        scope = environment.Scope()
+        result = self.resolve(scope)
+        scope.finalise()
+        return result
+
     def eq(self, other: 'Expr') -> 'Boolean':
         if self == other:
             return T()
@@ -178,8 +328,61 @@ class Expr:
     def __ne__(self, other):
         return self.__cmp__(other) != 0
 
-    def compile(self):
-        pass
+    def compile(self) -> 'types.Code':
+        """
+        closure compilation, after resolution:
+        return a function equivalent to this expression's eval method,
+        with the work of walking the expression, finding its parts and building their continuations
+        done once here rather than every time it is evaluated
+        """
+        value = self.compile_value()
+        if value is None:
+            return self.eval
+
+        def evaluate_value(env: 'environment.Environment',
+                           ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+            return trampoline.call(ret, value(env), amb)
+        return evaluate_value
+
+    def compile_value(self) -> 'types.Maybe[callable]':
+        """
+        if this expression can be evaluated without a continuation, i.e. without applying anything,
+        return a function from env to its value
+        """
+        if type(self).eval is Expr.eval:  # self-evaluating
+            return lambda env: self
+        return None
+
+    def compiled(self) -> 'Expr':
+        """
+        compile a resolved top-level expression
+        """
+        return Compiled(self.compile(), self)
+
+    def self_evaluating(self) -> bool:
+        return type(self).eval is Expr.eval
+
+    def convert(self, converter: 'cps.Converter', env: 'cps.value', c: 'cps.MetaContinuation') -> 'cps.cexp':
+        """
+        CPS conversion, after resolution:
+        return the CPS expression that evaluates this expression in env and passes its value to c,
+        c making the rest of the CPS expression from that value.
+        Expressions without a conversion of their own run their compiled code.
+        """
+        if self.self_evaluating():
+            return c(cps.CONST(self))
+        return converter.foreign(self, env, c)
+
+    def emit(self, emitter: 'vm.Emitter', tail: bool):
+        """
+        emit the machine instructions that leave the value of this expression in VAL,
+        and return it if the expression is in tail position.
+        Expressions without instructions of their own run their compiled code.
+        """
+        if self.self_evaluating():
+            emitter.constant(self, tail)
+        else:
+            emitter.foreign(self, tail)
 
     def cursory_type(self):
         """
@@ -205,6 +408,9 @@ class Nothing(Expr, metaclass=Singleton):
     def is_constant(self):
         return True
 
+    def hash_key(self):
+        return None
+
     def __str__(self):
         return "nothing"
 
@@ -219,6 +425,9 @@ class Constant(Expr):
     def value(self):
         return self._value
 
+    def hash_key(self):
+        return self._value
+
     def static_type(self) -> bool:
         return True
 
@@ -229,10 +438,13 @@ class Constant(Expr):
               amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
         if self == other:
-            return lambda: ret(self, amb)
+            return trampoline.call(ret, self, amb)
         else:
             return amb
 
+    def split(self, constructors: dict) -> 'match.Split':
+        return match.Test(match.CONSTANT, self._value, [])
+
     def __cmp__(self, other: 'Constant'):
         if self._value < other.value():
             return -1
@@ -258,23 +470,46 @@ class Number(Constant):
     def type(cls):
         return inference.TypeOperator("int")
 
-    def __add__(self, other: Expr):
-        return Number(self._value + other.value())
+    def __add__(self, other: 'Number'):
+        return make_number(self._value + other._value)
+
+    def __sub__(self, other: 'Number'):
+        return make_number(self._value - other._value)
+
+    def __mul__(self, other: 'Number'):
+        return make_number(self._value * other._value)
+
+    def __floordiv__(self, other: 'Number'):
+        return make_number(self._value // other._value)
+
+    def __mod__(self, other: 'Number'):
+        return make_number(self._value % other._value)
 
-    def __sub__(self, other: Expr):
-        return Number(self._value - other.value())
+    def __pow__(self, power: 'Number', modulo=None):
+        return make_number(self._value ** power._value)
 
-    def __mul__(self, other: Expr):
-        return Number(self._value * other.value())
+    # comparisons of the raw ints, rather than through __cmp__
 
-    def __floordiv__(self, other: Expr):
-        return Number(self._value // other.value())
+    def eq(self, other: 'Number') -> 'Boolean':
+        return T() if self._value == other._value else F()
 
-    def __mod__(self, other: Expr):
-        return Number(self._value % other.value())
+    def ne(self, other: 'Number') -> 'Boolean':
+        return T() if self._value != other._value else F()
 
-    def __pow__(self, power: Expr, modulo=None):
-        return Number(self._value ** power.value())
+    def gt(self, other: 'Number') -> 'Boolean':
+        return T() if self._value > other._value else F()
+
+    def lt(self, other: 'Number') -> 'Boolean':
+        return T() if self._value < other._value else F()
+
+    def ge(self, other: 'Number') -> 'Boolean':
+        return T() if self._value >= other._value else F()
+
+    def le(self, other: 'Number') -> 'Boolean':
+        return T() if self._value <= other._value else F()
+
+
+small_numbers = {value: Number(value) for value in range(-128, 1024)}
 
 
 class Wildcard(Constant, metaclass=Singleton):
@@ -291,7 +526,10 @@ class Wildcard(Constant, metaclass=Singleton):
         always match
         """
         verify(amb)
-        return lambda: ret(self, amb)
+        return trampoline.call(ret, self, amb)
+
+    def split(self, constructors: dict) -> 'match.Split':
+        return None
 
     def __len__(self):
         return 1
@@ -432,15 +670,24 @@ class Symbol(Constant, metaclass=FlyWeight):
 
     def eval(self, env: 'environment.Environment', ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        return lambda: env.lookup(self, ret, amb)
+        return trampoline.call(env.lookup, self, ret, amb)
 
     def match(self, other: 'Expr', env: 'environment.Environment', ret: types.Continuation,
               amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
         if env.contains(self) and type(env[self]) is NamedTuple:
-            return lambda: env[self].match(other, env, ret, amb)
+            return trampoline.call(env[self].match, other, env, ret, amb)
+        else:
+            return trampoline.call(env.define, self, other, ret, amb)
+
+    def split(self, constructors: dict) -> 'match.Split':
+        if self in constructors and constructors[self][1] == 0:
+            return match.Test(match.TAG, constructors[self][0], [])
         else:
-            return lambda: env.define(self, other, ret, amb)
+            return match.Bind(self, None)
+
+    def collect_symbols(self, symbols: set):
+        symbols.add(self)
 
     def __hash__(self) -> int:
         return id(self)
@@ -476,6 +723,22 @@ class Symbol(Constant, metaclass=FlyWeight):
     def looks_like_binop(self):
         return self._value == 'then' or not self._value.isalnum()
 
+    def resolve(self, scope: 'environment.Scope') -> Expr:
+        return scope.reference(Reference(self))
+
+    def compile_value(self) -> callable:
+        return lambda env: env[self]
+
+    def convert(self, converter: 'cps.Converter', env: 'cps.value', c: 'cps.MetaContinuation') -> 'cps.cexp':
+        return converter.lookup(env, self, 0, None, c)
+
+    def emit(self, emitter: 'vm.Emitter', tail: bool):
+        emitter.emit(vm.GETENV, self, 0, None)
+        emitter.value(tail)
+
+    def resolve_farg(self, scope: 'environment.Scope'):
+        scope.bind(self)
+
     @classmethod
     def generate(cls):
         name = ''
@@ -499,6 +762,90 @@ class Symbol(Constant, metaclass=FlyWeight):
         cls.counter = 0
 
 
+class Reference(Expr):
+    """
+    a symbol reference given its lexical address by a Scope,
+    evaluated by direct access to the frame that binds it rather than by searching each frame in turn
+    """
+
+    def __init__(self, symbol: Symbol):
+        self.symbol = symbol
+        self.depth = 0
+        self.index = None
+        self.top_level = False
+
+    def set_address(self, depth: int, index: 'types.Maybe[int]', top_level: bool=False):
+        self.depth = depth
+        self.index = index
+        self.top_level = top_level
+
+    def eval(self, env: 'environment.Environment', ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        return trampoline.call(env.lookup_address, self.symbol, self.depth, self.index, ret, amb)
+
+    def resolve(self, scope: 'environment.Scope') -> Expr:
+        return self.symbol.resolve(scope)
+
+    def compile_value(self) -> callable:
+        symbol = self.symbol
+        depth = self.depth
+        index = self.index
+        if index is None or depth > 1:
+            return lambda env: env.value_at(symbol, depth, index)
+
+        def slot_value(env: 'environment.Environment') -> Expr:
+            frame = env._parent if depth == 1 else env
+            value = frame.slot(index, symbol)
+            if value is environment.UNBOUND:
+                return env.value_at(symbol, depth, index)
+            return value
+        return slot_value
+
+    def convert(self, converter: 'cps.Converter', env: 'cps.value', c: 'cps.MetaContinuation') -> 'cps.cexp':
+        return converter.lookup(env, self.symbol, self.depth, self.index, c)
+
+    def emit(self, emitter: 'vm.Emitter', tail: bool):
+        emitter.emit(vm.GETENV, self.symbol, self.depth, self.index)
+        emitter.value(tail)
+
+    @trace
+    def analyse_internal(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
+        return self.symbol.analyse_internal(env, non_generic)
+
+    def looks_like_binop(self):
+        return self.symbol.looks_like_binop()
+
+    def __str__(self):
+        return str(self.symbol)
+
+    __repr__ = __str__
+
+
+class Compiled(Expr):
+    """
+    stands in for an expression by the code it compiled to, wherever an Expr is still wanted,
+    i.e. the body of a closure or the unevaluated arguments to a special form
+    """
+
+    def __init__(self, code: 'types.Code', source: Expr):
+        self.eval = code
+        self.source = source
+
+    def compile(self) -> 'types.Code':
+        return self.eval
+
+    def self_evaluating(self) -> bool:
+        return False
+
+    def convert(self, converter: 'cps.Converter', env: 'cps.value', c: 'cps.MetaContinuation') -> 'cps.cexp':
+        return converter.foreign(self, env, c)
+
+    def __str__(self):
+        return str(self.source)
+
+    __repr__ = __str__
+
+
 class TypedSymbol(Expr):
     def __init__(self, symbol: Symbol, type_symbol: Symbol):
         self._symbol = symbol
@@ -522,7 +869,13 @@ class TypedSymbol(Expr):
     def match(self, other: 'Expr', env: 'environment.Environment', ret: types.Continuation,
               amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        return lambda: env.define(self.symbol(), other, ret, amb)
+        return trampoline.call(env.define, self.symbol(), other, ret, amb)
+
+    def split(self, constructors: dict) -> 'match.Split':
+        return match.Bind(self.symbol(), None)
+
+    def resolve_farg(self, scope: 'environment.Scope'):
+        scope.bind(self.symbol())
 
     __repr__ = __str__
 
@@ -548,9 +901,19 @@ class As(Expr):
         verify(amb)
         def match_continuation(_: Expr, amb: ambivalence.Amb) -> types.Promise:
             verify(amb)
-            return lambda: env.define(self._symbol, other, ret, amb)
+            return trampoline.call(env.define, self._symbol, other, ret, amb)
         return self._definition.match(other, env, match_continuation, amb)
 
+    def split(self, constructors: dict) -> 'match.Split':
+        return match.Bind(self._symbol, self._definition)
+
+    def collect_symbols(self, symbols: set):
+        self._definition.collect_symbols(symbols)
+
+    def resolve_farg(self, scope: 'environment.Scope'):
+        self._definition.resolve_farg(scope)
+        scope.bind(self._symbol)
+
 
 class LinkedList(Expr):
     @classmethod
@@ -561,10 +924,7 @@ class LinkedList(Expr):
 
     @classmethod
     def list(cls, args, index=0) -> 'LinkedList':
-        if index == len(args):
-            return Null()
-        else:
-            return Pair(args[index], cls.list(args, index=index + 1))
+        return make_list(args[index:])
 
     def is_null(self) -> bool:
         return False
@@ -611,6 +971,18 @@ class LinkedList(Expr):
     def append(self, other: 'LinkedList') -> 'LinkedList':
         pass
 
+    def concat(self, other: 'LinkedList') -> 'LinkedList':
+        """
+        the value of `self @@ other`, which shares self rather than copying it
+        """
+        if self.is_null():
+            return other
+        if other.is_null():
+            return self
+        if type(self) is String and type(other) is String and len(self) + len(other) < Config.flat_strings:
+            return String(self.text() + other.text())
+        return Concat(self, other)
+
     def last(self: Expr) -> Expr:
         pass
 
@@ -620,6 +992,9 @@ class LinkedList(Expr):
     def __iter__(self) -> 'ListIterator':
         return ListIterator(self)
 
+    def hash_key(self) -> tuple:
+        return tuple(value.hash_key() for value in self)
+
     def __cmp__(self, other: 'LinkedList'):
         pass
 
@@ -636,6 +1011,64 @@ class Pair(LinkedList):
     def cdr(self) -> LinkedList:
         return self._cdr
 
+    def resolve(self, scope: 'environment.Scope') -> Expr:
+        pair = self
+        while type(pair) is Pair:  # iterative, lists such as string literals can be long
+            pair._car = pair._car.resolve(scope)
+            pair = pair._cdr
+        return self
+
+    def resolve_farg(self, scope: 'environment.Scope'):
+        self._car.resolve_farg(scope)
+        self._cdr.resolve_farg(scope)
+
+    def elements(self) -> 'types.Maybe[list]':
+        """
+        the elements of a proper list in a python list, otherwise None
+        """
+        elements = []
+        pair = self
+        while type(pair) is Pair:
+            elements.append(pair._car)
+            pair = pair._cdr
+        if type(pair) is Null:
+            return elements
+        return None
+
+    def compile(self) -> 'types.Code':
+        elements = self.elements()
+        if elements is None or self.compile_value() is not None:
+            return super().compile()
+        evaluate_elements = compile_each(elements)
+
+        def evaluate_list(env: 'environment.Environment',
+                          ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+            return evaluate_elements(env, lambda values, amb: trampoline.call(ret, make_list(values), amb), amb)
+        return evaluate_list
+
+    def compile_value(self) -> 'types.Maybe[callable]':
+        elements = self.elements()
+        if elements is None:
+            return None
+        values = [element.compile_value() for element in elements]
+        if any(value is None for value in values):
+            return None
+        return lambda env: make_list([value(env) for value in values])
+
+    def convert(self, converter: 'cps.Converter', env: 'cps.value', c: 'cps.MetaContinuation') -> 'cps.cexp':
+        elements = self.elements()
+        if elements is None:
+            return super().convert(converter, env, c)
+        return converter.each(elements, env, lambda values: converter.primop(cps.primop.list, values, c))
+
+    def emit(self, emitter: 'vm.Emitter', tail: bool):
+        elements = self.elements()
+        if elements is None:
+            return super().emit(emitter, tail)
+        emitter.each(elements)
+        emitter.emit(vm.MAKEREC, len(elements))
+        emitter.value(tail)
+
     def eval(self, env: 'environment.Environment', ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
         # noinspection PyShadowingNames
@@ -644,17 +1077,19 @@ class Pair(LinkedList):
             # noinspection PyShadowingNames
             def cdr_continuation(evaluated_cdr: LinkedList, amb: ambivalence.Amb) -> types.Promise:
                 verify(amb)
-                return lambda: ret(Pair(evaluated_car, evaluated_cdr), amb)
+                return trampoline.call(ret, Pair(evaluated_car, evaluated_cdr), amb)
 
-            return lambda: self._cdr.eval(env, cdr_continuation, amb)
+            return trampoline.call(self._cdr.eval, env, cdr_continuation, amb)
 
         return self._car.eval(env, car_continuation, amb)
 
     def last(self) -> Expr:
-        if self._len == 1:
-            return self._car
-        else:
-            return self._cdr.last()
+        pair = self
+        while type(pair) is Pair and pair._len > 1:
+            pair = pair._cdr
+        if type(pair) is Pair:
+            return pair._car
+        return pair.last()
 
     def __len__(self) -> int:
         return self._len
@@ -663,43 +1098,88 @@ class Pair(LinkedList):
         return type(self._car) is Char
 
     def qualified_str(self, start: str, sep: str, end: str) -> str:
-        return start + str(self._car) + self._cdr.trailing_str(sep, end)
+        strs = []
+        pair = self
+        while type(pair) is Pair:
+            strs.append(str(pair._car))
+            pair = pair._cdr
+        return start + sep.join(strs) + pair.trailing_str(sep, end)
 
     def qualified_repr(self, start: str, sep: str, end: str) -> str:
-        return start + repr(self._car) + self._cdr.trailing_repr(sep, end)
+        reprs = []
+        pair = self
+        while type(pair) is Pair:
+            reprs.append(repr(pair._car))
+            pair = pair._cdr
+        return start + sep.join(reprs) + pair.trailing_repr(sep, end)
 
     def trailing_str(self, sep: str, end: str) -> str:
-        return sep + str(self._car) + self._cdr.trailing_str(sep, end)
+        return self.qualified_str(sep, sep, end)
 
     def trailing_repr(self, sep: str, end: str) -> str:
-        return sep + repr(self._car) + self._cdr.trailing_repr(sep, end)
+        return self.qualified_repr(sep, sep, end)
 
     def append(self, other: LinkedList) -> LinkedList:
-        return Pair(self._car, self._cdr.append(other))
+        """
+        a copy of self ending in other
+        """
+        cars = []
+        pair = self
+        while type(pair) is Pair:
+            cars.append(pair._car)
+            pair = pair._cdr
+        result = pair.append(other)
+        for car in reversed(cars):
+            result = Pair(car, result)
+        return result
 
     def match(self, other: 'LinkedList', env: 'environment.Environment', ret: types.Continuation,
               amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
+        if other.is_null():
+            return trampoline.call(amb)
+
         # noinspection PyShadowingNames
         def car_continuation(_, amb) -> types.Promise:
             verify(amb)
-            return lambda: self.cdr().match(other.cdr(), env, ret, amb)
+            return trampoline.call(self.cdr().match, other.cdr(), env, ret, amb)
+
+        return trampoline.call(self.car().match, other.car(), env, car_continuation, amb)
 
-        return lambda: self.car().match(other.car(), env, car_continuation, amb)
+    def split(self, constructors: dict) -> 'match.Split':
+        return match.Test(match.LIST, False, [self._car, self._cdr])
+
+    def collect_symbols(self, symbols: set):
+        self._car.collect_symbols(symbols)
+        self._cdr.collect_symbols(symbols)
 
     @trace
     def analyse_internal(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
         self_type = inference.TypeOperator('list', self._car.analyse_internal(env, non_generic))
-        rest_type = self.cdr().analyse_internal(env, non_generic)
-        self_type.unify(rest_type)
+        pair = self._cdr
+        while type(pair) is Pair:
+            self_type.unify(inference.TypeOperator('list', pair._car.analyse_internal(env, non_generic)))
+            pair = pair._cdr
+        self_type.unify(pair.analyse_internal(env, non_generic))
         return self_type
 
     def prepare_analysis(self, env: inference.TypeEnvironment):
-        self.car().prepare_analysis(env)
-        self.cdr().prepare_analysis(env)
+        pair = self
+        while type(pair) is Pair:
+            pair._car.prepare_analysis(env)
+            pair = pair._cdr
+        pair.prepare_analysis(env)
 
     def map(self, fn: callable) -> LinkedList:
-        return Pair(fn(self._car), self._cdr.map(fn))
+        cars = []
+        pair = self
+        while type(pair) is Pair:
+            cars.append(fn(pair._car))
+            pair = pair._cdr
+        result = pair.map(fn)
+        for car in reversed(cars):
+            result = Pair(car, result)
+        return result
 
     def analyse_farg(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
         """
@@ -728,10 +1208,18 @@ class Pair(LinkedList):
         return analyse_recursive(self)
 
     def __eq__(self, other: LinkedList) -> bool:
-        if type(other) is Pair:
-            return self._car == other.car() and self._cdr == other.cdr()
-        else:
+        pair = self
+        while isinstance(pair, Pair) and isinstance(other, Pair):
+            if len(pair) != len(other):
+                return False
+            if type(pair) is String and type(other) is String:
+                return pair == other
+            if pair.car() != other.car():
+                return False
+            pair, other = pair.cdr(), other.cdr()
+        if isinstance(pair, Pair) or isinstance(other, Pair):
             return False
+        return pair == other
 
     def __getitem__(self, item) -> Expr:
         if type(item) is not int:
@@ -749,93 +1237,401 @@ class Pair(LinkedList):
         return val.car()
 
     def __cmp__(self, other: LinkedList):
-        if isinstance(other, Null):
-            return 1
-        if self.car() == (other.car()):
-            return self.cdr().__cmp__(other.cdr())
-        else:
-            return -1 if self.car() < other.car() else 1
+        lst = self
+        while True:
+            if lst.is_null():
+                return 0 if other.is_null() else -1
+            if other.is_null():
+                return 1
+            if type(lst) is String and type(other) is String:
+                return lst.__cmp__(other)
+            if lst.car() != other.car():
+                return -1 if lst.car() < other.car() else 1
+            lst, other = lst.cdr(), other.cdr()
+
+
+class LazyList(Pair):
+    """
+    a non-empty list value that only makes its pairs when a program takes it apart.
+    Subclasses provide car, cdr and __len__
+    """
 
+    _car = property(lambda self: self.car())
+    _cdr = property(lambda self: self.cdr())
 
-class Null(LinkedList, metaclass=Singleton):
-    def analyse_farg(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
-        return self.type()
+    eval = Expr.eval
+    compile = Expr.compile
+    compile_value = Expr.compile_value
+    convert = Expr.convert
+    emit = Expr.emit
 
-    def is_null(self) -> bool:
-        return True
+    def resolve(self, scope: 'environment.Scope') -> Expr:
+        return self
 
-    def car(self) -> Expr:
-        raise PySchemeRunTimeError("cannot take the car of null")
+    def resolve_farg(self, scope: 'environment.Scope'):
+        pass
 
-    def cdr(self) -> LinkedList:
-        raise PySchemeRunTimeError("cannot take the cdr of null")
+    def elements(self) -> list:
+        return list(self)
 
-    def last(self) -> Expr:
-        return self
+    def collect_symbols(self, symbols: set):
+        pass
+
+    def prepare_analysis(self, env: inference.TypeEnvironment):
+        pass
 
     def qualified_str(self, start: str, sep: str, end: str) -> str:
-        return start + end
+        return start + sep.join(str(item) for item in self) + end
 
     def qualified_repr(self, start: str, sep: str, end: str) -> str:
-        return start + end
-
-    def trailing_str(self, sep: str, end: str) -> str:
-        return end
-
-    def trailing_repr(self, sep: str, end: str) -> str:
-        return end
+        return start + sep.join(repr(item) for item in self) + end
 
     def append(self, other: LinkedList) -> LinkedList:
-        return other
+        result = other
+        for item in reversed(list(self)):
+            result = Pair(item, result)
+        return result
 
     def map(self, fn: callable) -> LinkedList:
-        return self
+        return make_list([fn(item) for item in self])
 
-    def is_constant(self):
+
+class String(LazyList):
+    """
+    a list of Char backed by a python str, from its start'th character on
+    """
+
+    def __init__(self, value: str, start: int = 0):
+        self._value = value
+        self._start = start
+        self._len = len(value) - start
+        self._first = None
+        self._rest = None
+
+    def car(self) -> Char:
+        if self._first is None:
+            self._first = Char(self._value[self._start])
+        return self._first
+
+    def cdr(self) -> LinkedList:
+        if self._rest is None:
+            if self._len == 1:
+                self._rest = Null()
+            else:
+                self._rest = String(self._value, self._start + 1)
+        return self._rest
+
+    def text(self) -> str:
+        return self._value[self._start:]
+
+    def hash_key(self) -> tuple:
+        return tuple(self.text())
+
+    @trace
+    def analyse_internal(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
+        return self.type(Char.type())
+
+    def analyse_farg(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
+        return self.type(Char.type())
+
+    def last(self) -> Char:
+        return Char(self._value[-1])
+
+    def is_string(self):
         return True
 
-    def match(self, other: 'Expr', env: 'environment.Environment', ret: types.Continuation,
-              amb: ambivalence.Amb) -> types.Promise:
-        verify(amb)
-        if self == other:
-            return lambda: ret(self, amb)
-        else:
-            return lambda: amb()
+    def qualified_str(self, start: str, sep: str, end: str) -> str:
+        return start + sep.join(self.text()) + end
 
-    def __len__(self) -> int:
-        return 0
+    qualified_repr = qualified_str
 
-    def __eq__(self, other: Expr) -> bool:
-        return other.is_null()
+    def append(self, other: LinkedList) -> LinkedList:
+        if type(other) is String:
+            return String(self.text() + other.text())
+        return super().append(other)
 
-    def __getitem__(self, item: int):
+    def __iter__(self):
+        return (Char(c) for c in self.text())
+
+    def __getitem__(self, item) -> Char:
         if type(item) is not int:
             raise TypeError
-        raise KeyError
+        if item < 0 or item >= self._len:
+            raise KeyError
+        return Char(self._value[self._start + item])
 
-    def static_type(self) -> bool:
-        return True
+    def __eq__(self, other: LinkedList) -> bool:
+        if type(other) is String:
+            return self._len == other._len and self.text() == other.text()
+        return super().__eq__(other)
 
     def __cmp__(self, other: LinkedList):
-        if isinstance(other, Null):
-            return 0
-        else:
-            return -1
+        if type(other) is String:
+            text, other_text = self.text(), other.text()
+            return 0 if text == other_text else -1 if text < other_text else 1
+        return super().__cmp__(other)
 
 
-class ListIterator:
-    def __init__(self, lst: LinkedList):
-        self._lst = lst
+class Concat(LazyList):
+    """
+    the value of `left @@ right` for non-empty lists: a rope that shares left rather than copying it
+    """
 
-    def __next__(self) -> Expr:
-        if self._lst.is_null():
-            raise StopIteration
+    def __init__(self, left: LinkedList, right: LinkedList):
+        self._left = left
+        self._right = right
+        self._len = len(left) + len(right)
+        self._rest = None
+
+    def car(self) -> Expr:
+        lst = self._left
+        while type(lst) is Concat:
+            lst = lst._left
+        return lst.car()
+
+    def cdr(self) -> LinkedList:
+        if self._rest is None:
+            rights = []
+            lst = self
+            while type(lst) is Concat:  # left-nested ropes from `a @@ b @@ c` are rotated to the right
+                rights.append(lst._right)
+                lst = lst._left
+            rest = rights[0]
+            for right in rights[1:]:
+                rest = Concat(right, rest)
+            self._rest = lst.cdr().concat(rest)
+        return self._rest
+
+    def __iter__(self):
+        stack = [self]
+        while len(stack) > 0:
+            lst = stack.pop()
+            while type(lst) is Pair:
+                yield lst.car()
+                lst = lst.cdr()
+            if type(lst) is Concat:
+                stack.append(lst._right)
+                stack.append(lst._left)
+            elif not lst.is_null():
+                yield from lst
+
+    def last(self) -> Expr:
+        lst = self
+        while type(lst) is Concat:
+            lst = lst._right
+        return lst.last()
+
+
+class Arguments(LazyList):
+    """
+    the evaluated arguments to a primitive, backed by a python tuple from its start'th value on,
+    so that primitives can index them in constant time
+    """
+
+    def __init__(self, values: tuple, start: int = 0):
+        self._values = values
+        self._start = start
+        self._len = len(values) - start
+
+    def car(self) -> Expr:
+        return self._values[self._start]
+
+    def cdr(self) -> LinkedList:
+        if self._len == 1:
+            return Null()
+        return Arguments(self._values, self._start + 1)
+
+    def values(self) -> tuple:
+        return self._values[self._start:]
+
+    def __iter__(self):
+        return iter(self.values())
+
+    def __getitem__(self, item) -> Expr:
+        if type(item) is not int:
+            raise TypeError
+        if item < 0 or item >= self._len:
+            raise KeyError
+        return self._values[self._start + item]
+
+    def last(self) -> Expr:
+        return self._values[-1]
+
+
+class Null(LinkedList, metaclass=Singleton):
+    def analyse_farg(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
+        return self.type()
+
+    def is_null(self) -> bool:
+        return True
+
+    def car(self) -> Expr:
+        raise PySchemeRunTimeError("cannot take the car of null")
+
+    def cdr(self) -> LinkedList:
+        raise PySchemeRunTimeError("cannot take the cdr of null")
+
+    def last(self) -> Expr:
+        return self
+
+    def qualified_str(self, start: str, sep: str, end: str) -> str:
+        return start + end
+
+    def qualified_repr(self, start: str, sep: str, end: str) -> str:
+        return start + end
+
+    def trailing_str(self, sep: str, end: str) -> str:
+        return end
+
+    def trailing_repr(self, sep: str, end: str) -> str:
+        return end
+
+    def append(self, other: LinkedList) -> LinkedList:
+        return other
+
+    def map(self, fn: callable) -> LinkedList:
+        return self
+
+    def is_constant(self):
+        return True
+
+    def match(self, other: 'Expr', env: 'environment.Environment', ret: types.Continuation,
+              amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        if self == other:
+            return trampoline.call(ret, self, amb)
+        else:
+            return trampoline.call(amb)
+
+    def split(self, constructors: dict) -> 'match.Split':
+        return match.Test(match.LIST, True, [])
+
+    def __len__(self) -> int:
+        return 0
+
+    def __eq__(self, other: Expr) -> bool:
+        return other.is_null()
+
+    def __getitem__(self, item: int):
+        if type(item) is not int:
+            raise TypeError
+        raise KeyError
+
+    def static_type(self) -> bool:
+        return True
+
+    def __cmp__(self, other: LinkedList):
+        if isinstance(other, Null):
+            return 0
+        else:
+            return -1
+
+
+class ListIterator:
+    def __init__(self, lst: LinkedList):
+        self._lst = lst
+
+    def __next__(self) -> Expr:
+        if self._lst.is_null():
+            raise StopIteration
         else:
             val = self._lst.car()
             self._lst = self._lst.cdr()
             return val
 
 
+class Vector(Expr):
+    """
+    a homogeneous vector of ints, packed into a python array of 64-bit machine words.
+    Vectors are never modified, the vector primitives all return new ones
+    """
+
+    def __init__(self, values: array):
+        self._values = values
+
+    @classmethod
+    def type(cls):
+        return inference.TypeOperator('vector', Number.type())
+
+    def values(self) -> array:
+        return self._values
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def hash_key(self) -> bytes:
+        return self._values.tobytes()
+
+    def __cmp__(self, other: 'Vector'):
+        if self._values < other.values():
+            return -1
+        elif self._values == other.values():
+            return 0
+        else:
+            return 1
+
+    def __str__(self) -> str:
+        return 'vector[' + ', '.join(str(value) for value in self._values) + ']'
+
+    __repr__ = __str__
+
+
+class HashMap(Expr):
+    """
+    a persistent hash map, see hamt.py.
+    The trie maps the hash_key of each key to the pair of the key itself and its value
+    """
+
+    def __init__(self, entries: 'types.Maybe[hamt.HAMT]'=None):
+        self._entries = hamt.HAMT() if entries is None else entries
+
+    @classmethod
+    def type(cls, key=None, value=None):
+        if key is None:
+            key = inference.TypeVariable()
+        if value is None:
+            value = inference.TypeVariable()
+        return inference.TypeOperator('map', key, value)
+
+    def static_type(self) -> bool:
+        return True
+
+    def insert(self, key: Expr, value: Expr) -> 'HashMap':
+        return HashMap(self._entries.set(key.hash_key(), (key, value)))
+
+    def lookup(self, key: Expr) -> 'types.Maybe[Expr]':
+        entry = self._entries.get(key.hash_key())
+        return None if entry is None else entry[1]
+
+    def remove(self, key: Expr) -> 'HashMap':
+        entries = self._entries.remove(key.hash_key())
+        return self if entries is self._entries else HashMap(entries)
+
+    def contains(self, key: Expr) -> bool:
+        return key.hash_key() in self._entries
+
+    def items(self) -> list:
+        """
+        the (key, value) pairs, in order of their keys
+        """
+        return sorted((entry for _, entry in self._entries.items()), key=lambda entry: entry[0])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __cmp__(self, other: 'HashMap'):
+        items, other_items = self.items(), other.items()
+        if items == other_items:
+            return 0
+        return -1 if items < other_items else 1
+
+    def __str__(self) -> str:
+        return '{' + ', '.join(str(key) + ': ' + str(value) for key, value in self.items()) + '}'
+
+    def __repr__(self) -> str:
+        return '{' + ', '.join(repr(key) + ': ' + repr(value) for key, value in self.items()) + '}'
+
+
 class Conditional(Expr):
     def __init__(self, test: Expr, consequent: Expr, alternative: Expr):
         self._test = test
@@ -848,12 +1644,62 @@ class Conditional(Expr):
         def test_continuation(result: Expr, amb: ambivalence.Amb) -> types.Promise:
             verify(amb)
             if result.is_true():
-                return lambda: self._consequent.eval(env, ret, amb)
+                return trampoline.call(self._consequent.eval, env, ret, amb)
             else:
-                return lambda: self._alternative.eval(env, ret, amb)
+                return trampoline.call(self._alternative.eval, env, ret, amb)
 
         return self._test.eval(env, test_continuation, amb)
 
+    def resolve(self, scope: 'environment.Scope') -> Expr:
+        self._test = self._test.resolve(scope)
+        self._consequent = self._consequent.resolve(scope)
+        self._alternative = self._alternative.resolve(scope)
+        return self
+
+    def compile(self) -> 'types.Code':
+        consequent = self._consequent.compile()
+        alternative = self._alternative.compile()
+        test_value = self._test.compile_value()
+        if test_value is not None:
+            def evaluate_conditional(env: 'environment.Environment',
+                                     ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+                if test_value(env).is_true():
+                    return consequent(env, ret, amb)
+                else:
+                    return alternative(env, ret, amb)
+            return evaluate_conditional
+
+        test = self._test.compile()
+
+        def evaluate_test(env: 'environment.Environment',
+                          ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+            def test_continuation(result: Expr, amb: ambivalence.Amb) -> types.Promise:
+                if result.is_true():
+                    return trampoline.call(consequent, env, ret, amb)
+                else:
+                    return trampoline.call(alternative, env, ret, amb)
+            return test(env, test_continuation, amb)
+        return evaluate_test
+
+    def convert(self, converter: 'cps.Converter', env: 'cps.value', c: 'cps.MetaContinuation') -> 'cps.cexp':
+        return converter.reify(c, lambda k: self._test.convert(converter, env, lambda test: converter.branch(
+            cps.primop.istrue, test,
+            self._consequent.convert(converter, env, converter.tail(k)),
+            self._alternative.convert(converter, env, converter.tail(k))
+        )))
+
+    def emit(self, emitter: 'vm.Emitter', tail: bool):
+        alternative = emitter.label()
+        end = emitter.label()
+        self._test.emit(emitter, False)
+        emitter.emit(vm.JFALSE, alternative)
+        self._consequent.emit(emitter, tail)
+        if not tail:
+            emitter.emit(vm.JMP, end)
+        emitter.place(alternative)
+        self._alternative.emit(emitter, tail)
+        emitter.place(end)
+
     @trace
     def analyse_internal(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
         boolean_type = Boolean.type()
@@ -872,6 +1718,8 @@ class Conditional(Expr):
 
 
 class Lambda(Expr):
+    variables = None  # set by analysis, see plain_variables
+
     def __init__(self, args: LinkedList, body: Expr):
         self._args = args
         self._body = body
@@ -886,11 +1734,11 @@ class Lambda(Expr):
     def eval(self, env: 'environment.Environment', ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
         if len(self._args) == 0:
-            return lambda: self._body.eval(env, ret, amb)  # conform to type-checker's expectations
+            return trampoline.call(self._body.eval, env, ret, amb)  # conform to type-checker's expectations
         else:
             closure = self.closure(self._args, self._body, env)
             closure.set_name(self.name)
-            return lambda: ret(closure, amb)
+            return trampoline.call(ret, closure, amb)
 
     def closure(self, args: LinkedList, body: Expr, env: 'environment.Environment') -> 'Closure':
         """
@@ -898,10 +1746,56 @@ class Lambda(Expr):
         """
         return Closure(args, body, env)
 
+    def plain_variables(self, env: inference.TypeEnvironment) -> 'types.Maybe[tuple]':
+        """
+        if every formal argument is a distinct symbol that is not a type constructor,
+        so that matching the arguments can only bind them, return the symbols in a tuple
+        """
+        args = tuple(self._args)
+        if all(type(arg) is Symbol and not env.noted_type_constructor(arg) for arg in args) \
+                and len(set(args)) == len(args):
+            return args
+        return None
+
+    def compile(self) -> 'types.Code':
+        if len(self._args) == 0:
+            return self._body.compile()
+        return super().compile()
+
+    def compile_value(self) -> 'types.Maybe[callable]':
+        if len(self._args) == 0:
+            return None
+        return self.closure_maker(Compiled(self._body.compile(), self._body))
+
+    def closure_maker(self, body: Expr) -> callable:
+        """
+        a function from env to a closure of this lambda's arguments over body
+        """
+        args = self._args
+
+        def make_closure(env: 'environment.Environment') -> Closure:
+            closure = self.closure(args, body, env)
+            closure.set_name(self.name)
+            return closure
+        return make_closure
+
+    def convert(self, converter: 'cps.Converter', env: 'cps.value', c: 'cps.MetaContinuation') -> 'cps.cexp':
+        if len(self._args) == 0:
+            return self._body.convert(converter, env, c)
+        maker = self.closure_maker(converter.compiled(self._body))
+        return converter.primop(cps.primop.closure, [cps.CONST(maker), env], c)
+
+    def emit(self, emitter: 'vm.Emitter', tail: bool):
+        if len(self._args) == 0:
+            return self._body.emit(emitter, tail)
+        emitter.emit(vm.MAKECLOS, self.closure_maker(emitter.function(self._body, self.variables)))
+        emitter.value(tail)
+
     @trace
     def analyse_internal(self, env: inference.TypeEnvironment, non_generic: set):
         new_env = env.extend()
         new_non_generic = non_generic.copy()
+        self.variables = self.plain_variables(new_env)
 
         def analyse_recursive(args: LinkedList) -> inference.Type:
             if isinstance(args, Null):
@@ -931,10 +1825,81 @@ class Application(Expr):
         verify(amb)
         def evaluated_op_continuation(evaluated_op: 'Op', amb: ambivalence.Amb) -> types.Promise:
             verify(amb)
-            return lambda: evaluated_op.apply(self._operands, env, ret, amb)
+            return trampoline.bounce(evaluated_op.apply, self._operands, env, ret, amb)
 
         return self._operation.eval(env, evaluated_op_continuation, amb)
 
+    def resolve(self, scope: 'environment.Scope') -> Expr:
+        self._operation = self._operation.resolve(scope)
+        self._operands.resolve(scope)
+        return self
+
+    def compile(self) -> 'types.Code':
+        """
+        primitives get their arguments evaluated here by the compiled operands,
+        special forms are passed the compiled operands to evaluate as they see fit.
+        There is no need to bounce, closures bounce before running their bodies.
+        """
+        operands = [operand for operand in self._operands]
+        evaluate_operands = compile_each(operands)
+        unevaluated = make_list([Compiled(operand.compile(), operand) for operand in operands])
+
+        def apply(evaluated_op: Op, env: 'environment.Environment', ret: types.Continuation,
+                  amb: ambivalence.Amb) -> types.Promise:
+            if isinstance(evaluated_op, Primitive):
+                def operands_continuation(evaluated_args: tuple, amb: ambivalence.Amb) -> types.Promise:
+                    return evaluated_op.apply_evaluated_args(make_arguments(evaluated_args), ret, amb)
+                return evaluate_operands(env, operands_continuation, amb)
+            return evaluated_op.apply(unevaluated, env, ret, amb)
+
+        operation_value = self._operation.compile_value()
+        if operation_value is not None:
+            def evaluate_application(env: 'environment.Environment', ret: types.Continuation,
+                                     amb: ambivalence.Amb) -> types.Promise:
+                return apply(operation_value(env), env, ret, amb)
+            return evaluate_application
+
+        operation = self._operation.compile()
+
+        def evaluate_operation(env: 'environment.Environment', ret: types.Continuation,
+                               amb: ambivalence.Amb) -> types.Promise:
+            def evaluated_op_continuation(evaluated_op: Op, amb: ambivalence.Amb) -> types.Promise:
+                return trampoline.call(apply, evaluated_op, env, ret, amb)
+            return operation(env, evaluated_op_continuation, amb)
+        return evaluate_operation
+
+    def convert(self, converter: 'cps.Converter', env: 'cps.value', c: 'cps.MetaContinuation') -> 'cps.cexp':
+        """
+        builtin operators may convert their own applications, otherwise they are at least known
+        to be primitive or special forms
+        """
+        operands = [operand for operand in self._operands]
+        builtin = converter.builtin(self._operation)
+        if builtin is not None:
+            converted = builtin.convert_application(converter, operands, env, c)
+            if converted is not None:
+                return converted
+            return converter.apply(cps.CONST(builtin), operands, env, c, isinstance(builtin, Primitive))
+        return self._operation.convert(
+            converter, env, lambda operation: converter.apply(operation, operands, env, c)
+        )
+
+    def emit(self, emitter: 'vm.Emitter', tail: bool):
+        """
+        as for convert
+        """
+        operands = [operand for operand in self._operands]
+        builtin = emitter.builtin(self._operation)
+        if builtin is not None:
+            if builtin.emit_application(emitter, operands, tail):
+                return
+            emitter.emit(vm.CONST, builtin)
+            if isinstance(builtin, Primitive):
+                return emitter.call(operands, tail)
+            return emitter.apply(operands, tail)
+        self._operation.emit(emitter, False)
+        emitter.apply(operands, tail)
+
     @trace
     def analyse_internal(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
         result_type = inference.TypeVariable()
@@ -960,27 +1925,96 @@ class Application(Expr):
 
 
 class Sequence(Expr):
+    _statements = None
+
     def __init__(self, exprs: LinkedList):
         self._exprs = self.hoist_loads(exprs)
 
+    def statements(self) -> tuple:
+        """
+        the expressions to evaluate: the last, in tail position, and those before it that are not self-evaluating.
+        A literal statement before the last has no effect, its value would only be dropped
+        """
+        if self._statements is None:
+            exprs = tuple(self._exprs)
+            self._statements = tuple(expr for expr in exprs[:-1] if not expr.self_evaluating()) + exprs[-1:]
+        return self._statements
+
     def eval(self, env: 'environment.Environment', ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        """
+        the last expression is given ret itself, so a loop whose body is a sequence
+        doesn't build a chain of continuations. The values of the others are just dropped.
+        """
         verify(amb)
-        if len(self._exprs) > 0:
-            # noinspection PyShadowingNames
-            def take_last_continuation(expr: LinkedList, amb: ambivalence.Amb) -> types.Promise:
-                verify(amb)
-                return lambda: ret(expr.last(), amb)
+        statements = self.statements()
+        if len(statements) == 0:
+            return trampoline.call(ret, Nothing(), amb)
+        last = len(statements) - 1
 
-            return self._exprs.eval(env, take_last_continuation, amb)
-        else:
-            return lambda: ret(Nothing(), amb)
+        # noinspection PyShadowingNames
+        def eval_from(index: int, amb: ambivalence.Amb) -> types.Promise:
+            if index == last:
+                return trampoline.call(statements[index].eval, env, ret, amb)
+
+            def next_continuation(_: Expr, amb: ambivalence.Amb) -> types.Promise:
+                return eval_from(index + 1, amb)
+
+            return trampoline.call(statements[index].eval, env, next_continuation, amb)
+
+        return eval_from(0, amb)
+
+    def resolve(self, scope: 'environment.Scope') -> Expr:
+        self._exprs.resolve(scope)
+        self._statements = None
+        return self
+
+    def compile(self) -> 'types.Code':
+        """
+        chains the compiled expressions together, from the last back to the first
+        """
+        exprs = self.statements()
+        if len(exprs) == 0:
+            return super().compile()
+        code = exprs[-1].compile()
+        for expr in reversed(exprs[:-1]):
+            code = self.compile_then(expr.compile(), code)
+        return code
+
+    @classmethod
+    def compile_then(cls, first: 'types.Code', rest: 'types.Code') -> 'types.Code':
+        def evaluate_first(env: 'environment.Environment', ret: types.Continuation,
+                           amb: ambivalence.Amb) -> types.Promise:
+            def first_continuation(_: Expr, amb: ambivalence.Amb) -> types.Promise:
+                return trampoline.call(rest, env, ret, amb)
+            return first(env, first_continuation, amb)
+        return evaluate_first
+
+    def convert(self, converter: 'cps.Converter', env: 'cps.value', c: 'cps.MetaContinuation') -> 'cps.cexp':
+        exprs = self.statements()
+        if len(exprs) == 0:
+            return c(cps.CONST(Nothing()))
+
+        def convert_from(index: int) -> 'cps.cexp':
+            if index == len(exprs) - 1:
+                return exprs[index].convert(converter, env, c)
+            return exprs[index].convert(converter, env, lambda _: convert_from(index + 1))
+        return convert_from(0)
+
+    def emit(self, emitter: 'vm.Emitter', tail: bool):
+        exprs = self.statements()
+        if len(exprs) == 0:
+            return emitter.constant(Nothing(), tail)
+        for expr in exprs[:-1]:
+            expr.emit(emitter, False)
+        exprs[-1].emit(emitter, tail)
 
     @trace
     def analyse_internal(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
         if len(self._exprs) > 0:
             self._exprs.prepare_analysis(env)
-            these_types = self._exprs.map(lambda expr: expr.analyse_internal(env, non_generic))
-            return these_types.last()
+            for expr in self._exprs:
+                this_type = expr.analyse_internal(env, non_generic)
+            return this_type
         else:
             return Nothing.type()
 
@@ -990,25 +2024,22 @@ class Sequence(Expr):
         merges all load statements at this level into one
         load statement at the front of the list
         """
-        load = [None]
-
-        def hoist_recursive(lst: LinkedList, loaded: list) -> LinkedList:
-            if isinstance(lst, Null):
-                return lst
-            elif isinstance(lst.car(), Load):
-                if loaded[0] is None:
-                    loaded[0] = lst.car()
+        load = None
+        others = []
+        for expr in exprs:
+            if isinstance(expr, Load):
+                if load is None:
+                    load = expr
                 else:
-                    loaded[0].merge(lst.car())
-                return hoist_recursive(lst.cdr(), loaded)
+                    load.merge(expr)
             else:
-                return Pair(lst.car(), hoist_recursive(lst.cdr(), loaded))
-
-        new_list = hoist_recursive(exprs, load)
-        if load[0] is None:
-            return new_list
+                others.append(expr)
+        if load is None:
+            if len(others) == len(exprs):
+                return exprs
         else:
-            return Pair(load[0], new_list)
+            others.insert(0, load)
+        return LinkedList.list(others)
 
     def get_exprs(self):
         return self._exprs
@@ -1018,6 +2049,8 @@ class Sequence(Expr):
 
 
 class Nest(Expr):
+    layout = environment.NO_LAYOUT
+
     def __init__(self, body: Sequence):
         self._body = body
 
@@ -1025,7 +2058,36 @@ class Nest(Expr):
         """Evaluate the body in an extended environment
         """
         verify(amb)
-        return self._body.eval(env.extend(), ret, amb)
+        return self._body.eval(env.extend(layout=self.layout, amb=amb), ret, amb)
+
+    def resolve(self, scope: 'environment.Scope') -> Expr:
+        new_scope = scope.extend()
+        self._body = self._body.resolve(new_scope)
+        self.layout = new_scope.layout()
+        return self
+
+    def compile(self) -> 'types.Code':
+        body = self._body.compile()
+        layout = self.layout
+
+        def evaluate_nest(env: 'environment.Environment', ret: types.Continuation,
+                          amb: ambivalence.Amb) -> types.Promise:
+            return body(env.extend(layout=layout, amb=amb), ret, amb)
+        return evaluate_nest
+
+    def convert(self, converter: 'cps.Converter', env: 'cps.value', c: 'cps.MetaContinuation') -> 'cps.cexp':
+        return converter.primop(
+            cps.primop.extend, [env, cps.CONST(self.layout)],
+            lambda new_env: self._body.convert(converter, new_env, c)
+        )
+
+    def emit(self, emitter: 'vm.Emitter', tail: bool):
+        if tail:  # nothing after the body needs the old environment
+            emitter.emit(vm.EXTEND, self.layout)
+            return self._body.emit(emitter, True)
+        emitter.emit(vm.PUSHENV, self.layout)
+        self._body.emit(emitter, False)
+        emitter.emit(vm.POPENV)
 
     @trace
     def analyse_internal(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
@@ -1062,6 +2124,8 @@ class Env(Expr):
     3. return the new environment in an EnvironmentWrapper expression
     """
 
+    layout = environment.NO_LAYOUT
+
     def __init__(self, body: Sequence, package: LinkedList):
         self._body = body
         self._package = package
@@ -1070,6 +2134,14 @@ class Env(Expr):
         """evaluate the body in an extended env then return the extended env as the result
         """
         verify(amb)
+        return self.eval_body(self._body.eval, env, ret, amb)
+
+    def compile(self) -> 'types.Code':
+        body = self._body.compile()
+        return lambda env, ret, amb: self.eval_body(body, env, ret, amb)
+
+    def eval_body(self, body: 'types.Code', env: 'environment.Environment', ret: types.Continuation,
+                  amb: ambivalence.Amb) -> types.Promise:
         new_env = None
 
         def lookup_package(
@@ -1080,12 +2152,12 @@ class Env(Expr):
         ) -> types.Promise:
             verify(amb)
             if isinstance(package, Null):
-                return lambda: ret(env, amb)
+                return trampoline.call(ret, env, amb)
             else:
                 def next_step(env: EnvironmentWrapper, amb: ambivalence.Amb) -> types.Promise:
                     verify(amb)
                     return lookup_package(package.cdr(), env.env(), ret, amb)
-                return lambda: env.lookup(package.car(), next_step, amb)
+                return trampoline.call(env.lookup, package.car(), next_step, amb)
 
         def after_eval(_: Expr, amb: ambivalence.Amb) -> types.Promise:
             verify(amb)
@@ -1095,29 +2167,72 @@ class Env(Expr):
         def after_lookup(env: 'environment.Environment', amb: ambivalence.Amb) -> types.Promise:
             verify(amb)
             nonlocal new_env
-            new_env = env.extend()
-            return self._body.eval(new_env, after_eval, amb)
+            new_env = env.extend(layout=self.layout, amb=amb)
+            return body(new_env, after_eval, amb)
 
         return lookup_package(self._package, env, after_lookup, amb)
 
+    def convert(self, converter: 'cps.Converter', env: 'cps.value', c: 'cps.MetaContinuation') -> 'cps.cexp':
+        def convert_package(package: LinkedList, env: 'cps.value') -> 'cps.cexp':
+            if type(package) is Null:
+                return converter.primop(
+                    cps.primop.extend, [env, cps.CONST(self.layout)],
+                    lambda new_env: self._body.convert(
+                        converter, new_env, lambda _: converter.primop(cps.primop.wrap, [new_env], c)
+                    )
+                )
+            return converter.lookup(env, package.car(), 0, None, lambda wrapper: converter.primop(
+                cps.primop.unwrap, [wrapper], lambda env: convert_package(package.cdr(), env)
+            ))
+        return convert_package(self._package, env)
+
+    def resolve(self, scope: 'environment.Scope') -> Expr:
+        """
+        an env extending a package is not lexically scoped beyond itself
+        """
+        new_scope = scope.extend(opaque=not isinstance(self._package, Null))
+        self._body = self._body.resolve(new_scope)
+        self.layout = new_scope.layout()
+        return self
+
     @trace
     def analyse_internal(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
-        def lookup_env(package: LinkedList, env: inference.TypeEnvironment) -> inference.TypeEnvironment:
-            if isinstance(package, Null):
-                return env
-            else:
-                new_env = env[(package.car())].prune().env()
-                if not isinstance(new_env, inference.TypeEnvironment):
-                    raise PySchemeInferenceError(
-                        str(package.car())
-                        + " is not an environment, it is "
-                        + str(type(new_env)))
-                return lookup_env(package.cdr(), new_env)
-
-        new_env = lookup_env(self._package, env).extend()
+        new_env = self.lookup_type_env(self._package, env).extend()
         self._body.analyse_internal(new_env, non_generic.copy())
         return inference.EnvironmentType(new_env)
 
+    @classmethod
+    def lookup_type_env(cls, package: LinkedList, env: inference.TypeEnvironment) -> inference.TypeEnvironment:
+        if isinstance(package, Null):
+            return env
+        else:
+            new_env = env[(package.car())].prune().env()
+            if not isinstance(new_env, inference.TypeEnvironment):
+                raise PySchemeInferenceError(
+                    str(package.car())
+                    + " is not an environment, it is "
+                    + str(type(new_env)))
+            return cls.lookup_type_env(package.cdr(), new_env)
+
+
+class PackageEnv(Env):
+    """
+    The env wrapping the contents of a loaded package file.
+    The type of the package is inferred once and then re-used from the package_cache.TypeCache
+    """
+
+    def __init__(self, body: Sequence, package: LinkedList, path: Path):
+        super(PackageEnv, self).__init__(body, package)
+        self._path = path
+
+    @trace
+    def analyse_internal(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
+        return package_cache.TypeCache(self._path).fetch(
+            self._body,
+            self.lookup_type_env(self._package, env),
+            lambda: super(PackageEnv, self).analyse_internal(env, non_generic)
+        )
+
 
 class Definition(Expr):
     """
@@ -1134,11 +2249,49 @@ class Definition(Expr):
             verify(amb)
             def ret_nothing(_: Expr, amb: ambivalence.Amb) -> types.Promise:
                 verify(amb)
-                return lambda: ret(Nothing(), amb)
+                return trampoline.call(ret, Nothing(), amb)
+
+            return trampoline.call(env.define, self._symbol, value, ret_nothing, amb, True)
+
+        return trampoline.call(self._value.eval, env, define_continuation, amb)
+
+    def resolve(self, scope: 'environment.Scope') -> Expr:
+        scope.bind(self._symbol)
+        self._value = self._value.resolve(scope)
+        return self
 
-            return lambda: env.define(self._symbol, value, ret_nothing, amb, True)
+    def compile(self) -> 'types.Code':
+        symbol = self._symbol
 
-        return lambda: self._value.eval(env, define_continuation, amb)
+        def define(value: Expr, env: 'environment.Environment', ret: types.Continuation,
+                   amb: ambivalence.Amb) -> types.Promise:
+            def ret_nothing(_: Expr, amb: ambivalence.Amb) -> types.Promise:
+                return trampoline.call(ret, Nothing(), amb)
+            return env.define(symbol, value, ret_nothing, amb, True)
+
+        value = self._value.compile_value()
+        if value is not None:
+            def define_value(env: 'environment.Environment', ret: types.Continuation,
+                             amb: ambivalence.Amb) -> types.Promise:
+                return define(value(env), env, ret, amb)
+            return define_value
+
+        code = self._value.compile()
+
+        def evaluate_definition(env: 'environment.Environment', ret: types.Continuation,
+                                amb: ambivalence.Amb) -> types.Promise:
+            return code(env, lambda value, amb: trampoline.call(define, value, env, ret, amb), amb)
+        return evaluate_definition
+
+    def convert(self, converter: 'cps.Converter', env: 'cps.value', c: 'cps.MetaContinuation') -> 'cps.cexp':
+        return self._value.convert(converter, env, lambda value: cps.PRIMOP(
+            cps.primop.define, [env, cps.CONST(self._symbol), value], [], [c(cps.CONST(Nothing()))]
+        ))
+
+    def emit(self, emitter: 'vm.Emitter', tail: bool):
+        self._value.emit(emitter, False)
+        emitter.emit(vm.DEFINE, self._symbol)
+        emitter.value(tail)
 
     def prepare_analysis(self, env: inference.TypeEnvironment):
         if env.noted_type_constructor(self._symbol):
@@ -1170,10 +2323,38 @@ class EnvContext(Expr):
         verify(amb)
         def env_continuation(new_env: EnvironmentWrapper, amb: ambivalence.Amb) -> types.Promise:
             verify(amb)
-            return lambda: self._expr.eval(new_env.env(), ret, amb)
+            return trampoline.call(self._expr.eval, new_env.env(), ret, amb)
 
         return self._env.eval(env, env_continuation, amb)
 
+    def resolve(self, scope: 'environment.Scope') -> Expr:
+        """
+        the right hand side is evaluated in another environment, so is left for lookup by name
+        """
+        self._env = self._env.resolve(scope)
+        return self
+
+    def compile(self) -> 'types.Code':
+        if self.compile_value() is not None:
+            return super().compile()
+        lhs = self._env.compile()
+        rhs = self._expr.compile()
+        return lambda env, ret, amb: lhs(
+            env, lambda new_env, amb: trampoline.call(rhs, new_env.env(), ret, amb), amb
+        )
+
+    def compile_value(self) -> 'types.Maybe[callable]':
+        lhs = self._env.compile_value()
+        rhs = self._expr.compile_value()
+        if lhs is None or rhs is None:
+            return None
+        return lambda env: rhs(lhs(env).env())
+
+    def convert(self, converter: 'cps.Converter', env: 'cps.value', c: 'cps.MetaContinuation') -> 'cps.cexp':
+        return self._env.convert(converter, env, lambda wrapper: converter.primop(
+            cps.primop.unwrap, [wrapper], lambda new_env: self._expr.convert(converter, new_env, c)
+        ))
+
     @trace
     def analyse_internal(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
         lhs = self._env.analyse_internal(env, non_generic)
@@ -1195,8 +2376,22 @@ class Op(Expr):
               amb: ambivalence.Amb) -> types.Promise:
         pass
 
-
-class Primitive(Op):
+    def convert_application(self, converter: 'cps.Converter', operands: list, env: 'cps.value',
+                            c: 'cps.MetaContinuation') -> 'types.Maybe[cps.cexp]':
+        """
+        for builtins, CPS conversion of an application of this operator, if it has one
+        """
+        return None
+
+    def emit_application(self, emitter: 'vm.Emitter', operands: list, tail: bool) -> bool:
+        """
+        for builtins, emit the instructions for an application of this operator if it has any,
+        returning whether it did
+        """
+        return False
+
+
+class Primitive(Op):
     """primitive operators can have their arguments evaluated for them
     """
 
@@ -1205,13 +2400,49 @@ class Primitive(Op):
         verify(amb)
         def deferred_apply(evaluated_args: LinkedList, amb: ambivalence.Amb) -> types.Promise:
             verify(amb)
-            return lambda: self.apply_evaluated_args(evaluated_args, ret, amb)
+            return trampoline.call(self.apply_evaluated_args, evaluated_args, ret, amb)
 
         return args.eval(env, deferred_apply, amb)
 
     def apply_evaluated_args(self, args, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         pass
 
+    def primop(self) -> 'types.Maybe[cps.primop]':
+        """
+        the CPS primop equivalent to applying this primitive to all its arguments, if any
+        """
+        return None
+
+    def native(self, num_args: int) -> 'types.Maybe[callable]':
+        """
+        a python function from num_args evaluated arguments to the value of applying this primitive to them,
+        if its primop just computes that value
+        """
+        primop = self.primop()
+        if primop is None or cps.arity.get(primop) != num_args:
+            return None
+        opcode, fn = cps.operations()[primop]
+        if opcode not in (cps.CALL1, cps.CALL2):
+            return None
+        return fn
+
+    def convert_application(self, converter: 'cps.Converter', operands: list, env: 'cps.value',
+                            c: 'cps.MetaContinuation') -> 'types.Maybe[cps.cexp]':
+        primop = self.primop()
+        if primop is None or len(operands) != cps.arity[primop]:
+            return None
+        return converter.each(operands, env, lambda args: converter.primop(primop, args, c))
+
+    def emit_application(self, emitter: 'vm.Emitter', operands: list, tail: bool) -> bool:
+        primop = self.primop()
+        if primop is None or len(operands) != cps.arity[primop]:
+            return False
+        emitter.each(operands[:-1])
+        operands[-1].emit(emitter, False)
+        emitter.emit(vm.PRIM1 if len(operands) == 1 else vm.PRIM2, emitter.operation(primop))
+        emitter.value(tail)
+        return True
+
 
 class SpecialForm(Op):
     """special forms evaluate their own arguments
@@ -1223,6 +2454,8 @@ class Closure(Primitive):
     """closures are created by evaluating a lambda (fn)
     """
 
+    tag = None  # of the NamedTuples it makes, if it is a type constructor
+
     def __init__(self, args: LinkedList, body: Expr, env: 'environment.Environment'):
         self._args = args
         self._body = body
@@ -1247,16 +2480,16 @@ class Closure(Primitive):
             formal_args = formal_args.cdr()
             actual_args = actual_args.cdr()
         if type(formal_args) is not Null:  # currying
-            return lambda: ret(Closure(formal_args, self._body, self._env.extend(dictionary)), amb)
+            return trampoline.call(ret, Closure(formal_args, self._body, self._env.extend(dictionary)), amb)
         elif type(actual_args) is not Null:  # over-complete function application
 
             def re_apply_continuation(closure: Closure, amb: ambivalence.Amb) -> types.Promise:
                 verify(amb)
-                return lambda: closure.apply_evaluated_args(actual_args, ret, amb)
+                return trampoline.call(closure.apply_evaluated_args, actual_args, ret, amb)
 
-            return lambda: self._body.eval(self._env.extend(dictionary), re_apply_continuation, amb)
+            return trampoline.bounce(self._body.eval, self._env.extend(dictionary, amb=amb), re_apply_continuation, amb)
         else:  # formal and actual args match
-            return lambda: self._body.eval(self._env.extend(dictionary), ret, amb)
+            return trampoline.bounce(self._body.eval, self._env.extend(dictionary, amb=amb), ret, amb)
 
     def num_args(self):
         return len(self._args)
@@ -1270,325 +2503,905 @@ class BinaryArithmetic(Primitive):
     type is always `int -> int -> int`
     """
 
+    operation = None  # on the python ints inside the Numbers
+
+    @classmethod
+    def type(cls):
+        return inference.Function(
+            Number.type(),
+            inference.Function(Number.type(), Number.type())
+        )
+
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        return trampoline.call(ret, make_number(self.operation(args[0]._value, args[1]._value)), amb)
+
+    def static_type(self) -> bool:
+        return True
+
+
+class Addition(BinaryArithmetic, metaclass=Singleton):
+    operation = operator.add
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.add
+
+
+class Subtraction(BinaryArithmetic, metaclass=Singleton):
+    operation = operator.sub
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.sub
+
+
+class Multiplication(BinaryArithmetic, metaclass=Singleton):
+    operation = operator.mul
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.mul
+
+
+class Division(BinaryArithmetic, metaclass=Singleton):
+    operation = operator.floordiv
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.div
+
+
+class Modulus(BinaryArithmetic, metaclass=Singleton):
+    operation = operator.mod
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.mod
+
+
+class Exponentiation(BinaryArithmetic, metaclass=Singleton):
+    operation = operator.pow
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.exp
+
+
+class BinaryComparison(Primitive):
+    """base class for binary comparison operators.
+    type is always `t -> t -> bool`
+    """
+
+    @classmethod
+    def type(self):
+        typeVar = inference.TypeVariable()
+        return inference.Function(
+            typeVar,
+            inference.Function(typeVar, Boolean.type())
+        )
+
+    def static_type(self) -> bool:
+        return True
+
+
+class Equality(BinaryComparison, metaclass=Singleton):
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        return trampoline.call(ret, args[0].eq(args[1]), amb)
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.eq
+
+
+class GT(BinaryComparison, metaclass=Singleton):
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        return trampoline.call(ret, args[0].gt(args[1]), amb)
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.gt
+
+
+class LT(BinaryComparison, metaclass=Singleton):
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        return trampoline.call(ret, args[0].lt(args[1]), amb)
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.lt
+
+
+class GE(BinaryComparison, metaclass=Singleton):
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        return trampoline.call(ret, args[0].ge(args[1]), amb)
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.ge
+
+
+class LE(BinaryComparison, metaclass=Singleton):
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        return trampoline.call(ret, args[0].le(args[1]), amb)
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.le
+
+
+class NE(BinaryComparison, metaclass=Singleton):
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        return trampoline.call(ret, args[0].ne(args[1]), amb)
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.ne
+
+
+class BinaryLogic(SpecialForm):
+    """base class for binary boolean operators.
+    type is always `bool -> bool -> bool`
+    """
+
+    @classmethod
+    def type(cls):
+        return inference.Function(
+            Boolean.type(),
+            inference.Function(Boolean.type(), Boolean.type())
+        )
+
+    def static_type(self) -> bool:
+        return True
+
+    @classmethod
+    def convert_rhs(cls, converter: 'cps.Converter', rhs: Expr, env: 'cps.value',
+                    c: 'cps.MetaContinuation') -> 'cps.cexp':
+        """
+        the rhs is evaluated from two places, so becomes a function of its continuation
+        """
+        function = converter.var('rhs')
+        k = converter.var('k')
+        return cps.FIX([(function, [k], rhs.convert(converter, env, converter.tail(cps.VAR(k))))],
+                       c(cps.VAR(function)))
+
+    @classmethod
+    def convert_unknown(cls, converter: 'cps.Converter', rhs: 'cps.value', decisive: 'cps.primop',
+                        lhs: 'cps.value', k: 'cps.value') -> 'cps.cexp':
+        """
+        when the lhs is unknown the result is the rhs if that is decisive, otherwise the lhs
+        """
+        continuation = converter.var('k')
+        result = converter.var('x')
+        return cps.FIX(
+            [(continuation, [result], converter.branch(
+                decisive, cps.VAR(result), cps.APP(k, [cps.VAR(result)]), cps.APP(k, [lhs])
+            ))],
+            cps.APP(rhs, [cps.VAR(continuation)])
+        )
+
+    @classmethod
+    def emit_logic(cls, emitter: 'vm.Emitter', operands: list, tail: bool,
+                   proceed: callable, stop: callable) -> bool:
+        """
+        if proceed(lhs) the result is the rhs, if stop(lhs) it is the lhs,
+        otherwise the lhs is unknown and the result is the rhs if stop(rhs), otherwise the lhs again
+        """
+        if len(operands) != 2:
+            return False
+        unknown = emitter.label()
+        done = emitter.label()
+        end = emitter.label()
+        operands[0].emit(emitter, False)
+        emitter.emit(vm.LOGIC, proceed, stop, unknown, done)
+        operands[1].emit(emitter, tail)
+        if not tail:
+            emitter.emit(vm.JMP, end)
+        emitter.place(unknown)
+        operands[1].emit(emitter, False)
+        emitter.emit(vm.DECIDE, stop)
+        emitter.place(done)
+        emitter.value(tail)
+        emitter.place(end)
+        return True
+
+
+class And(BinaryLogic, metaclass=Singleton):
+
+    def apply(self, args: LinkedList,
+              env: 'environment.Environment',
+              ret: types.Continuation,
+              amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+
+        def cont(lhs: Expr, amb: ambivalence.Amb) -> types.Promise:
+            verify(amb)
+            if lhs.is_true():
+                return trampoline.call(args[1].eval, env, ret, amb)
+            elif lhs.is_false():
+                return trampoline.call(ret, lhs, amb)
+            else:
+                def cont2(rhs: Expr, amb: types.Continuation) -> types.Promise:
+                    verify(amb)
+                    if rhs.is_false():
+                        return trampoline.call(ret, rhs, amb)
+                    else:
+                        return trampoline.call(ret, lhs, amb)
+
+                return trampoline.call(args[1].eval, env, cont2, amb)
+
+        return trampoline.call(args[0].eval, env, cont, amb)
+
+    def convert_application(self, converter: 'cps.Converter', operands: list, env: 'cps.value',
+                            c: 'cps.MetaContinuation') -> 'types.Maybe[cps.cexp]':
+        if len(operands) != 2:
+            return None
+        return converter.reify(c, lambda k: self.convert_rhs(converter, operands[1], env, lambda rhs: operands[0].convert(
+            converter, env, lambda lhs: converter.branch(
+                cps.primop.istrue, lhs,
+                cps.APP(rhs, [k]),
+                converter.branch(
+                    cps.primop.isfalse, lhs,
+                    cps.APP(k, [lhs]),
+                    self.convert_unknown(converter, rhs, cps.primop.isfalse, lhs, k)
+                )
+            )
+        )))
+
+    def emit_application(self, emitter: 'vm.Emitter', operands: list, tail: bool) -> bool:
+        return self.emit_logic(emitter, operands, tail, lambda lhs: lhs.is_true(), lambda value: value.is_false())
+
+
+class Or(BinaryLogic, metaclass=Singleton):
+
+    def apply(self, args: LinkedList,
+              env: 'environment.Environment',
+              ret: types.Continuation,
+              amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+
+        def cont(lhs: Expr, amb: ambivalence.Amb) -> types.Promise:
+            verify(amb)
+            if lhs.is_true():
+                return trampoline.call(ret, lhs, amb)
+            elif lhs.is_false():
+                return trampoline.call(args[1].eval, env, ret, amb)
+            else:
+                def cont2(rhs: Expr, amb: types.Continuation) -> types.Promise:
+                    verify(amb)
+                    if rhs.is_true():
+                        return trampoline.call(ret, rhs, amb)
+                    else:
+                        return trampoline.call(ret, lhs, amb)
+
+                return trampoline.call(args[1].eval, env, cont2, amb)
+
+        return trampoline.call(args[0].eval, env, cont, amb)
+
+    def convert_application(self, converter: 'cps.Converter', operands: list, env: 'cps.value',
+                            c: 'cps.MetaContinuation') -> 'types.Maybe[cps.cexp]':
+        if len(operands) != 2:
+            return None
+        return converter.reify(c, lambda k: self.convert_rhs(converter, operands[1], env, lambda rhs: operands[0].convert(
+            converter, env, lambda lhs: converter.branch(
+                cps.primop.istrue, lhs,
+                cps.APP(k, [lhs]),
+                converter.branch(
+                    cps.primop.isfalse, lhs,
+                    cps.APP(rhs, [k]),
+                    self.convert_unknown(converter, rhs, cps.primop.istrue, lhs, k)
+                )
+            )
+        )))
+
+    def emit_application(self, emitter: 'vm.Emitter', operands: list, tail: bool) -> bool:
+        return self.emit_logic(emitter, operands, tail, lambda lhs: lhs.is_false(), lambda value: value.is_true())
+
+
+class Xor(Primitive, metaclass=Singleton):
+    @classmethod
+    def type(cls):
+        return BinaryLogic.type()
+
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        return trampoline.call(ret, args[0] ^ args[1], amb)
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.xor
+
+    def static_type(self):
+        return True
+
+
+class Not(Primitive, metaclass=Singleton):
+    @classmethod
+    def type(cls):
+        return inference.Function(Boolean.type(), Boolean.type())
+
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        return trampoline.call(ret, ~(args[0]), amb)
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.not_
+
+    def static_type(self) -> bool:
+        return True
+
+
+class Then(SpecialForm, metaclass=Singleton):
+    """the `then` operator
+    """
+
+    @classmethod
+    def type(cls):
+        typevar = inference.TypeVariable()
+        return inference.Function(
+            typevar,
+            inference.Function(typevar, typevar)
+        )
+
+    def apply(self, args: LinkedList,
+              env: 'environment.Environment',
+              ret: types.Continuation,
+              amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        def amb2() -> types.Promise:
+            return trampoline.call(args[1].eval, env, ret, amb)
+
+        return trampoline.call(args[0].eval, env, ret, ambivalence.Amb(amb2, amb.cut()))
+
+    def convert_application(self, converter: 'cps.Converter', operands: list, env: 'cps.value',
+                            c: 'cps.MetaContinuation') -> 'types.Maybe[cps.cexp]':
+        if len(operands) != 2:
+            return None
+        alternative = converter.var('alternative')
+        return converter.reify(c, lambda k: cps.FIX(
+            [(alternative, [], operands[1].convert(converter, env, converter.tail(k)))],
+            cps.PRIMOP(cps.primop.choice, [cps.VAR(alternative)], [],
+                       [operands[0].convert(converter, env, converter.tail(k))])
+        ))
+
+    def emit_application(self, emitter: 'vm.Emitter', operands: list, tail: bool) -> bool:
+        if len(operands) != 2:
+            return False
+        alternative = emitter.label()
+        end = emitter.label()
+        emitter.emit(vm.MAKEBACK, alternative)
+        operands[0].emit(emitter, tail)
+        if not tail:
+            emitter.emit(vm.JMP, end)
+        emitter.place(alternative)
+        operands[1].emit(emitter, tail)
+        emitter.place(end)
+        return True
+
+    def static_type(self) -> bool:
+        return True
+
+
+class Back(SpecialForm, metaclass=Singleton):
+    """the `back` statement
+    """
+
+    @classmethod
+    def type(cls):
+        return inference.TypeVariable()
+
+    def apply(self,
+              args: LinkedList,
+              env: 'environment.Environment',
+              ret: types.Continuation,
+              amb: ambivalence.Amb
+    ) -> types.Promise:
+        verify(amb)
+        return amb
+
+    def convert_application(self, converter: 'cps.Converter', operands: list, env: 'cps.value',
+                            c: 'cps.MetaContinuation') -> 'types.Maybe[cps.cexp]':
+        return cps.PRIMOP(cps.primop.back, [], [], [])
+
+    def emit_application(self, emitter: 'vm.Emitter', operands: list, tail: bool) -> bool:
+        emitter.emit(vm.BACK)
+        return True
+
+    def static_type(self) -> bool:
+        return True
+
+
+class Cons(Primitive, metaclass=Singleton):
+    @classmethod
+    def type(cls):
+        '#t -> list(#t) -> list(#t)'
+        t = inference.TypeVariable()
+        list_t = inference.TypeOperator('list', t)
+        return inference.Function(t, inference.Function(list_t, list_t))
+
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        return trampoline.call(ret, Pair(args[0], args[1]), amb)
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.cons
+
+    def static_type(self) -> bool:
+        return True
+
+
+class Append(Primitive, metaclass=Singleton):
+    @classmethod
+    def type(cls):
+        'list(#t) -> list(#t) -> list(#t)'
+        list_t = Null.type()
+        return inference.Function(list_t, inference.Function(list_t, list_t))
+
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        return trampoline.call(ret, args[0].concat(args[1]), amb)
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.append
+
+    def static_type(self) -> bool:
+        return True
+
+
+class Head(Primitive, metaclass=Singleton):
+    @classmethod
+    def type(cls):
+        'list(#t) -> #t'
+        t = inference.TypeVariable()
+        list_t = inference.TypeOperator('list', t)
+        return inference.Function(list_t, t)
+
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        return trampoline.call(ret, args[0].car(), amb)
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.head
+
+    def static_type(self) -> bool:
+        return True
+
+
+class Tail(Primitive, metaclass=Singleton):
+    @classmethod
+    def type(cls):
+        'list(#t) -> list(#t)'
+        list_t = Null.type()
+        return inference.Function(list_t, list_t)
+
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        return trampoline.call(ret, args[0].cdr(), amb)
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.tail
+
+    def static_type(self) -> bool:
+        return True
+
+
+class Length(Primitive, metaclass=Singleton):
+    @classmethod
+    def type(cls):
+        'list(#t) -> int'
+        return inference.Function(Null.type(), Number.type())
+
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        return trampoline.call(ret, make_number(len(args[0])), amb)
+
+    def primop(self) -> 'cps.primop':
+        return cps.primop.length
+
+    def static_type(self) -> bool:
+        return True
+
+
+class ListFunction(Primitive):
+    """
+    base class for the built-in higher-order list functions.
+    They apply their function argument to the elements of the list in a python loop,
+    calling it directly if it is a primitive with a native equivalent
+    """
+
+    num_args = None
+
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        if len(args) < self.num_args:
+            return trampoline.call(ret, Curried(self, args), amb)
+        return self.apply_list(args, list(args[self.num_args - 1]), ret, amb)
+
+    def apply_list(self, args: LinkedList, elements: list, ret: types.Continuation,
+                   amb: ambivalence.Amb) -> types.Promise:
+        pass
+
     @classmethod
-    def type(cls):
-        return inference.Function(
-            Number.type(),
-            inference.Function(Number.type(), Number.type())
-        )
+    def apply_function(cls, fn: Op, values: tuple, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        """
+        apply fn to already evaluated values. A special form, like `here`, evaluates its own arguments,
+        so it is given ones that evaluate to the values
+        """
+        if isinstance(fn, Primitive):
+            return trampoline.call(fn.apply_evaluated_args, make_arguments(values), ret, amb)
+        args = make_list([
+            Compiled(lambda env, ret, amb, value=value: trampoline.call(ret, value, amb), value) for value in values
+        ])
+        return trampoline.call(fn.apply, args, environment.Environment(), ret, amb)
 
     def static_type(self) -> bool:
         return True
 
 
-class Addition(BinaryArithmetic, metaclass=Singleton):
-    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb):
-        verify(amb)
-        return lambda: ret(args[0] + args[1], amb)
+class Map(ListFunction, metaclass=Singleton):
+    num_args = 2
 
+    @classmethod
+    def type(cls):
+        '(#a -> #b) -> list(#a) -> list(#b)'
+        a = inference.TypeVariable()
+        b = inference.TypeVariable()
+        return inference.Function(inference.Function(a, b),
+                                  inference.Function(inference.TypeOperator('list', a), inference.TypeOperator('list', b)))
+
+    def apply_list(self, args: LinkedList, elements: list, ret: types.Continuation,
+                   amb: ambivalence.Amb) -> types.Promise:
+        fn = args[0]
+        native = fn.native(1)
+        if native is not None:
+            return trampoline.call(ret, make_list([native(element) for element in elements]), amb)
 
-class Subtraction(BinaryArithmetic, metaclass=Singleton):
+        # noinspection PyShadowingNames
+        def map_from(index: int, mapped: LinkedList, amb: ambivalence.Amb) -> types.Promise:
+            if index == len(elements):
+                return trampoline.call(ret, reverse_list(mapped), amb)
 
-    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
-        verify(amb)
-        # noinspection PyUnresolvedReferences
-        return lambda: ret(args[0] - args[1], amb)
+            def next_continuation(value: Expr, amb: ambivalence.Amb) -> types.Promise:
+                return map_from(index + 1, Pair(value, mapped), amb)
 
+            return self.apply_function(fn, (elements[index],), next_continuation, amb)
 
-class Multiplication(BinaryArithmetic, metaclass=Singleton):
-    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
-        # noinspection PyUnresolvedReferences
-        verify(amb)
-        return lambda: ret(args[0] * args[1], amb)
+        return map_from(0, Null(), amb)
 
 
-class Division(BinaryArithmetic, metaclass=Singleton):
-    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
-        # noinspection PyUnresolvedReferences
-        verify(amb)
-        return lambda: ret(args[0] // args[1], amb)
+class Filter(ListFunction, metaclass=Singleton):
+    num_args = 2
 
+    @classmethod
+    def type(cls):
+        '(#t -> bool) -> list(#t) -> list(#t)'
+        t = inference.TypeVariable()
+        list_t = inference.TypeOperator('list', t)
+        return inference.Function(inference.Function(t, Boolean.type()), inference.Function(list_t, list_t))
 
-class Modulus(BinaryArithmetic, metaclass=Singleton):
-    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
-        # noinspection PyUnresolvedReferences
-        verify(amb)
-        return lambda: ret(args[0] % args[1], amb)
+    def apply_list(self, args: LinkedList, elements: list, ret: types.Continuation,
+                   amb: ambivalence.Amb) -> types.Promise:
+        fn = args[0]
+        native = fn.native(1)
+        if native is not None:
+            return trampoline.call(ret, make_list([element for element in elements if native(element).is_true()]), amb)
 
+        # noinspection PyShadowingNames
+        def filter_from(index: int, kept: LinkedList, amb: ambivalence.Amb) -> types.Promise:
+            if index == len(elements):
+                return trampoline.call(ret, reverse_list(kept), amb)
+            element = elements[index]
 
-class Exponentiation(BinaryArithmetic, metaclass=Singleton):
-    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
-        # noinspection PyUnresolvedReferences
-        verify(amb)
-        return lambda: ret(args[0] ** args[1], amb)
+            def next_continuation(value: Boolean, amb: ambivalence.Amb) -> types.Promise:
+                return filter_from(index + 1, Pair(element, kept) if value.is_true() else kept, amb)
 
+            return self.apply_function(fn, (element,), next_continuation, amb)
 
-class BinaryComparison(Primitive):
-    """base class for binary comparison operators.
-    type is always `t -> t -> bool`
+        return filter_from(0, Null(), amb)
+
+
+class Reduce(ListFunction, metaclass=Singleton):
     """
+    reduce(binop, final, [a, b, c]) is binop(a, binop(b, binop(c, final)))
+    """
+    num_args = 3
 
     @classmethod
-    def type(self):
-        typeVar = inference.TypeVariable()
-        return inference.Function(
-            typeVar,
-            inference.Function(typeVar, Boolean.type())
-        )
-
-    def static_type(self) -> bool:
-        return True
+    def type(cls):
+        '(#a -> #b -> #b) -> #b -> list(#a) -> #b'
+        a = inference.TypeVariable()
+        b = inference.TypeVariable()
+        return inference.Function(inference.Function(a, inference.Function(b, b)),
+                                  inference.Function(b, inference.Function(inference.TypeOperator('list', a), b)))
+
+    def apply_list(self, args: LinkedList, elements: list, ret: types.Continuation,
+                   amb: ambivalence.Amb) -> types.Promise:
+        fn = args[0]
+        native = fn.native(2)
+        if native is not None:
+            result = args[1]
+            for element in reversed(elements):
+                result = native(element, result)
+            return trampoline.call(ret, result, amb)
 
+        # noinspection PyShadowingNames
+        def reduce_from(index: int, result: Expr, amb: ambivalence.Amb) -> types.Promise:
+            if index < 0:
+                return trampoline.call(ret, result, amb)
 
-class Equality(BinaryComparison, metaclass=Singleton):
-    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
-        verify(amb)
-        return lambda: ret(args[0].eq(args[1]), amb)
+            def next_continuation(value: Expr, amb: ambivalence.Amb) -> types.Promise:
+                return reduce_from(index - 1, value, amb)
 
+            return self.apply_function(fn, (elements[index], result), next_continuation, amb)
 
-class GT(BinaryComparison, metaclass=Singleton):
-    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
-        verify(amb)
-        return lambda: ret(args[0].gt(args[1]), amb)
+        return reduce_from(len(elements) - 1, args[1], amb)
 
 
-class LT(BinaryComparison, metaclass=Singleton):
-    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
-        return lambda: ret(args[0].lt(args[1]), amb)
+class Sort(ListFunction, metaclass=Singleton):
+    """
+    sorts a list into ascending order, the order of `<`
+    """
+    num_args = 1
 
+    @classmethod
+    def type(cls):
+        'list(#t) -> list(#t)'
+        list_t = Null.type()
+        return inference.Function(list_t, list_t)
 
-class GE(BinaryComparison, metaclass=Singleton):
-    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
-        verify(amb)
-        return lambda: ret(args[0].ge(args[1]), amb)
+    def apply_list(self, args: LinkedList, elements: list, ret: types.Continuation,
+                   amb: ambivalence.Amb) -> types.Promise:
+        if all(type(element) is Number for element in elements):
+            return trampoline.call(ret, make_list(sorted(elements, key=Number.value)), amb)
+        return trampoline.call(ret, make_list(sorted(elements)), amb)
 
 
-class LE(BinaryComparison, metaclass=Singleton):
-    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
-        verify(amb)
-        return lambda: ret(args[0].le(args[1]), amb)
+class Curried(Primitive):
+    """
+    a built-in function applied to fewer arguments than it needs
+    """
 
+    def __init__(self, fn: Primitive, args: LinkedList):
+        self._fn = fn
+        self._args = tuple(args)
 
-class NE(BinaryComparison, metaclass=Singleton):
     def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        return lambda: ret(args[0].ne(args[1]), amb)
+        return trampoline.call(self._fn.apply_evaluated_args, make_arguments(self._args + tuple(args)), ret, amb)
 
 
-class BinaryLogic(SpecialForm):
-    """base class for binary boolean operators.
-    type is always `bool -> bool -> bool`
-    """
-
+class ToVector(Primitive, metaclass=Singleton):
     @classmethod
     def type(cls):
-        return inference.Function(
-            Boolean.type(),
-            inference.Function(Boolean.type(), Boolean.type())
-        )
+        'list(int) -> vector(int)'
+        return inference.Function(inference.TypeOperator('list', Number.type()), Vector.type())
+
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        verify(amb)
+        return trampoline.call(ret, make_vector([number._value for number in args[0]]), amb)
 
     def static_type(self) -> bool:
         return True
 
 
-class And(BinaryLogic, metaclass=Singleton):
+class FromVector(Primitive, metaclass=Singleton):
+    @classmethod
+    def type(cls):
+        'vector(int) -> list(int)'
+        return inference.Function(Vector.type(), inference.TypeOperator('list', Number.type()))
 
-    def apply(self, args: LinkedList,
-              env: 'environment.Environment',
-              ret: types.Continuation,
-              amb: ambivalence.Amb) -> types.Promise:
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
+        return trampoline.call(ret, make_list([make_number(value) for value in args[0].values()]), amb)
 
-        def cont(lhs: Expr, amb: ambivalence.Amb) -> types.Promise:
-            verify(amb)
-            if lhs.is_true():
-                return lambda: args[1].eval(env, ret, amb)
-            elif lhs.is_false():
-                return lambda: ret(lhs, amb)
-            else:
-                def cont2(rhs: Expr, amb: types.Continuation) -> types.Promise:
-                    verify(amb)
-                    if rhs.is_false():
-                        return lambda: ret(rhs, amb)
-                    else:
-                        return lambda: ret(lhs, amb)
-
-                return lambda: args[1].eval(env, cont2, amb)
-
-        return lambda: args[0].eval(env, cont, amb)
+    def static_type(self) -> bool:
+        return True
 
 
-class Or(BinaryLogic, metaclass=Singleton):
+class VectorLength(Primitive, metaclass=Singleton):
+    @classmethod
+    def type(cls):
+        'vector(int) -> int'
+        return inference.Function(Vector.type(), Number.type())
 
-    def apply(self, args: LinkedList,
-              env: 'environment.Environment',
-              ret: types.Continuation,
-              amb: ambivalence.Amb) -> types.Promise:
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
+        return trampoline.call(ret, make_number(len(args[0])), amb)
 
-        def cont(lhs: Expr, amb: ambivalence.Amb) -> types.Promise:
-            verify(amb)
-            if lhs.is_true():
-                return lambda: ret(lhs, amb)
-            elif lhs.is_false():
-                return lambda: args[1].eval(env, ret, amb)
-            else:
-                def cont2(rhs: Expr, amb: types.Continuation) -> types.Promise:
-                    verify(amb)
-                    if rhs.is_true():
-                        return lambda: ret(rhs, amb)
-                    else:
-                        return lambda: ret(lhs, amb)
-
-                return lambda: args[1].eval(env, cont2, amb)
-
-        return lambda: args[0].eval(env, cont, amb)
+    def static_type(self) -> bool:
+        return True
 
 
-class Xor(Primitive, metaclass=Singleton):
+class VectorRef(Primitive, metaclass=Singleton):
+    """
+    vref(v, i) is the i'th element of v, counting from zero
+    """
     @classmethod
     def type(cls):
-        return BinaryLogic.type()
+        'vector(int) -> int -> int'
+        return inference.Function(Vector.type(), inference.Function(Number.type(), Number.type()))
 
     def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        return lambda: ret(args[0] ^ args[1], amb)
+        values = args[0].values()
+        index = args[1]._value
+        if index < 0 or index >= len(values):
+            raise PySchemeRunTimeError("vector index out of range")
+        return trampoline.call(ret, make_number(values[index]), amb)
 
-    def static_type(self):
+    def static_type(self) -> bool:
         return True
 
 
-class Not(Primitive, metaclass=Singleton):
+class VectorSlice(Primitive, metaclass=Singleton):
+    """
+    vslice(v, start, end) is the elements of v from index start up to but not including end
+    """
     @classmethod
     def type(cls):
-        return inference.Function(Boolean.type(), Boolean.type())
+        'vector(int) -> int -> int -> vector(int)'
+        return inference.Function(Vector.type(),
+                                  inference.Function(Number.type(), inference.Function(Number.type(), Vector.type())))
 
     def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        return lambda: ret(~(args[0]), amb)
+        start = max(args[1]._value, 0)
+        end = max(args[2]._value, start)
+        return trampoline.call(ret, Vector(args[0].values()[start:end]), amb)
 
     def static_type(self) -> bool:
         return True
 
 
-class Then(SpecialForm, metaclass=Singleton):
-    """the `then` operator
+class VectorArithmetic(Primitive):
+    """common base class for elementwise arithmetic on vectors of the same length.
+    type is always `vector(int) -> vector(int) -> vector(int)`
     """
 
+    operation = None  # on the python ints inside the Vectors
+
     @classmethod
     def type(cls):
-        typevar = inference.TypeVariable()
         return inference.Function(
-            typevar,
-            inference.Function(typevar, typevar)
+            Vector.type(),
+            inference.Function(Vector.type(), Vector.type())
         )
 
-    def apply(self, args: LinkedList,
-              env: 'environment.Environment',
-              ret: types.Continuation,
-              amb: ambivalence.Amb) -> types.Promise:
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        def amb2() -> types.Promise:
-            return lambda: args[1].eval(env, ret, amb)
-
-        return lambda: args[0].eval(env, ret, ambivalence.Amb(amb2, amb.cut()))
+        a = args[0].values()
+        b = args[1].values()
+        if len(a) != len(b):
+            raise PySchemeRunTimeError("vectors of different lengths")
+        return trampoline.call(ret, make_vector(map(self.operation, a, b)), amb)
 
     def static_type(self) -> bool:
         return True
 
 
-class Back(SpecialForm, metaclass=Singleton):
-    """the `back` statement
+class VectorAddition(VectorArithmetic, metaclass=Singleton):
+    operation = operator.add
+
+
+class VectorSubtraction(VectorArithmetic, metaclass=Singleton):
+    operation = operator.sub
+
+
+class VectorMultiplication(VectorArithmetic, metaclass=Singleton):
+    operation = operator.mul
+
+
+class VectorDivision(VectorArithmetic, metaclass=Singleton):
+    operation = operator.floordiv
+
+
+class VectorModulus(VectorArithmetic, metaclass=Singleton):
+    operation = operator.mod
+
+
+class VectorReduction(Primitive):
+    """common base class for reducing a vector to a single int.
+    type is always `vector(int) -> int`
     """
 
+    operation = None  # on the python array inside the Vector
+
     @classmethod
     def type(cls):
-        return inference.TypeVariable()
+        return inference.Function(Vector.type(), Number.type())
 
-    def apply(self,
-              args: LinkedList,
-              env: 'environment.Environment',
-              ret: types.Continuation,
-              amb: ambivalence.Amb
-    ) -> types.Promise:
+    def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        return amb
+        try:
+            result = self.operation(args[0].values())
+        except ValueError:
+            raise PySchemeRunTimeError("cannot reduce an empty vector")
+        return trampoline.call(ret, make_number(result), amb)
 
     def static_type(self) -> bool:
         return True
 
 
-class Cons(Primitive, metaclass=Singleton):
+class VectorSum(VectorReduction, metaclass=Singleton):
+    operation = sum
+
+
+class VectorMin(VectorReduction, metaclass=Singleton):
+    operation = min
+
+
+class VectorMax(VectorReduction, metaclass=Singleton):
+    operation = max
+
+
+class Insert(Primitive, metaclass=Singleton):
     @classmethod
     def type(cls):
-        '#t -> list(#t) -> list(#t)'
-        t = inference.TypeVariable()
-        list_t = inference.TypeOperator('list', t)
-        return inference.Function(t, inference.Function(list_t, list_t))
+        '#k -> #v -> map(#k, #v) -> map(#k, #v)'
+        k = inference.TypeVariable()
+        v = inference.TypeVariable()
+        map_kv = HashMap.type(k, v)
+        return inference.Function(k, inference.Function(v, inference.Function(map_kv, map_kv)))
 
     def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        return lambda: ret(Pair(args[0], args[1]), amb)
+        return trampoline.call(ret, args[2].insert(args[0], args[1]), amb)
 
     def static_type(self) -> bool:
         return True
 
 
-class Append(Primitive, metaclass=Singleton):
+class Lookup(Primitive, metaclass=Singleton):
     @classmethod
     def type(cls):
-        'list(#t) -> list(#t) -> list(#t)'
-        list_t = Null.type()
-        return inference.Function(list_t, inference.Function(list_t, list_t))
+        '#k -> map(#k, #v) -> #v'
+        k = inference.TypeVariable()
+        v = inference.TypeVariable()
+        return inference.Function(k, inference.Function(HashMap.type(k, v), v))
 
     def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        return lambda: ret(args[0].append(args[1]), amb)
+        value = args[1].lookup(args[0])
+        if value is None:
+            raise PySchemeRunTimeError("key not found: " + str(args[0]))
+        return trampoline.call(ret, value, amb)
 
     def static_type(self) -> bool:
         return True
 
 
-class Head(Primitive, metaclass=Singleton):
+class Remove(Primitive, metaclass=Singleton):
     @classmethod
     def type(cls):
-        'list(#t) -> #t'
-        t = inference.TypeVariable()
-        list_t = inference.TypeOperator('list', t)
-        return inference.Function(list_t, t)
+        '#k -> map(#k, #v) -> map(#k, #v)'
+        k = inference.TypeVariable()
+        map_kv = HashMap.type(k)
+        return inference.Function(k, inference.Function(map_kv, map_kv))
 
     def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        return lambda: ret(args[0].car(), amb)
+        return trampoline.call(ret, args[1].remove(args[0]), amb)
 
     def static_type(self) -> bool:
         return True
 
 
-class Tail(Primitive, metaclass=Singleton):
+class Contains(Primitive, metaclass=Singleton):
     @classmethod
     def type(cls):
-        'list(#t) -> list(#t)'
-        list_t = Null.type()
-        return inference.Function(list_t, list_t)
+        '#k -> map(#k, #v) -> bool'
+        k = inference.TypeVariable()
+        return inference.Function(k, inference.Function(HashMap.type(k), Boolean.type()))
 
     def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        return lambda: ret(args[0].cdr(), amb)
+        return trampoline.call(ret, T() if args[1].contains(args[0]) else F(), amb)
 
     def static_type(self) -> bool:
         return True
 
 
-class Length(Primitive, metaclass=Singleton):
+class Size(Primitive, metaclass=Singleton):
     @classmethod
     def type(cls):
-        'list(#t) -> int'
-        return inference.Function(Null.type(), Number.type())
+        'map(#k, #v) -> int'
+        return inference.Function(HashMap.type(), Number.type())
 
     def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        return lambda: ret(Number(len(args[0])), amb)
+        return trampoline.call(ret, make_number(len(args[0])), amb)
 
     def static_type(self) -> bool:
         return True
@@ -1610,7 +3423,7 @@ class Print(Primitive):
         verify(amb)
         self._output.write(str(args[0]))
         self._output.write("\n")
-        return lambda: ret(args, amb)
+        return trampoline.call(ret, args, amb)
 
     def static_type(self) -> bool:
         return True
@@ -1630,7 +3443,7 @@ class Cont(Primitive):
 
     def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        return lambda: self._ret(args[0], amb)
+        return trampoline.call(self._ret, args[0], amb)
 
     def static_type(self) -> bool:
         return True
@@ -1658,10 +3471,17 @@ class CallCC(SpecialForm, metaclass=Singleton):
         verify(amb)
         def do_apply(closure: Closure, amb: ambivalence.Amb) -> types.Promise:
             verify(amb)
-            return lambda: closure.apply(LinkedList.list([Cont(ret)]), env, ret, amb)
+            return trampoline.call(closure.apply, LinkedList.list([Cont(ret)]), env, ret, amb)
 
         return args[0].eval(env, do_apply, amb)
 
+    def emit_application(self, emitter: 'vm.Emitter', operands: list, tail: bool) -> bool:
+        if len(operands) != 1:
+            return False
+        operands[0].emit(emitter, False)
+        emitter.emit(vm.HERE, tail)
+        return True
+
     def static_type(self) -> bool:
         return True
 
@@ -1687,7 +3507,14 @@ class Spawn(Primitive):
 
     def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        return [lambda: ret(T(), amb), lambda: ret(F(), amb)]
+        return [trampoline.bounce(ret, T(), amb), trampoline.bounce(ret, F(), amb)]
+
+    def emit_application(self, emitter: 'vm.Emitter', operands: list, tail: bool) -> bool:
+        if len(operands) != 0:
+            return False
+        emitter.emit(vm.SPAWN)
+        emitter.value(tail)
+        return True
 
     def static_type(self) -> bool:
         return True
@@ -1710,7 +3537,7 @@ class Error(SpecialForm):
         verify(amb)
         def print_continuation(printer: Print, amb: ambivalence.Amb) -> types.Promise:
             verify(amb)
-            return lambda: printer.apply(args, env, self.cont, amb)
+            return trampoline.call(printer.apply, args, env, self.cont, amb)
 
         return env.lookup(Symbol("print"), print_continuation, amb)
 
@@ -1762,6 +3589,8 @@ class TypeDef(TypeSystem):
     def __init__(self, flat_type: FlatType, constructors: LinkedList):
         self.flat_type = flat_type
         self.constructors = constructors
+        for tag, constructor in enumerate(constructors):
+            constructor.tag = tag
 
     def prepare_analysis(self, env: inference.TypeEnvironment):
         env[self.flat_type.symbol] = inference.TypeVariable()
@@ -1784,6 +3613,11 @@ class TypeDef(TypeSystem):
         verify(amb)
         return self.constructors.eval(env, lambda _, amb: ret(Nothing(), amb), amb)
 
+    def resolve(self, scope: 'environment.Scope') -> Expr:
+        for constructor in self.constructors:
+            scope.bind(constructor.name)
+        return self
+
     def __str__(self):
         return "typedef(" + str(self.flat_type) + " : " + str(self.constructors) + ")"
 
@@ -1794,6 +3628,8 @@ class TypeConstructor(TypeSystem):
     of a typedef
     """
 
+    tag = 0  # its index in the typedef, carried by the NamedTuples it makes
+
     def __init__(self, name: Symbol, arg_types: LinkedList):
         self.name = name
         self.arg_types = arg_types
@@ -1824,7 +3660,7 @@ class TypeConstructor(TypeSystem):
     def eval(self, env: 'environment.Environment', ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
         if len(self.arg_types) == 0:
-            return lambda: env.define(self.name, NamedTuple(self.name, Null()), ret, amb)
+            return trampoline.call(env.define, self.name, NamedTuple(self.name, Null(), self.tag), ret, amb)
         else:
             def make_args(num: int):
                 if num == 0:
@@ -1838,15 +3674,16 @@ class TypeConstructor(TypeSystem):
                 closure = Closure(
                     args,
                     Application(
-                        TupleConstructor(self.name, len(self.arg_types)),
+                        TupleConstructor(self.name, len(self.arg_types), self.tag),
                         args
                     ),
                     env
                 )
+                closure.tag = self.tag
                 closure.set_name('*' + str(self.name))
                 return closure
 
-            return lambda: env.define(self.name, make_closure(), ret, amb)
+            return trampoline.call(env.define, self.name, make_closure(), ret, amb)
 
     def __str__(self):
         if type(self.arg_types) is Null:
@@ -1878,7 +3715,7 @@ class Prototype(TypeSystem):
 
     def eval(self, env: 'environment.Environment', ret: types.Continuation, amb: ambivalence.Amb):
         verify(amb)
-        return lambda: ret(Nothing(), amb)
+        return trampoline.call(ret, Nothing(), amb)
 
     __repr__ = __str__
 
@@ -1958,22 +3795,24 @@ class TupleConstructor(Primitive):
     it's a function of n arguments that returns a Compound Data Structure
     """
 
-    def __init__(self, name: Symbol, num_args: int):
+    def __init__(self, name: Symbol, num_args: int, tag: int=0):
         self.name = name
         self.num_args = num_args
+        self.tag = tag
 
     def apply_evaluated_args(self, args, ret: types.Continuation, amb: ambivalence.Amb):
         verify(amb)
-        return lambda: ret(NamedTuple(self.name, args), amb)
+        return trampoline.call(ret, NamedTuple(self.name, args, self.tag), amb)
 
     def __str__(self):
         return "(TupleConstructor " + str(self.name) + ")"
 
 
 class NamedTuple(Expr):
-    def __init__(self, name: Symbol, values: LinkedList):
+    def __init__(self, name: Symbol, values: LinkedList, tag: 'types.Maybe[int]'=None):
         self.name = name
         self.values = values
+        self.tag = tag  # of its TypeConstructor, or None in a formal argument
 
     def analyse_farg(self, env: inference.TypeEnvironment, non_generic: set) -> inference.Type:
         final_type = inference.TypeVariable()
@@ -1991,13 +3830,28 @@ class NamedTuple(Expr):
         env[self.name].fresh(non_generic).unify(our_fn)
         return final_type
 
+    def resolve_farg(self, scope: 'environment.Scope'):
+        self.values.resolve_farg(scope)
+
     def match(self, other: 'NamedTuple', env: 'environment.Environment', ret: types.Continuation,
               amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
         if self.name == other.name:
-            return lambda: self.values.match(other.values, env, ret, amb)
+            return trampoline.call(self.values.match, other.values, env, ret, amb)
         else:
-            return lambda: amb()
+            return trampoline.call(amb)
+
+    def split(self, constructors: dict) -> 'match.Split':
+        if self.name not in constructors:
+            raise match.Unsupported()
+        return match.Test(match.TAG, constructors[self.name][0], list(self.values))
+
+    def collect_symbols(self, symbols: set):
+        symbols.add(self.name)
+        self.values.collect_symbols(symbols)
+
+    def hash_key(self) -> tuple:
+        return self.name.value(), self.values.hash_key()
 
     def __str__(self):
         if type(self.values) is Null:
@@ -2019,6 +3873,8 @@ class Composite(Primitive):
     represents the combined body of a composite function
     """
 
+    matcher = None  # made the first time a closure is, and shared by all of them
+
     def __init__(self, components: LinkedList):
         self.components = components
         self.name = 'anon'
@@ -2042,19 +3898,56 @@ class Composite(Primitive):
     def eval(self, env: 'environment.Environment', ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
         if self.has_no_args():
-            return lambda: self.default_body().eval(env, ret, amb)
+            return trampoline.call(self.default_body().eval, env, ret, amb)
 
         def post_eval_continuation(evaluated_components, amb) -> types.Promise:
             verify(amb)
-            closure = CompositeClosure(evaluated_components)
-            closure.set_name(self.name)
-            return lambda: ret(closure, amb)
+            return trampoline.call(ret, self.closure(*evaluated_components), amb)
 
-        return lambda: self.components.eval(env, post_eval_continuation, amb)
+        return trampoline.call(self.components.eval, env, post_eval_continuation, amb)
 
     def has_no_args(self):
         return len(self.components) == 0 or self.components[0].num_args() == 0
 
+    def resolve(self, scope: 'environment.Scope') -> Expr:
+        for component in self.components:
+            component.resolve(scope)
+        return self
+
+    def compile(self) -> 'types.Code':
+        if self.has_no_args():
+            return self.default_body().compile()
+        return super().compile()
+
+    def compile_value(self) -> 'types.Maybe[callable]':
+        if self.has_no_args():
+            return None
+        components = [component.compile_value() for component in self.components]
+        return lambda env: self.closure(*[component(env) for component in components])
+
+    def closure(self, *components: 'ComponentClosure') -> 'CompositeClosure':
+        closure = CompositeClosure(make_list(components))
+        closure.set_name(self.name)
+        if match.Config.enabled:
+            if self.matcher is None:
+                self.matcher = match.Matcher([component._args for component in self.components])
+            closure.matcher = self.matcher
+        return closure
+
+    def convert(self, converter: 'cps.Converter', env: 'cps.value', c: 'cps.MetaContinuation') -> 'cps.cexp':
+        if self.has_no_args():
+            return self.default_body().convert(converter, env, c)
+        return converter.each([component for component in self.components], env, lambda components: converter.primop(
+            cps.primop.closure, [cps.CONST(self.closure)] + components, c
+        ))
+
+    def emit(self, emitter: 'vm.Emitter', tail: bool):
+        if self.has_no_args():
+            return self.default_body().emit(emitter, tail)
+        emitter.each([component for component in self.components])
+        emitter.emit(vm.PRIMN, self.closure, len(self.components))
+        emitter.value(tail)
+
     def default_body(self):
         if len(self.components) == 0:
             return Nothing()
@@ -2067,11 +3960,26 @@ class ComponentLambda(Lambda):
     represents a single sub-function in a composite function body
     """
 
+    layout = environment.NO_LAYOUT
+
     def closure(self, args: LinkedList, body: Expr, env: 'environment.Environment') -> Closure:
         """
         overrides Lambda.closure
         """
-        return ComponentClosure(args, body, env)
+        return ComponentClosure(args, body, env, self.layout, variables=self.variables)
+
+    def resolve(self, scope: 'environment.Scope') -> Expr:
+        """
+        with no arguments the body is evaluated in the current frame
+        """
+        if len(self._args) == 0:
+            self._body = self._body.resolve(scope)
+        else:
+            new_scope = scope.extend()
+            self._args.resolve_farg(new_scope)
+            self._body = self._body.resolve(new_scope)
+            self.layout = new_scope.layout()
+        return self
 
 
 class CompositeClosure(Closure):
@@ -2079,6 +3987,9 @@ class CompositeClosure(Closure):
     type of closure resulting from evaluation of a Composite
     """
 
+    matcher = None  # the Matcher of the Composite this came from, if it can use a decision tree
+    tree = None
+
     def __init__(self, components: LinkedList):
         self.components = components
         self.name = 'unknown'
@@ -2086,10 +3997,46 @@ class CompositeClosure(Closure):
     def set_name(self, name: str):
         self.name = name
 
+    def decision_tree(self) -> 'match.Tree':
+        """
+        the decision tree for these components, or False if they have to be tried in turn
+        """
+        if self.tree is None:
+            self.tree = False
+            self.choices = tuple(self.components)
+            if self.matcher is not None:
+                # a symbol in the formal arguments that is defined as a NamedTuple matches only that value,
+                # which the tree can test for if it is a constructor with no arguments
+                env = self.components.car()._env
+                constructors = {}
+                for symbol in self.matcher.symbols:
+                    if env.contains(symbol):
+                        value = env[symbol]
+                        if type(value) is NamedTuple:
+                            if value.name is not symbol:
+                                return self.tree
+                            constructors[symbol] = (value.tag, 0)
+                        elif type(value) is Closure and value.tag is not None:
+                            constructors[symbol] = (value.tag, value.num_args())
+                self.tree = self.matcher.tree(constructors)
+        return self.tree
+
     def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb):
         verify(amb)
         hlDebug(self.name, args)
-        if len(args) < self.num_args():
+        num_args = self.num_args()
+        if len(args) >= num_args and self.decision_tree() is not False:
+            registers = []
+            rest = args
+            while len(registers) < num_args:
+                registers.append(rest.car())
+                rest = rest.cdr()
+            leaf = match.select(self.tree, registers)
+            if leaf is None:
+                return amb
+            return self.choices[leaf.index].apply_matched(leaf.bindings, registers, rest, ret, amb)
+
+        if len(args) < num_args:
 
             def try_recursive(
                     components: LinkedList,
@@ -2098,16 +4045,16 @@ class CompositeClosure(Closure):
                     amb: ambivalence.Amb) -> types.Promise:
                 verify(amb)
                 if type(components) is Null:
-                    return lambda: ret(result, amb)
+                    return trampoline.call(ret, result, amb)
                 else:
                     def amb2() -> types.Promise:
-                        return lambda: try_recursive(components.cdr(), result, ret, amb)
+                        return trampoline.call(try_recursive, components.cdr(), result, ret, amb)
 
                     def ret2(val, amb: ambivalence.Amb) -> types.Promise:
                         verify(amb)
-                        return lambda: try_recursive(components.cdr(), Pair(val, result), ret, amb)
+                        return trampoline.call(try_recursive, components.cdr(), Pair(val, result), ret, amb)
 
-                    return lambda: components.car().apply_evaluated_args(args, ret2, ambivalence.Amb(amb2, amb.cut()))
+                    return trampoline.call(components.car().apply_evaluated_args, args, ret2, ambivalence.Amb(amb2, amb.cut()))
 
             def collect_successes(successes: LinkedList, amb: ambivalence.Amb) -> types.Promise:
                 verify(amb)
@@ -2125,9 +4072,9 @@ class CompositeClosure(Closure):
                     return amb
                 else:
                     def amb2() -> types.Promise:
-                        return lambda: try_recursive(components.cdr(), ret, amb)
+                        return trampoline.call(try_recursive, components.cdr(), ret, amb)
 
-                    return lambda: components.car().apply_evaluated_args(args, ret, ambivalence.Amb(amb2, amb.cut()))
+                    return trampoline.call(components.car().apply_evaluated_args, args, ret, ambivalence.Amb(amb2, amb.cut()))
 
             return try_recursive(self.components, ret, amb.cut_point())
 
@@ -2146,9 +4093,29 @@ class ComponentClosure(Closure):
     type of closure resulting from the evaluation of a ComponentLambda
     """
 
+    def __init__(self, args: LinkedList, body: Expr, env: 'environment.Environment',
+                 layout: 'environment.Layout'=environment.NO_LAYOUT, curried: bool=False,
+                 variables: 'types.Maybe[tuple]'=None):
+        super(ComponentClosure, self).__init__(args, body, env)
+        self._layout = layout
+        self._curried = curried
+        self._variables = variables
+
     def apply_evaluated_args(self, args: LinkedList, ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        new_env = self._env.extend()
+        if self._curried:
+            # continue in a copy of the frame the first arguments were matched in,
+            # so the body always runs one frame below the closure, where its lexical addresses expect
+            new_env = self._env.copy()
+        else:
+            new_env = self._env.extend(layout=self._layout, amb=amb)
+
+        if self._variables is not None and len(args) == len(self._variables):
+            # nothing to match, just bind the arguments
+            for variable in self._variables:
+                new_env.bind(variable, args.car())
+                args = args.cdr()
+            return trampoline.bounce(self._body.eval, new_env, ret, ambivalence.Amb(amb.cut()))
 
         def apply_evaluated_recursive(
                 fargs: LinkedList,
@@ -2158,22 +4125,41 @@ class ComponentClosure(Closure):
         ) -> types.Promise:
             verify(amb)
             if type(fargs) is Null and type(aargs) is Null:
-                return lambda: self._body.eval(new_env, ret, ambivalence.Amb(amb.cut()))
+                return trampoline.bounce(self._body.eval, new_env, ret, ambivalence.Amb(amb.cut()))
             elif type(fargs) is Null:  # over-application
                 def re_apply_continuation(closure: Closure, amb: ambivalence.Amb) -> types.Promise:
-                    return lambda: closure.apply_evaluated_args(aargs, ret, amb)
+                    return trampoline.call(closure.apply_evaluated_args, aargs, ret, amb)
 
-                return lambda: self._body.eval(new_env, re_apply_continuation, ambivalence.Amb(amb.cut()))
+                return trampoline.bounce(self._body.eval, new_env, re_apply_continuation, ambivalence.Amb(amb.cut()))
             elif type(aargs) is Null:  # currying
-                return lambda: ret(ComponentClosure(fargs, self._body, new_env), amb)
+                return trampoline.call(ret, ComponentClosure(fargs, self._body, new_env, self._layout, True), amb)
             else:
                 def next_continuation(_, amb) -> types.Promise:
-                    return lambda: apply_evaluated_recursive(fargs.cdr(), aargs.cdr(), ret, amb)
+                    return trampoline.call(apply_evaluated_recursive, fargs.cdr(), aargs.cdr(), ret, amb)
 
-                return lambda: fargs.car().match(aargs.car(), new_env, next_continuation, amb)
+                return trampoline.call(fargs.car().match, aargs.car(), new_env, next_continuation, amb)
 
         return apply_evaluated_recursive(self._args, args, ret, amb)
 
+    def apply_matched(self, bindings: list, registers: list, rest: LinkedList,
+                      ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
+        """
+        apply this component once a decision tree has matched its formal arguments,
+        binding each symbol to the value in its register, and with any arguments left over in rest.
+        Nothing was tried that the body could backtrack to, so the body is given amb itself,
+        not a new Amb wrapping it, and a tail-recursive loop doesn't grow a chain of them.
+        """
+        new_env = self._env.extend(layout=self._layout, amb=amb)
+        for symbol, register in bindings:
+            new_env.bind(symbol, registers[register])
+        if type(rest) is Null:
+            return trampoline.bounce(self._body.eval, new_env, ret, amb)
+
+        def re_apply_continuation(closure: Closure, amb: ambivalence.Amb) -> types.Promise:
+            return trampoline.call(closure.apply_evaluated_args, rest, ret, amb)
+
+        return trampoline.bounce(self._body.eval, new_env, re_apply_continuation, amb)
+
 
 class NothingType(Type):
     def __init__(self):
@@ -2243,6 +4229,21 @@ class Load(Expr):
             self.load(package, get_reader)
         self.note_current_load(package)
 
+    @classmethod
+    def restore(cls, packages: list, aliases: dict, current: dict, get_reader: callable) -> 'Load':
+        """
+        rebuild a load read back from the package cache, loading its packages if not already loaded
+        """
+        load = cls.__new__(cls)
+        load.packages = packages
+        load.aliases = aliases
+        load.wrapper = None
+        load.current = current
+        for package in packages:
+            if not load.loaded(package):
+                load.load(package, get_reader)
+        return load
+
     def merge(self, other):
         self.merge_packages(other)
         self.merge_aliases(other)
@@ -2268,7 +4269,7 @@ class Load(Expr):
 
     def eval(self, env: 'environment.Environment', ret: types.Continuation, amb: ambivalence.Amb) -> types.Promise:
         verify(amb)
-        return lambda: self.make_wrapper().eval(env, ret, amb)
+        return trampoline.call(self.make_wrapper().eval, env, ret, amb)
 
     def note_current_load(self, package: LinkedList):
         def note_recursive(package: LinkedList, dictionary: dict):
@@ -2287,15 +4288,18 @@ class Load(Expr):
                 if isinstance(current, dict):
                     definitions = []
                     for component in current.keys():
-                        definitions += [
-                            Definition(
-                                component,
-                                Env(
-                                    convert_current_to_environments(current[component], path + [component]),
-                                    Pair(Symbol("globalenv"), Null())
-                                )
+                        if isinstance(current[component], dict):
+                            env = Env(
+                                convert_current_to_environments(current[component], path + [component]),
+                                Pair(Symbol("globalenv"), Null())
+                            )
+                        else:
+                            env = PackageEnv(
+                                convert_current_to_environments(current[component], path + [component]),
+                                Pair(Symbol("globalenv"), Null()),
+                                self.get_data_dir().joinpath(self.make_path(LinkedList.list(path + [component])))
                             )
-                        ]
+                        definitions += [Definition(component, env)]
                     return Sequence(LinkedList.list(definitions))
                 else:
                     return self.get_content(path[:-1] + [current])
@@ -2357,14 +4361,18 @@ class Load(Expr):
     def load(self, package: LinkedList, get_reader: callable):
         path = self.get_data_dir().joinpath(self.make_path(package))
         if path.is_file():
-            contents = []
-            with path.open() as fh:
-                reader = get_reader(fh)
-                while True:
-                    parsed_expr = reader.read()
-                    if parsed_expr is None:
-                            break
-                    contents += [parsed_expr]
+            def parse() -> list:
+                contents = []
+                with path.open() as fh:
+                    reader = get_reader(fh)
+                    while True:
+                        parsed_expr = reader.read()
+                        if parsed_expr is None:
+                                break
+                        contents += [parsed_expr]
+                return contents
+
+            contents = package_cache.PackageCache(path).fetch(parse, get_reader)
 
             def recursive_set(pkg: LinkedList, packages: dict):
                 if isinstance(pkg.cdr(), Null):
@@ -2382,6 +4390,16 @@ class Load(Expr):
     def make_path(cls, package: LinkedList) -> Path:
         return Path(package.qualified_str('', '/', '.fn'))
 
+    def resolve(self, scope: 'environment.Scope') -> Expr:
+        self.wrapper = self.make_wrapper().resolve(scope)
+        return self
+
+    def compile(self) -> 'types.Code':
+        return self.make_wrapper().compile()
+
+    def convert(self, converter: 'cps.Converter', env: 'cps.value', c: 'cps.MetaContinuation') -> 'cps.cexp':
+        return self.make_wrapper().convert(converter, env, c)
+
     def prepare_analysis(self, env: inference.TypeEnvironment):
         self.make_wrapper().prepare_analysis(env)
 
@@ -2401,3 +4419,7 @@ class Load(Expr):
         if follow_symlinks:
             path = os.path.realpath(path)
         return os.path.dirname(path)
+
+
+# imported last, the machine extends the classes above
+from .compiler import vm
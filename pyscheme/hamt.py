@@ -0,0 +1,227 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Persistent hash array mapped tries.
+#
+# A HAMT maps hashable python keys to values. Each level of the trie consumes BITS bits of the key's hash,
+# and a node holds a bitmap of which of its 2**BITS slots are occupied alongside a tuple of just those entries,
+# so lookup, insertion and removal visit at most one node per level.
+#
+# Nothing is ever modified: set and remove copy the nodes on the path to the key and share the rest,
+# so every earlier version of a map stays valid. That makes them safe to hold across amb backtracking.
+#
+# A Leaf can sit at any depth along its hash's path. Keys whose hashes agree in every bit
+# share a Collision node below the last level.
+
+BITS = 5
+MASK = (1 << BITS) - 1
+HASH_BITS = 64
+
+_missing = object()
+
+
+def _hash(key) -> int:
+    return hash(key) & ((1 << HASH_BITS) - 1)
+
+
+def _index(bitmap: int, bit: int) -> int:
+    """
+    the position in a node's entries of the slot for bit
+    """
+    return bin(bitmap & (bit - 1)).count('1')
+
+
+class Leaf:
+    __slots__ = ('hash', 'key', 'value')
+
+    def __init__(self, h: int, key, value):
+        self.hash = h
+        self.key = key
+        self.value = value
+
+
+class Bitmap:
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap: int, entries: tuple):
+        self.bitmap = bitmap
+        self.entries = entries
+
+    def get(self, h: int, key, shift: int):
+        bit = 1 << ((h >> shift) & MASK)
+        if not self.bitmap & bit:
+            return _missing
+        entry = self.entries[_index(self.bitmap, bit)]
+        if type(entry) is Leaf:
+            if entry.hash == h and entry.key == key:
+                return entry.value
+            return _missing
+        return entry.get(h, key, shift + BITS)
+
+    def set(self, h: int, key, value, shift: int) -> tuple:
+        """
+        return the node with key mapped to value, and whether key is new
+        """
+        bit = 1 << ((h >> shift) & MASK)
+        index = _index(self.bitmap, bit)
+        entries = self.entries
+        if not self.bitmap & bit:
+            return Bitmap(self.bitmap | bit, entries[:index] + (Leaf(h, key, value),) + entries[index:]), True
+        entry = entries[index]
+        if type(entry) is Leaf:
+            if entry.hash == h and entry.key == key:
+                if entry.value is value:
+                    return self, False
+                new_entry, added = Leaf(h, key, value), False
+            else:
+                new_entry, added = _merge(entry, Leaf(h, key, value), shift + BITS), True
+        else:
+            new_entry, added = entry.set(h, key, value, shift + BITS)
+            if new_entry is entry:
+                return self, False
+        return Bitmap(self.bitmap, entries[:index] + (new_entry,) + entries[index + 1:]), added
+
+    def remove(self, h: int, key, shift: int):
+        """
+        the node without key: self if key is absent, None if nothing is left,
+        or a lone Leaf below the root so that the parent can hold it directly
+        """
+        bit = 1 << ((h >> shift) & MASK)
+        if not self.bitmap & bit:
+            return self
+        index = _index(self.bitmap, bit)
+        entries = self.entries
+        entry = entries[index]
+        if type(entry) is Leaf:
+            if entry.hash != h or entry.key != key:
+                return self
+            new_entry = None
+        else:
+            new_entry = entry.remove(h, key, shift + BITS)
+            if new_entry is entry:
+                return self
+        if new_entry is not None:
+            if shift > 0 and len(entries) == 1 and type(new_entry) is Leaf:
+                return new_entry
+            return Bitmap(self.bitmap, entries[:index] + (new_entry,) + entries[index + 1:])
+        if len(entries) == 1:
+            return None
+        entries = entries[:index] + entries[index + 1:]
+        if shift > 0 and len(entries) == 1 and type(entries[0]) is Leaf:
+            return entries[0]
+        return Bitmap(self.bitmap & ~bit, entries)
+
+    def leaves(self):
+        for entry in self.entries:
+            if type(entry) is Leaf:
+                yield entry
+            else:
+                yield from entry.leaves()
+
+
+class Collision:
+    __slots__ = ('hash', 'entries')
+
+    def __init__(self, h: int, entries: tuple):
+        self.hash = h
+        self.entries = entries
+
+    def get(self, h: int, key, shift: int):
+        for entry in self.entries:
+            if entry.key == key:
+                return entry.value
+        return _missing
+
+    def set(self, h: int, key, value, shift: int) -> tuple:
+        for index, entry in enumerate(self.entries):
+            if entry.key == key:
+                if entry.value is value:
+                    return self, False
+                return Collision(h, self.entries[:index] + (Leaf(h, key, value),) + self.entries[index + 1:]), False
+        return Collision(h, self.entries + (Leaf(h, key, value),)), True
+
+    def remove(self, h: int, key, shift: int):
+        entries = tuple(entry for entry in self.entries if entry.key != key)
+        if len(entries) == len(self.entries):
+            return self
+        if len(entries) == 1:
+            return entries[0]
+        return Collision(h, entries)
+
+    def leaves(self):
+        return iter(self.entries)
+
+
+def _merge(a: Leaf, b: Leaf, shift: int):
+    """
+    the smallest node holding two leaves with different keys whose hashes agree below shift
+    """
+    if shift >= HASH_BITS:
+        return Collision(a.hash, (a, b))
+    a_slot = (a.hash >> shift) & MASK
+    b_slot = (b.hash >> shift) & MASK
+    if a_slot == b_slot:
+        return Bitmap(1 << a_slot, (_merge(a, b, shift + BITS),))
+    if a_slot < b_slot:
+        return Bitmap((1 << a_slot) | (1 << b_slot), (a, b))
+    return Bitmap((1 << a_slot) | (1 << b_slot), (b, a))
+
+
+class HAMT:
+    """
+    an immutable map from hashable keys to values
+    """
+
+    __slots__ = ('_root', '_size')
+
+    def __init__(self, root: Bitmap=Bitmap(0, ()), size: int=0):
+        self._root = root
+        self._size = size
+
+    def get(self, key, default=None):
+        value = self._root.get(_hash(key), key, 0)
+        return default if value is _missing else value
+
+    def set(self, key, value) -> 'HAMT':
+        """
+        a map like this one but with key mapped to value
+        """
+        root, added = self._root.set(_hash(key), key, value, 0)
+        if root is self._root:
+            return self
+        return HAMT(root, self._size + 1 if added else self._size)
+
+    def remove(self, key) -> 'HAMT':
+        """
+        a map like this one but without key
+        """
+        root = self._root.remove(_hash(key), key, 0)
+        if root is self._root:
+            return self
+        if root is None:
+            return HAMT()
+        return HAMT(root, self._size - 1)
+
+    def items(self):
+        for leaf in self._root.leaves():
+            yield leaf.key, leaf.value
+
+    def __contains__(self, key) -> bool:
+        return self._root.get(_hash(key), key, 0) is not _missing
+
+    def __len__(self) -> int:
+        return self._size
@@ -85,6 +85,14 @@ class TypeVariable(Type):
         """used for consistency during testing"""
         expr.Symbol.reset()
 
+    def __getstate__(self):
+        """
+        names are allocated when first printed, a copy gets its own
+        """
+        state = self.__dict__.copy()
+        state['_TypeVariable__name'] = None
+        return state
+
     @property
     def name(self):
         if self.__name is None:
@@ -202,6 +210,13 @@ class Function(TypeOperator):
 
 class TypeEnvironment:
     counter = 0
+    lookups = None  # if a set, every symbol looked up in or through this frame is added to it, see TypeCache
+
+    def defines(self, symbol: 'expr.Symbol') -> bool:
+        """
+        true if this frame itself, rather than one of its parents, holds the symbol
+        """
+        return False
 
     def extend(self, dictionary: Dict['expr.Symbol', Type]=None) -> 'TypeEnvironment':
         if dictionary is None:
@@ -289,7 +304,12 @@ class TypeFrame(TypeEnvironment):
     def dump_dict(self):
         return ''
 
+    def defines(self, symbol: 'expr.Symbol') -> bool:
+        return symbol in self._dictionary
+
     def __getitem__(self, symbol: 'expr.Symbol') -> Type:
+        if self.lookups is not None:
+            self.lookups.add(symbol)
         if symbol in self._dictionary:
             return self._dictionary[symbol]
         else:
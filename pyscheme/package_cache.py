@@ -0,0 +1,312 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# on-disk cache of parsed packages
+
+import hashlib
+import io
+import os
+import pickle
+import sys
+import tempfile
+from pathlib import Path
+from . import expr
+from .singleton import Singleton, FlyWeight
+
+
+class Config:
+    enabled = True
+    persistent_types = False
+    directory = '__fncache__'
+
+
+MAGIC = 'pyscheme package cache'
+
+# bump this whenever the layout of a cache entry changes.
+# Changes to the pickled classes themselves are caught by source_digest()
+VERSION = 4
+
+_source_digest = None
+
+
+class Pickler(pickle.Pickler):
+    """
+    Singletons and flyweights are compared by identity, so they are pickled as calls to their
+    constructors, which return the existing instance in the loading process.
+    Nested loads are pickled by reference so that their packages are loaded again on the way back in.
+    """
+
+    def reducer_override(self, obj):
+        if type(type(obj)) is Singleton:
+            return type(obj), ()
+        if type(type(obj)) is FlyWeight:
+            return type(obj), (obj.value(),)
+        return NotImplemented
+
+    def persistent_id(self, obj):
+        if type(obj) is expr.Load:
+            return obj.packages, obj.aliases, obj.current
+        return None
+
+
+class Unpickler(pickle.Unpickler):
+    def __init__(self, file, get_reader: callable):
+        super().__init__(file)
+        self.get_reader = get_reader
+
+    def persistent_load(self, pid):
+        packages, aliases, current = pid
+        return expr.Load.restore(packages, aliases, current, self.get_reader)
+
+
+def stamp(source: Path) -> tuple:
+    """
+    identifies the current content of a source file
+    """
+    stat = source.stat()
+    return str(source), stat.st_size, stat.st_mtime_ns, digest(source)
+
+
+def unchanged(source_stamp: tuple) -> bool:
+    """
+    true if the file still has the content it had when stamped,
+    if it has merely been touched its hash must still match.
+    """
+    path, size, mtime, source_digest = source_stamp
+    source = Path(path)
+    try:
+        stat = source.stat()
+    except OSError:
+        return False
+    if (size, mtime) == (stat.st_size, stat.st_mtime_ns):
+        return True
+    return size == stat.st_size and source_digest == digest(source)
+
+
+def digest(source: Path) -> str:
+    return hashlib.sha256(source.read_bytes()).hexdigest()
+
+
+def source_digest() -> str:
+    """
+    a hash of the source of the modules whose classes are pickled, the parse trees and the types,
+    so that any change to how they represent a package invalidates entries written before it
+    """
+    global _source_digest
+    if _source_digest is None:
+        from . import inference, reader
+        source_hash = hashlib.sha256()
+        for module in (expr, inference, reader):
+            source_hash.update(Path(module.__file__).read_bytes())
+        _source_digest = source_hash.hexdigest()
+    return _source_digest
+
+
+def format_version() -> tuple:
+    return VERSION, source_digest()
+
+
+def current_header(stamps: list) -> tuple:
+    return MAGIC, format_version(), sys.version_info[:2], stamps
+
+
+def valid_header(header) -> bool:
+    if type(header) is not tuple or len(header) != 4:
+        return False
+    magic, version, python, stamps = header
+    if (magic, version, python) != (MAGIC, format_version(), sys.version_info[:2]):
+        return False
+    return all(unchanged(source_stamp) for source_stamp in stamps)
+
+
+class Entry:
+    """
+    a single file in a __fncache__ directory, with a header of the format version and source digest, python version,
+    and stamps of the source files its content was derived from, followed by the pickled content.
+    The content is used only if the header matches and none of the sources have changed,
+    anything else, including an unreadable entry, is a miss.
+    """
+
+    errors = (OSError, EOFError, ValueError, TypeError, AttributeError, ImportError, pickle.UnpicklingError)
+
+    def __init__(self, source: Path, suffix: str):
+        self.path = source.parent.joinpath(Config.directory, source.name + suffix)
+
+    def read(self, load: callable):
+        """
+        return the result of calling load(fh) on the content, or None
+        """
+        try:
+            with self.path.open('rb') as fh:
+                if not valid_header(pickle.load(fh)):
+                    return None
+                return load(fh)
+        except self.errors:
+            return None
+
+    def write(self, header: tuple, dump: callable):
+        """
+        call dump(fh) to write the content to a temporary file then rename it into place,
+        so a concurrent reader never sees a partial entry.
+        Failure to write just means no cache.
+        """
+        temp = None
+        try:
+            self.path.parent.mkdir(exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=str(self.path.parent), delete=False) as fh:
+                temp = fh.name
+                pickle.dump(header, fh)
+                dump(fh)
+            os.replace(temp, str(self.path))
+        except (OSError, pickle.PicklingError, RecursionError):
+            if temp is not None and os.path.exists(temp):
+                os.unlink(temp)
+
+
+class PackageCache:
+    """
+    Caches the parsed contents of a package source file in a __fncache__ directory alongside it.
+    """
+
+    def __init__(self, source: Path):
+        self.source = source
+        self.entry = Entry(source, '.pickle')
+
+    def fetch(self, parse: callable, get_reader: callable) -> list:
+        """
+        return the cached contents of the source if valid, otherwise parse and cache it
+        """
+        if not Config.enabled:
+            return parse()
+        contents = self.entry.read(lambda fh: Unpickler(fh, get_reader).load())
+        if contents is None:
+            header = current_header([stamp(self.source)])  # taken before parsing, in case the source changes meanwhile
+            contents = parse()
+            self.entry.write(header, lambda fh: Pickler(fh).dump(contents))
+        return contents
+
+
+class TypePickler(Pickler):
+    """
+    The type environment of a package body extends the global type environment of whichever program loads it,
+    so that is pickled by reference and replaced by the loading program's own when unpickled.
+    """
+
+    def __init__(self, file, parent: 'inference.TypeEnvironment'):
+        super().__init__(file)
+        self.parent = parent
+
+    def persistent_id(self, obj):
+        if obj is self.parent:
+            return 'globalenv'
+        return super().persistent_id(obj)
+
+
+class TypeUnpickler(pickle.Unpickler):
+    def __init__(self, file, parent: 'inference.TypeEnvironment'):
+        super().__init__(file)
+        self.parent = parent
+
+    def persistent_load(self, pid):
+        return self.parent
+
+
+class TypeCache:
+    """
+    Caches the generalised type environment inferred for each package body,
+    once per process, and optionally on disk if Config.persistent_types is set,
+    so each subsequent load of the package costs an unpickle rather than a re-inference of the package.
+
+    Each use gets its own copy, so nothing a program unifies against a package's types can leak into another.
+
+    A package's type can depend on anything the loading program has defined in the global environment it extends,
+    so only packages whose free symbols all resolve to builtins are cached, and a cached type is only re-used
+    while the loading program has not redefined any of those builtins.
+
+    A persistent entry is stamped with every package source the inference read,
+    the package itself and any packages it loads, so a change to any of them invalidates it.
+    """
+
+    memo = {}  # source path: (body, pickled type, stamps, names of free symbols)
+    analysing = []  # the stamps of the packages being analysed, innermost last
+
+    def __init__(self, source: Path):
+        self.source = source
+        self.entry = Entry(source, '.types.pickle')
+
+    def fetch(self, body: 'expr.Sequence', parent: 'inference.TypeEnvironment', analyse: callable) -> 'inference.Type':
+        """
+        return a copy of the cached type of the package body as if inferred in the parent environment,
+        otherwise call analyse() and cache the result
+        """
+        if not Config.enabled:
+            return analyse()
+        cached = self.memo.get(self.source)
+        if cached is None or cached[0] is not body:
+            if Config.persistent_types:
+                cached = self.entry.read(lambda fh: self.load(fh, body))
+            else:
+                cached = None
+            if cached is None:
+                return self.analyse(body, parent, analyse)
+            self.memo[self.source] = cached
+        _, data, stamps, free = cached
+        if any(parent.defines(expr.Symbol(name)) for name in free):
+            return self.analyse(body, parent, analyse)
+        self.note_dependencies(stamps)
+        return TypeUnpickler(io.BytesIO(data), parent).load()
+
+    def analyse(self, body: 'expr.Sequence', parent: 'inference.TypeEnvironment', analyse: callable) -> 'inference.Type':
+        stamps = [stamp(self.source)]
+        self.analysing.append(stamps)
+        previous, parent.lookups = parent.lookups, set()
+        try:
+            result = analyse()
+        finally:
+            self.analysing.pop()
+            lookups, parent.lookups = parent.lookups, previous
+            if previous is not None:
+                previous.update(lookups)
+        self.note_dependencies(stamps)
+        if any(parent.defines(symbol) for symbol in lookups):
+            return result  # depends on the loading program's own definitions
+        free = sorted(symbol.value() for symbol in lookups)
+        try:
+            fh = io.BytesIO()
+            TypePickler(fh, parent).dump(result)
+        except (pickle.PicklingError, TypeError, AttributeError, RecursionError):
+            return result
+        data = fh.getvalue()
+        self.memo[self.source] = (body, data, stamps, free)
+        if Config.persistent_types:
+            self.entry.write(current_header(stamps), lambda out: self.dump(out, data, stamps, free))
+        return result
+
+    @classmethod
+    def note_dependencies(cls, stamps: list):
+        if len(cls.analysing) > 0:
+            cls.analysing[-1].extend(stamps)
+
+    @classmethod
+    def dump(cls, fh, data: bytes, stamps: list, free: list):
+        pickle.dump((stamps, free), fh)
+        fh.write(data)
+
+    @classmethod
+    def load(cls, fh, body: 'expr.Sequence') -> tuple:
+        stamps, free = pickle.load(fh)
+        return body, fh.read(), stamps, free
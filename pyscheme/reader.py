@@ -19,8 +19,8 @@ from .exceptions import PySchemeSyntaxError
 from . import expr
 from .types import Maybe
 import re
-import inspect
 import io
+from array import array
 
 
 class Config:
@@ -99,79 +99,225 @@ class Tokeniser:
         '|',
     )
 
+    # a single pattern trying the regexes above in order, then the literals in order,
+    # exactly as the original per-regex loop did.
+    token_pattern = None
+
+    # maps token_pattern group indexes to a pair of (token type, index of the group holding the text)
+    token_groups = {}
+
+    whitespace = re.compile(r'\s*')
+
     def __init__(self, stream: io.StringIO):
         self._stream = stream
         self._line_number = 0
         self._character_position = 0
-        self._tokens = []
+        # the token buffer, as parallel arrays indexed by token position.
+        # Token objects are only built for tokens that are actually matched or inspected.
+        self._types = []
+        self._values = []
+        self._lines = array('l')
+        self._chars = array('l')
+        self._index = 0  # position of the next token in the buffer
         self._line = ''
+        self._pos = 0
+        if Tokeniser.token_pattern is None:
+            Tokeniser.compile_token_pattern()
+
+    @classmethod
+    def compile_token_pattern(cls):
+        alternatives = []
+        group = 0
+        for rex, token_type in cls.regexes.items():
+            group += 1
+            cls.token_groups[group] = (token_type, group + 1)
+            alternatives += ['(' + rex + ')']
+            group += re.compile(rex).groups
+        group += 1
+        cls.token_groups[group] = ('LITERAL', group)
+        alternatives += ['(' + '|'.join(re.escape(literal) for literal in cls.literals) + ')']
+        cls.token_pattern = re.compile('|'.join(alternatives))
 
     def match(self, name: str) -> Maybe[Token]:
-        token = self.next_token()
-        if token.type == name:
-            return token
+        index = self._index
+        if index == len(self._types):
+            self.fill()
+        if self._types[index] == name:
+            self._index = index + 1
+            return self.token(index)
         else:
-            self._tokens += [token]
             return None
 
     def peek(self) -> Maybe[Token]:
-        token = self.next_token()
-        self.pushback(token)
-        return token
+        if self._index == len(self._types):
+            self.fill()
+        return self.token(self._index)
+
+    def mark(self) -> int:
+        """
+        the index of the next token, for reset()
+        """
+        return self._index
+
+    def reset(self, index: int) -> None:
+        """
+        backtrack (or skip forward) to a position previously returned by mark()
+        """
+        self._index = index
 
-    def pushback(self, token: Token) -> None:
-        self._tokens += [token]
+    def discard(self) -> None:
+        """
+        forget the tokens already read, called between statements since no rule backtracks past one
+        """
+        index = self._index
+        del self._types[:index]
+        del self._values[:index]
+        del self._lines[:index]
+        del self._chars[:index]
+        self._index = 0
 
     def line_number(self) -> int:
-        return self._line_number
+        """
+        the line of the next token
+        """
+        if self._index == len(self._types):
+            self.fill()
+        return self._lines[self._index]
 
     def next_token(self) -> Maybe[Token]:
-        if len(self._tokens) > 0:
-            return self._tokens.pop()
-        else:
-            while self._line == '':
-                self._line = self._stream.readline()
-                if self._line == '':  # EOF
-                    return self.new_token('EOF', 'EOF')
-                self._line_number += 1
-                self._character_position = 0
-
-                self._line = self._line.rstrip()
-                self._line = re.sub(r'^\s*//.*', '', self._line, 1)
-            length = len(self._line)
-            self._line = self._line.lstrip()
-            self._character_position += length - len(self._line)
-            for rex in self.regexes.keys():
-                length = len(self._line)
-                match = re.match(rex, self._line)
-                if match:
-                    self._line = re.sub(rex, '', self._line, 1).strip()
-                    self._character_position += length - len(self._line)
-                    self._line = re.sub(r'^//.*', '', self._line, 1)
-                    text = match.group(1)
-                    if self.regexes[rex] == 'ID':
-                        if text in self.reserved:
-                            return self.new_token(self.reserved[text], text)
-                        else:
-                            return self.new_token('ID', text)
-                    else:
-                        return self.new_token(self.regexes[rex], text)
-            for literal in self.literals:
-                if self._line.startswith(literal):
-                    self._line = self._line[len(literal):].lstrip()
-                    self._line = re.sub(r'^//.*', '', self._line, 1)
-                    return self.new_token(literal, literal)
-            return self.new_token('ERROR', self._line)
+        index = self._index
+        if index == len(self._types):
+            self.fill()
+        self._index = index + 1
+        return self.token(index)
+
+    def token(self, index: int) -> Token:
+        return Token(self._lines[index], self._chars[index], self._types[index], self._values[index])
+
+    def push(self, token_type: str, value: str) -> None:
+        self._types.append(token_type)
+        self._values.append(value)
+        self._lines.append(self._line_number)
+        self._chars.append(self._character_position)
+
+    def fill(self) -> None:
+        """
+        Lex every token on the rest of the current line (or the next line with any)
+        onto the end of the buffer in one pass of the precompiled token_pattern,
+        advancing self._pos rather than re-slicing the line.
+        A whole line at a time rather than the whole stream, so that an interactive repl
+        doesn't wait for input it doesn't need yet.
+        An ERROR token is left unconsumed, so it is lexed again if read again, as is EOF.
+        Character positions reproduce those of RescanTokeniser exactly.
+        """
+        line = self._line
+        pos = self._pos
+        while pos == len(line):
+            line = self._stream.readline()
+            if line == '':  # EOF
+                self._line = line
+                self._pos = 0
+                self.push('EOF', 'EOF')
+                return
+            self._line_number += 1
+            line = self._line = line.rstrip()
+            pos = self.whitespace.match(line).end()
+            self._character_position = pos
+            if line.startswith('//', pos):
+                pos = len(line)
+        types = self._types
+        values = self._values
+        lines = self._lines
+        chars = self._chars
+        line_number = self._line_number
+        char = self._character_position
+        token_groups = self.token_groups
+        reserved = self.reserved
+        match_token = self.token_pattern.match
+        match_whitespace = self.whitespace.match
+        length = len(line)
+        while pos < length:
+            match = match_token(line, pos)
+            if match is None:
+                types.append('ERROR')
+                values.append(line[pos:])
+                lines.append(line_number)
+                chars.append(char)
+                break
+            end = match_whitespace(line, match.end()).end()
+            token_type, group = token_groups[match.lastindex]
+            text = match.group(group)
+            if token_type == 'LITERAL':
+                token_type = text
+            else:
+                char += end - pos
+                if token_type == 'ID' and text in reserved:
+                    token_type = reserved[text]
+            types.append(token_type)
+            values.append(text)
+            lines.append(line_number)
+            chars.append(char)
+            pos = length if line.startswith('//', end) else end
+        self._pos = pos
+        self._character_position = char
 
     def new_token(self, name, value=''):
         return Token(self._line_number, self._character_position, name, value)
 
     def __str__(self) -> str:
-        return "<tokens: " + str(self._tokens) + ' remaining: "' + self._line + '">'
+        remaining = [self.token(index) for index in range(self._index, len(self._types))]
+        return "<tokens: " + str(remaining) + ' remaining: "' + self._line[self._pos:] + '">'
 
     __repr__ = __str__
 
 
+class RescanTokeniser(Tokeniser):
+    """
+    The original tokeniser, which re-matches every regex against the remaining line
+    and re-slices it after each token.
+    Retained as a reference implementation for the tests and benchmarks.
+    """
+
+    def fill(self) -> None:
+        token = self.lex()
+        self.push(token.type, token.value)
+
+    def lex(self) -> Token:
+        while self._line == '':
+            self._line = self._stream.readline()
+            if self._line == '':  # EOF
+                return self.new_token('EOF', 'EOF')
+            self._line_number += 1
+            self._character_position = 0
+
+            self._line = self._line.rstrip()
+            self._line = re.sub(r'^\s*//.*', '', self._line, 1)
+        length = len(self._line)
+        self._line = self._line.lstrip()
+        self._character_position += length - len(self._line)
+        for rex in self.regexes.keys():
+            length = len(self._line)
+            match = re.match(rex, self._line)
+            if match:
+                self._line = re.sub(rex, '', self._line, 1).strip()
+                self._character_position += length - len(self._line)
+                self._line = re.sub(r'^//.*', '', self._line, 1)
+                text = match.group(1)
+                if self.regexes[rex] == 'ID':
+                    if text in self.reserved:
+                        return self.new_token(self.reserved[text], text)
+                    else:
+                        return self.new_token('ID', text)
+                else:
+                    return self.new_token(self.regexes[rex], text)
+        for literal in self.literals:
+            if self._line.startswith(literal):
+                self._line = self._line[len(literal):].lstrip()
+                self._line = re.sub(r'^//.*', '', self._line, 1)
+                return self.new_token(literal, literal)
+        return self.new_token('ERROR', self._line)
+
+
 class Reader:
     """Grammar
 
@@ -339,19 +485,56 @@ class Reader:
         type_var : TYPE_VAR
 
     """
+    # the grammar rules and token primitives reported when Config.debugging is set
+    traced = (
+        'read', 'top', 'construct', 'switch', 'defn', 'denv', 'env', 'conditional', 'alternative', 'test',
+        'nest', 'body', 'composite_body', 'sub_functions', 'sub_function', 'sub_function_arguments',
+        'sub_function_arg_list', 'sub_function_arg', 'sub_function_arg_2', 'sub_function_arg_3',
+        'statements', 'load', 'package', 'definition', 'define', 'implicit_define', 'expression',
+        'binop_and', 'unop_not', 'binop_compare', 'binop_cons', 'binop_add', 'binop_mul', 'binop_pow',
+        'op_funcall', 'env_access', 'atom', 'symbol', 'type_symbol', 'number', 'string', 'char', 'wildcard',
+        'boolean', 'lst', 'exprs', 'type_symbols', 'typedef', 'flat_type', 'type_body', 'type_constructor',
+        'types', 'type', 'type_clause', 'type_var', 'prototype', 'prototype_body', 'single_prototype',
+        'swallow', 'consume',
+    )
 
     def __init__(self, tokeniser: Tokeniser, stderr: io.StringIO):
         self.tokeniser = tokeniser
         self.stderr = stderr
-        self.depth = 0
+        self.callers = []
+        if Config.debugging:
+            self.instrument(self.traced, self.tracer)
+
+    def instrument(self, names: tuple, wrapper: callable):
+        """
+        Replace each of the named methods on this instance only with `wrapper(name, method)`.
+        This is done once, at construction, so a reader that isn't instrumented
+        runs the plain class methods with no per-call test or overhead.
+        """
+        for name in names:
+            setattr(self, name, wrapper(name, getattr(self, name)))
+
+    def tracer(self, name: str, method: callable) -> callable:
+        def trace(*args, **kwargs):
+            caller = self.callers[-1] if len(self.callers) > 0 else ''
+            self.debug(name, *args, caller=caller, **kwargs)
+            self.callers += [name]
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                self.callers.pop()
+            if name == 'read':
+                self.debug(name, result=result)
+            return result
+
+        return trace
 
     def read(self) -> expr.Expr:
-        if Config.debugging:
-            self.depth = len(inspect.stack())
-        self.debug("*******************************************************")
-        result = self.top()
-        self.debug("read", result=result)
-        return result
+        self.tokeniser.discard()  # no rule backtracks past the start of a statement
+        try:
+            return self.top()
+        except RecursionError:
+            self.error("too deeply nested")
 
     def top(self, fail=True) -> Maybe[expr.Expr]:
         """
@@ -360,7 +543,6 @@ class Reader:
                       | expression ';'
                       | EOF
         """
-        self.debug("top", fail=fail)
         if self.swallow('EOF'):
             return None
 
@@ -388,8 +570,6 @@ class Reader:
                   | denv
                   | nest
         """
-        self.debug("construct", fail=fail)
-
         conditional = self.conditional(False)
         if conditional is not None:
             return conditional
@@ -420,7 +600,6 @@ class Reader:
         """
         switch : SWITCH '(' actuals ')' composite_body
         """
-        self.debug('switch', fail=fail)
         if self.swallow('SWITCH'):
             self.consume('(')
             actuals = self.exprs()
@@ -437,8 +616,7 @@ class Reader:
         defn : FN symbol sub_function
              | FN symbol composite_body
         """
-        self.debug("defn", fail=fail)
-
+        start = self.tokeniser.mark()
         fn = self.swallow('FN')
         if fn is None:
             if fail:
@@ -447,7 +625,7 @@ class Reader:
 
         symbol = self.symbol(False)
         if symbol is None:
-            self.pushback(fn)
+            self.tokeniser.reset(start)
             if fail:
                 self.error('expected symbol')
             else:
@@ -465,8 +643,7 @@ class Reader:
         """
         denv : ENV symbol [EXTENDS package] body
         """
-        self.debug('denv', fail=fail)
-
+        start = self.tokeniser.mark()
         denv = self.swallow('ENV')
         if denv is None:
             if fail:
@@ -476,7 +653,7 @@ class Reader:
 
         symbol = self.symbol(False)
         if symbol is None:
-            self.pushback(denv)
+            self.tokeniser.reset(start)
             return None
         else:
             if self.swallow('EXTENDS'):
@@ -490,8 +667,6 @@ class Reader:
         """
         env : ENV [EXTENDS package] body
         """
-        self.debug('env', fail=fail)
-
         env = self.swallow('ENV')
         if env is None:
             if fail:
@@ -509,7 +684,6 @@ class Reader:
         """
         conditional : IF '(' expression ')' nest ELSE { IF '(' expression ')' nest ELSE } nest
         """
-        self.debug("conditional", fail=fail)
         if self.swallow('IF'):
             test = self.test()
             consequent = self.nest()
@@ -535,7 +709,6 @@ class Reader:
         return test
 
     def nest(self, fail=True):
-        self.debug("nest", fail=fail)
         body = self.body(fail)
         if body is None:
             return None
@@ -545,7 +718,6 @@ class Reader:
         """
             body : '{' statements '}'
         """
-        self.debug("body", fail=fail)
         if self.swallow('{'):
             statements = self.statements()
             self.consume('}')
@@ -560,7 +732,6 @@ class Reader:
         """
         composite_body : '{' sub_functions '}'
         """
-        self.debug("composite_body")
         self.consume('{')
         sub_functions = self.sub_functions()
         self.consume('}')
@@ -570,7 +741,6 @@ class Reader:
         """
         sub_functions : sub_function { sub_function }
         """
-        self.debug("sub_functions")
         sub_function = self.sub_function(False)
         if sub_function is None:
             return expr.Null()
@@ -581,7 +751,6 @@ class Reader:
         """
         sub_function : '(' sub_function_arguments ')' body
         """
-        self.debug("sub_function", fail=fail)
         sub_function_arguments = self.sub_function_arguments(fail)
         if sub_function_arguments is None:
             return None
@@ -594,7 +763,6 @@ class Reader:
         sub_function_arguments : '(' sub_function_arg_list ')'
 
         """
-        self.debug("sub_function_arguments", fail=fail)
         if self.swallow('('):
             sub_function_arg_list = self.sub_function_arg_list()
             self.consume(')')
@@ -610,7 +778,6 @@ class Reader:
         sub_function_arg_list : empty
                               | sub_function_arg { ',' sub_function_arg }
         """
-        self.debug("sub_function_arg_list", fail=fail)
         sub_function_arg = self.sub_function_arg(False)
         if sub_function_arg is None:
             return expr.Null()
@@ -625,13 +792,13 @@ class Reader:
                          | sub_function_arg_2
                          | symbol '=' sub_function_arg
         """
-        self.debug("sub_function_arg", fail=fail)
+        start = self.tokeniser.mark()
         id_token = self.swallow('ID')
         if id_token is not None:
             if self.swallow('='):
                 return expr.As(expr.Symbol(id_token.value), self.sub_function_arg())
             else:
-                self.pushback(id_token)
+                self.tokeniser.reset(start)
         sub_function_arg_2 = self.sub_function_arg_2(fail)
         if sub_function_arg_2 is None:
             return None
@@ -645,7 +812,6 @@ class Reader:
         sub_function_arg_2 : '[' [ sub_function_arg { ',' sub_function_arg } ] ']'
                            | sub_function_arg_3
         """
-        self.debug("sub_function_arg_2", fail=fail)
         if self.swallow('['):
             def list_items(do_fail):
                 list_item = self.sub_function_arg(do_fail)
@@ -671,8 +837,6 @@ class Reader:
                            | BOOLEAN
                            | WILDCARD
         """
-        self.debug("sub_function_arg_3", fail=fail)
-
         number = self.number(False)
         if number is not None:
             return number
@@ -720,7 +884,6 @@ class Reader:
                        | construct statements
                        | empty
         """
-        self.debug("statements")
         definition = self.definition(False)
         if definition is not None:
             if self.swallow(';'):
@@ -773,7 +936,6 @@ class Reader:
                        | implicit_define
                        | load
         """
-        self.debug("definition", fail=fail)
         load = self.load(fail)
         if load is not None:
             return load
@@ -795,7 +957,6 @@ class Reader:
         """
         define : DEFINE symbol '=' expression
         """
-        self.debug("define", fail=fail)
         if self.swallow('DEFINE'):
             symbol = self.symbol()
             self.consume('=')
@@ -810,7 +971,7 @@ class Reader:
         """
         implicit_define : symbol '=' expression
         """
-        self.debug("implicit_define", fail=fail)
+        start = self.tokeniser.mark()
         identifier = self.swallow('ID')
         if identifier is None:
             if fail:
@@ -821,7 +982,7 @@ class Reader:
         if eq is None:
             if fail:
                 self.error("expected '='")
-            self.pushback(identifier)
+            self.tokeniser.reset(start)
             return None
 
         expression = self.expression()
@@ -832,7 +993,6 @@ class Reader:
             expression : binop_and THEN expression
                    | binop_and
         """
-        self.debug("expression", fail=fail)
         return self.rassoc_binop(self.binop_and, ['THEN'], self.expression, fail)
 
     def binop_and(self, fail=True) -> Maybe[expr.Expr]:
@@ -842,7 +1002,6 @@ class Reader:
                    | unop_not {XOR unop_not}
                    | unop_not
         """
-        self.debug("binop_and", fail=fail)
         return self.lassoc_binop(self.unop_not, ['AND', 'OR', 'XOR'], fail)
 
     def unop_not(self, fail=True) -> Maybe[expr.Expr]:
@@ -850,7 +1009,6 @@ class Reader:
             unop_not : NOT unop_not
                    | binop_compare
         """
-        self.debug("unop_not", fail=fail)
         token = self.swallow('NOT')
         if token:
             return self.apply_token(token, self.unop_not())
@@ -867,7 +1025,6 @@ class Reader:
                    | binop_cons LE binop_cons
                    | binop_cons
         """
-        self.debug("binop_compare", fail=fail)
         return self.rassoc_binop(self.binop_cons, ['==', '!=', '>', '<', '>=', '<='], self.binop_cons, fail)
 
     def binop_cons(self, fail=True) -> Maybe[expr.Expr]:
@@ -876,7 +1033,6 @@ class Reader:
                    | binop_add APPEND binop_cons
                    | binop_add
         """
-        self.debug("binop_cons", fail=fail)
         return self.rassoc_binop(self.binop_add, ['@', '@@'], self.binop_cons, fail)
 
     def binop_add(self, fail=True) -> Maybe[expr.Expr]:
@@ -885,7 +1041,6 @@ class Reader:
                    | binop_mul '-' binop_add
                    | binop_mul
         """
-        self.debug("binop_add", fail=fail)
         return self.lassoc_binop(self.binop_mul, ['+', '-'], fail)
 
     def binop_mul(self, fail=True) -> Maybe[expr.Expr]:
@@ -895,7 +1050,6 @@ class Reader:
                    | binop_pow {'%' binop_pow}
                    | binop_pow
         """
-        self.debug("binop_mul", fail=fail)
         return self.lassoc_binop(self.binop_pow, ['*', '/', '%'], fail)
 
     def binop_pow(self, fail=True) -> Maybe[expr.Expr]:
@@ -903,7 +1057,6 @@ class Reader:
             binop_pow : op_funcall '**' binop_pow
                       | op_funcall
         """
-        self.debug("binop_pow")
         return self.rassoc_binop(self.op_funcall, ['**'], self.binop_pow, fail)
 
     def op_funcall(self, fail=True) -> Maybe[expr.Expr]:
@@ -911,7 +1064,6 @@ class Reader:
             op_funcall : env_access ['(' actuals ')']
                        | env_access
         """
-        self.debug("op_funcall", fail=fail)
         env_access = self.env_access(fail)
         if env_access is None:
             return None
@@ -928,8 +1080,6 @@ class Reader:
              env_access : atom {'.' env_access}
                         | atom
         """
-        self.debug("env_access", fail=fail)
-
         lhs = self.atom(fail)
         if lhs is None:
             return None
@@ -959,7 +1109,6 @@ class Reader:
                    | switch
                    | '(' expression ')'
         """
-        self.debug("atom", fail=fail)
         symbol = self.symbol(False)
         if symbol:
             return symbol
@@ -1027,7 +1176,6 @@ class Reader:
         """
             symbol : ID
         """
-        self.debug("symbol", fail=fail)
         identifier = self.swallow('ID')
         if identifier:
             return expr.Symbol(identifier.value)
@@ -1040,7 +1188,6 @@ class Reader:
         """
             type_symbol : TYPE_ID
         """
-        self.debug("type_symbol", fail=fail)
         identifier = self.swallow('TYPE_ID')
         if identifier:
             return expr.Symbol(identifier.value)
@@ -1059,10 +1206,9 @@ class Reader:
         """
             number : NUMBER
         """
-        self.debug("number", fail=fail)
         number = self.swallow('NUMBER')
         if number:
-            return expr.Number(int(number.value))
+            return expr.make_number(int(number.value))
         elif fail:
             self.error("expected number")
         else:
@@ -1072,10 +1218,9 @@ class Reader:
         """
             string : STRING
         """
-        self.debug("string", fail=fail)
         string = self.swallow('STRING')
         if string:
-            return expr.LinkedList.list([expr.Char(c) for c in string.value])
+            return expr.make_string(string.value)
         elif fail:
             self.error("expected string")
         else:
@@ -1085,7 +1230,6 @@ class Reader:
         """
             char : CHAR
         """
-        self.debug("char", fail=fail)
         char = self.swallow('CHAR')
         if char:
             return expr.Char(char.value)
@@ -1109,7 +1253,6 @@ class Reader:
                     | FALSE
                     | UNKNOWN
         """
-        self.debug("boolean", fail=fail)
         token = self.swallow('TRUE')
         if token:
             return expr.T()
@@ -1131,7 +1274,6 @@ class Reader:
         """
             list : '[' exprs ']'
         """
-        self.debug("lst", fail=fail)
         if self.swallow('['):
             exprs = self.exprs()
             self.consume(']')
@@ -1146,7 +1288,6 @@ class Reader:
             exprs : empty
                   | expression { ',' exprs }
         """
-        self.debug("exprs")
         expression = self.expression(False)
         if expression is None:
             return expr.Null()
@@ -1159,7 +1300,6 @@ class Reader:
         """
         type_symbols : type_symbol {, type_symbol }
         """
-        self.debug("type_symbols")
         symbol = self.type_symbol()
         if self.swallow(','):
             return expr.Pair(symbol, self.type_symbols())
@@ -1170,7 +1310,6 @@ class Reader:
         """
         typedef : TYPEDEF flat_type '{' type_body '}'
         """
-        self.debug("typedef", fail=fail)
         if self.swallow('TYPEDEF'):
             flat_type = self.flat_type()
             self.consume('{')
@@ -1186,7 +1325,6 @@ class Reader:
         """
         flat_type : symbol [ '(' type_symbol { ',' type_symbol } ')' ]
         """
-        self.debug("flat_type")
         type_name = self.symbol()
         if self.swallow('('):
             formals = self.type_symbols()
@@ -1199,7 +1337,6 @@ class Reader:
         """
         type_body : type_constructor { '|' type_constructor }
         """
-        self.debug("type_body")
         type_constructor = self.type_constructor(typevar_parser)
         if self.swallow('|'):
             return expr.Pair(type_constructor, self.type_body(typevar_parser))
@@ -1210,7 +1347,6 @@ class Reader:
         """
         type_constructor :  symbol [ '(' type { ',' type } ')' ]
         """
-        self.debug("type_constructor")
         symbol = self.symbol()
         if self.swallow('('):
             types = self.types(typevar_parser)
@@ -1223,7 +1359,6 @@ class Reader:
         """
         types : type { ',' type }
         """
-        self.debug("types")
         the_type = self.type(typevar_parser)
         if self.swallow(','):
             return expr.Pair(the_type, self.types(typevar_parser))
@@ -1254,7 +1389,6 @@ class Reader:
                     | symbol '(' type { ',' type } ')'
                     | '(' type ')'
         """
-        self.debug("type_clause")
         if self.swallow('NOTHING'):
             return expr.NothingType()
         if self.swallow('KW_LIST'):
@@ -1294,7 +1428,6 @@ class Reader:
         """
         type_var : TYPE_ID
         """
-        self.debug("type_var")
         identifier = self.swallow('TYPE_ID')
         if identifier:
             return expr.TypeVar(expr.Symbol(identifier.value))
@@ -1307,7 +1440,6 @@ class Reader:
         """
         prototype : PROTOTYPE symbol '{' prototype_body '}'
         """
-        self.debug("prototype")
         if self.swallow('PROTOTYPE'):
             symbol = self.symbol()
             self.consume('{')
@@ -1324,7 +1456,6 @@ class Reader:
         prototype_body : empty
                        | single_prototype { prototype_body }
         """
-        self.debug("prototype_body")
         single_prototype = self.single_prototype(False)
         if single_prototype is None:
             return expr.Null()
@@ -1338,7 +1469,6 @@ class Reader:
         single_prototype : symbol ':' type
                          | prototype
         """
-        self.debug("single_prototype")
         symbol = self.symbol(False)
         if symbol is not None:
             self.consume(':')
@@ -1410,7 +1540,6 @@ class Reader:
         if the next token in the input matches one of the argument types, consume it and return the token
         otherwise leave it in the input stream and return None
         """
-        self.debug("swallow", args=args, caller=inspect.stack()[1][3])
         for token_type in args:
             token = self.tokeniser.match(token_type)
             if token is not None:
@@ -1423,14 +1552,10 @@ class Reader:
         :param args:
         :return: void
         """
-        self.debug("consume", args=args, caller=inspect.stack()[1][3])
         for name in args:
             if self.tokeniser.match(name) is None:
                 self.error("expected " + name)
 
-    def pushback(self, token: Token):
-        self.tokeniser.pushback(token)
-
     def error(self, msg):
         raise PySchemeSyntaxError(
             msg,
@@ -1439,15 +1564,14 @@ class Reader:
         )
 
     def debug(self, *args, **kwargs):
-        if Config.debugging:
-            depth = len(inspect.stack()) - self.depth
-            print('   |' * (depth // 4), end='')
-            print(' ' * (depth % 4), end='')
-            for arg in args:
-                print(arg, end=' ')
-            for k in kwargs:
-                print(k + '=' + str(kwargs[k]), end=' ')
-            print(self.tokeniser)
+        depth = len(self.callers)
+        print('   |' * (depth // 4), end='')
+        print(' ' * (depth % 4), end='')
+        for arg in args:
+            print(arg, end=' ')
+        for k in kwargs:
+            print(k + '=' + str(kwargs[k]), end=' ')
+        print(self.tokeniser)
 
     def clone(self, the_input: io.StringIO):
         return Reader(Tokeniser(the_input), self.stderr)
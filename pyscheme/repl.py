@@ -26,13 +26,33 @@ import pyscheme.reader as reader
 from .inference import TypeEnvironment, EnvironmentType
 from .exceptions import PySchemeError
 from . import ambivalence
+from . import trampoline
+from .expr import Config
+from .compiler import cps
+from .compiler import vm
 
 
 class Repl:
-    def __init__(self, input: StringIO, output: StringIO, error: StringIO):
+    """
+    `engine` picks how expressions are run:
+    'tree' evaluates the expression trees directly, and is the reference for the others,
+    'compile' runs the closures they compile to, 'cps' runs them on the CPS machine,
+    and 'vm' on the register machine.
+    By default it is 'cps' if cps.Config.enabled, otherwise 'compile' if Config.compile, otherwise 'tree'.
+    """
+    engines = ('tree', 'compile', 'cps', 'vm')
+
+    def __init__(self, input: StringIO, output: StringIO, error: StringIO,
+                 scheduler: 'types.Maybe[trampoline.Scheduler]'=None, engine: 'types.Maybe[str]'=None):
+        if engine is None:
+            engine = 'cps' if cps.Config.enabled else 'compile' if Config.compile else 'tree'
+        elif engine not in self.engines:
+            raise ValueError("unknown engine " + engine)
+        self.engine = engine
         self.input = input
         self.output = output
         self.error = error
+        self.scheduler = trampoline.RoundRobin() if scheduler is None else scheduler
         self.tokeniser = reader.Tokeniser(input)
         self.reader = reader.Reader(self.tokeniser, error)
         operators = {
@@ -59,6 +79,29 @@ class Repl:
                     "head": expr.Head(),              # list(t) -> t
                     "tail": expr.Tail(),              # list(t) -> list(t)
                     "length": expr.Length(),          # list(t) -> int
+                    "map": expr.Map(),                # (a -> b) -> list(a) -> list(b)
+                    "filter": expr.Filter(),          # (t -> bool) -> list(t) -> list(t)
+                    "reduce": expr.Reduce(),          # (a -> b -> b) -> b -> list(a) -> b
+                    "sort": expr.Sort(),              # list(t) -> list(t)
+                    "vector": expr.ToVector(),        # list(int) -> vector(int)
+                    "vlist": expr.FromVector(),       # vector(int) -> list(int)
+                    "vlength": expr.VectorLength(),   # vector(int) -> int
+                    "vref": expr.VectorRef(),         # vector(int) -> int -> int
+                    "vslice": expr.VectorSlice(),     # vector(int) -> int -> int -> vector(int)
+                    "vadd": expr.VectorAddition(),    # vector(int) -> vector(int) -> vector(int)
+                    "vsub": expr.VectorSubtraction(), # vector(int) -> vector(int) -> vector(int)
+                    "vmul": expr.VectorMultiplication(), # vector(int) -> vector(int) -> vector(int)
+                    "vdiv": expr.VectorDivision(),    # vector(int) -> vector(int) -> vector(int)
+                    "vmod": expr.VectorModulus(),     # vector(int) -> vector(int) -> vector(int)
+                    "vsum": expr.VectorSum(),         # vector(int) -> int
+                    "vmin": expr.VectorMin(),         # vector(int) -> int
+                    "vmax": expr.VectorMax(),         # vector(int) -> int
+                    "emptymap": expr.HashMap(),       # map(k, v)
+                    "insert": expr.Insert(),          # k -> v -> map(k, v) -> map(k, v)
+                    "lookup": expr.Lookup(),          # k -> map(k, v) -> v
+                    "remove": expr.Remove(),          # k -> map(k, v) -> map(k, v)
+                    "contains": expr.Contains(),      # k -> map(k, v) -> bool
+                    "size": expr.Size(),              # map(k, v) -> int
                     "print": expr.Print(self.output), # t -> t
                     "here": expr.CallCC(),            # ((t -> _) -> t) -> a ?
                     "exit": expr.Exit(),              # _
@@ -69,7 +112,7 @@ class Repl:
                 }
         self.env = environment.Environment().extend(
             { expr.Symbol(k): v for k, v in operators.items() }
-        )
+        ).extend()  # so that programs can define their own functions with the same names as built-in ones
 
         globalenv = expr.Symbol("globalenv")
         self.env.non_eval_context_define(globalenv, expr.EnvironmentWrapper(self.env))
@@ -80,23 +123,21 @@ class Repl:
             if v.static_type():
                 self.type_env[expr.Symbol(k)] = v.type()
 
+        self.type_env = self.type_env.extend()
+
         self.type_env[globalenv] = EnvironmentType(self.type_env)
 
+        self.converter = cps.Converter(self.env)
+        self.machine = vm.Machine(self.env)
+
     def trampoline(self, threads: List['types.Promise']):
-        while len(threads) > 0:
-            thunk = threads.pop(0)
-            next = thunk()
-            if next is not None:
-                if type(next) is list:  # spawn returns a list of two threads
-                    threads += next
-                else:
-                    threads += [next]
+        self.scheduler.run(threads)
 
     def read(self, ret: 'types.Continuation', amb: ambivalence.Amb) -> 'types.Promise':
         result = self.reader.read()
         if result is None:
             return None  # stop the trampoline
-        return lambda: ret(result, amb)
+        return trampoline.call(ret, result, amb)
 
     def analyze(self, expr: expr.Expr, ret: 'types.Continuation', amb: ambivalence.Amb) -> 'types.Promise':
         try:
@@ -104,30 +145,37 @@ class Repl:
         except PySchemeError as e:
             self.error.write(str(e))
             return None
-        return lambda: ret(expr, amb)
+        resolved = expr.resolved()
+        if self.engine == 'vm':
+            resolved = self.machine.compiled(resolved)
+        elif self.engine == 'cps':
+            resolved = self.converter.compiled(resolved)
+        elif self.engine == 'compile':
+            resolved = resolved.compiled()
+        return trampoline.call(ret, resolved, amb)
 
     def eval(self, expr: expr.Expr, ret: 'types.Continuation', amb: ambivalence.Amb) -> 'types.Promise':
-        return lambda: expr.eval(self.env, ret, amb)
+        return trampoline.call(expr.eval, self.env, ret, amb)
 
     def print(self, exp: expr.Expr, ret: 'types.Continuation', amb: ambivalence.Amb) -> 'types.Promise':
         if type(exp) is not expr.Nothing:
             self.output.write(str(exp) + "\n")
-        return lambda: ret(exp, amb)
+        return trampoline.call(ret, exp, amb)
 
     def repl(self, amb: ambivalence.Amb) -> 'types.Promise':
         def print_continuation(expr, amb: ambivalence.Amb) -> 'types.Promise':
-            return lambda: self.repl(ambivalence.Amb(lambda: None))
+            return trampoline.call(self.repl, ambivalence.Amb(lambda: None))
 
         def eval_continuation(evaluated_expr: expr.Expr, amb: ambivalence.Amb) -> 'types.Promise':
-            return lambda: self.print(evaluated_expr, print_continuation, amb)
+            return trampoline.call(self.print, evaluated_expr, print_continuation, amb)
 
         def analyze_continuation(analyzed_expr: expr.Expr, amb: ambivalence.Amb) -> 'types.Promise':
-            return lambda: self.eval(analyzed_expr, eval_continuation, amb)
+            return trampoline.call(self.eval, analyzed_expr, eval_continuation, amb)
 
         def read_continuation(read_expr: expr.Expr, amb: ambivalence.Amb) -> 'types.Promise':
-            return lambda: self.analyze(read_expr, analyze_continuation, amb)
+            return trampoline.call(self.analyze, read_expr, analyze_continuation, amb)
 
-        return lambda: self.read(read_continuation, amb)
+        return trampoline.call(self.read, read_continuation, amb)
 
     def run(self):
         self.trampoline([lambda: self.repl(ambivalence.Amb(lambda: None))])
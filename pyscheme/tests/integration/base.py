@@ -25,12 +25,14 @@ import re
 
 class Base(TestCase):
 
+    engine = None  # the Repl's default
+
     @classmethod
-    def eval(cls, text: str, error_file: io.StringIO) -> tuple:
+    def eval(cls, text: str, error_file: io.StringIO, engine: str=None) -> tuple:
         in_file = io.StringIO(text)
         out_file = io.StringIO()
         expr.Symbol.reset()
-        repl = Repl(in_file, out_file, error_file)
+        repl = Repl(in_file, out_file, error_file, engine=engine or cls.engine)
         repl.run()
         return out_file.getvalue(), error_file.getvalue()
 
@@ -99,3 +99,51 @@ class TestClosure(Base):
             a(6);
             '''
         )
+
+    def test_shadowing(self):
+        self.assertEval(
+            "[1, 2, 3]",
+            """
+                fn (a, b) {
+                    fn (a) {
+                        fn (c) { [b, a, c] }(3)
+                    }(2)
+                }(5, 1);
+            """
+        )
+
+    def test_curried_closures_are_independent(self):
+        self.assertEval(
+            "[11, 12]",
+            """
+                {
+                    fn add (a, b) { a + b }
+                    define add1 = add(1);
+                    define add2 = add(2);
+                    [add1(10), add2(10)];
+                }
+            """
+        )
+
+    def test_local_defined_after_use(self):
+        self.assertEval(
+            "6",
+            """
+                fn (n) {
+                    fn twice(x) { double(x) }
+                    fn double(x) { x + x }
+                    twice(n)
+                }(3);
+            """
+        )
+
+    def test_deep_recursion(self):
+        self.assertEval(
+            "5000",
+            """
+                fn build(n) {
+                    if (n == 0) { [] } else { n @ build(n - 1) }
+                }
+                length(build(5000));
+            """
+        )
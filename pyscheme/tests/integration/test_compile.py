@@ -0,0 +1,74 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from pyscheme.tests.integration.base import Base
+import io
+import pyscheme.expr as expr
+
+
+class TestCompile(Base):
+    """
+    compiled closures must behave exactly like the expression trees they are compiled from
+    """
+
+    programs = {
+        'arithmetic': '1 + 2 * 3;',
+        'conditional': 'fn test(n) { if (n == 0) { "zero" } else { "other" } } test(0); test(1);',
+        'nested closures': 'fn (a) { fn (b) { fn (c) { a + b + c } }(2) }(1)(3);',
+        'composite': 'fn fib { (0) { 0 } (1) { 1 } (n) { fib(n - 1) + fib(n - 2) } } fib(12);',
+        'lists': 'fn map { (f, []) { [] } (f, h @ t) { f(h) @ map(f, t) } } map(1+, [1, 2, 3]);',
+        'currying': 'fn add(a, b, c) { a + b + c } add(1)(2)(3);',
+        'amb': 'fn one_of { ([]) { back } (h @ t) { h then one_of(t) } }'
+               ' { x = one_of([1, 2, 3]); if (x < 3) { back } else { x } }',
+        'here': 'fn count(n) { here(fn (k) { if (n == 0) { k(10) } else { n } }) } count(0); count(4);',
+        'env': 'env e { fn f(x) { x * 2 } } e.f(4);',
+        'typedef': 'typedef colour { red | green | blue } fn name { (red) { "r" } (x) { "?" } } name(red); name(blue);',
+        'sequence': '{ a = 1; b = a + 1; [a, b]; }',
+    }
+
+    def assertSameResult(self, text: str):
+        expr.Config.compile = False
+        try:
+            expected = self.eval(text, io.StringIO())
+        finally:
+            expr.Config.compile = True
+        self.assertEqual(expected, self.eval(text, io.StringIO()))
+
+    def test_programs(self):
+        for name, text in self.programs.items():
+            with self.subTest(name):
+                self.assertSameResult(text)
+
+    def test_deep_recursion(self):
+        self.assertEval(
+            '5000',
+            '''
+            fn count(n) { if (n == 0) { 0 } else { 1 + count(n - 1) } }
+            count(5000);
+            '''
+        )
+
+    def test_pattern_variable_shadows_constructor_name(self):
+        self.assertEval(
+            'x',
+            '''
+            typedef t { x | y }
+            fn f { (x) { "x" } (other) { "other" } }
+            f(x);
+            '''
+        )
+
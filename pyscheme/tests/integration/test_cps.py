@@ -0,0 +1,59 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from pyscheme.tests.integration.base import Base
+from pyscheme.tests.integration.test_compile import TestCompile
+import io
+
+
+class TestCPS(Base):
+    """
+    programs converted to CPS and run on the machine must behave exactly like compiled closures
+    """
+
+    engine = 'cps'
+
+    programs = dict(
+        TestCompile.programs,
+        **{
+            'and or': '[true and false, false or true, unknown and false, unknown or true, unknown and unknown];',
+            'then': '{ x = 1 then 2 then 3; if (x < 3) { back } else { x } }',
+            'nested env': 'env a { env b { fn g(x) { x + 1 } } } a.b.g(1);',
+            'spawn': 'fn count(label, n) { print(label); if (n == 0) { label } else { count(label, n - 1) } }'
+                     ' if (spawn) { count("a", 3) } else { count("b", 4) }',
+            'constants': '{ a = 2 * 3; b = a + 1; if (b > 6) { [a, b] } else { [] } }',
+            'local function': '{ fn double(x) { x * 2 } double(double(5)) }',
+            'long list': '[%s];' % ', '.join(str(i) for i in range(400)),
+        }
+    )
+
+    def assertSameResult(self, text: str):
+        self.assertEqual(self.eval(text, io.StringIO(), 'compile'), self.eval(text, io.StringIO()))
+
+    def test_programs(self):
+        for name, text in self.programs.items():
+            with self.subTest(name):
+                self.assertSameResult(text)
+
+    def test_deep_recursion(self):
+        self.assertEval(
+            '5000',
+            '''
+            fn count(n) { if (n == 0) { 0 } else { 1 + count(n - 1) } }
+            count(5000);
+            '''
+        )
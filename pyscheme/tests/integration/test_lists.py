@@ -91,3 +91,108 @@ class TestLists(Base):
             reverse([1, 2, 3, 4, 5, 6, 7, 8, 9, 10]);
             '''
         )
+
+    def test_long_lists(self):
+        self.assertEval(
+            '[20000, 200010000, 40000, 1]',
+            '''
+            fn build {
+                (0, acc) { acc }
+                (n, acc) { build(n - 1, acc @@ [n]) }
+            }
+
+            fn sum {
+                ([], s) { s }
+                (h @ t, s) { sum(t, s + h) }
+            }
+
+            {
+                define l = build(20000, []);
+                [length(l), sum(l, 0), length(l @@ l), if ([0] @@ l == build(20000, [0])) { 1 } else { 0 }];
+            }
+            ''',
+            "lists can be longer than the recursion limit"
+        )
+
+    def test_print_long_list(self):
+        self.assertEval(
+            str(list(range(5000))).replace(' ', ''),
+            '''
+            fn upto {
+                (0, acc) { 0 @ acc }
+                (n, acc) { upto(n - 1, n @ acc) }
+            }
+
+            upto(4999, []) @@ [];
+            '''
+        )
+
+    def test_builtin_map(self):
+        self.assertEval(
+            '[[2, 4, 6], [1, 3], [3, 1]]',
+            '''
+            [map(fn (x) { x * 2 }, [1, 2, 3]), map(head, [[1, 2], [3]]), map(length, ["abc", "d"])];
+            '''
+        )
+
+    def test_builtin_filter(self):
+        self.assertEval(
+            '[2, 4]\n[[true], [true, false]]',
+            '''
+            {
+                define evens = filter(fn (x) { x % 2 == 0 });
+                evens([1, 2, 3, 4]);
+            }
+            filter(head, [[true], [false], [true, false]]);
+            '''
+        )
+
+    def test_builtin_reduce(self):
+        self.assertEval(
+            '6\n[1, 2, 3]',
+            '''
+            reduce(fn (x, y) { x + y }, 0, [1, 2, 3]);
+            reduce(fn (x, l) { x @ l }, [], [1, 2, 3]);
+            '''
+        )
+
+    def test_builtin_sort(self):
+        self.assertEval(
+            '[1, 2, 3, 5, 8]\n[abc, abd, b]',
+            '''
+            sort([5, 3, 8, 1, 2]);
+            sort(["b", "abd", "abc"]);
+            '''
+        )
+
+    def test_builtin_map_backtracks(self):
+        self.assertEval(
+            '[1, 12]',
+            '''
+            {
+                define l = map(fn (x) { x then x + 10 }, [1, 2]);
+                if (head(l) + head(tail(l)) != 13) { back } else { l }
+            }
+            ''',
+            "each element's alternatives are tried in turn"
+        )
+
+    def test_builtins_can_be_redefined(self):
+        self.assertEval(
+            '3',
+            '''
+            fn map(x) { x + 1 }
+            map(2);
+            '''
+        )
+
+    def test_builtins_apply_special_forms(self):
+        self.assertEval(
+            '[1]\n[true]\n3',
+            '''
+            map(here, [fn (k) { 1 }]);
+            map(here, filter(here, [fn (k) { true }, fn (k) { k(false) }]));
+            reduce(fn (x, y) { x + y }, 0, map(here, [fn (k) { k(1) }, fn (k) { 2 }]));
+            ''',
+            "special forms evaluate their own arguments"
+        )
@@ -17,6 +17,10 @@
 
 
 from pyscheme.tests.integration.base import Base
+import pyscheme.expr as expr
+from pathlib import Path
+from unittest.mock import patch
+import tempfile
 
 
 class TestTestLoad(Base):
@@ -63,3 +67,49 @@ class TestTestLoad(Base):
             }
             '''
         )
+
+    def test_test_load_reused_types(self):
+        self.assertEval(
+            '[2, 3, 4] [true, false]',
+            '''
+            {
+                load utils.lists as lists;
+                lists.map(1+, [1, 2, 3]);
+            }
+            {
+                load utils.lists as lists;
+                lists.map(fn (c) { c == 'a' }, ['a', 'b']);
+            }
+            '''
+        )
+
+    def test_test_load_types_depend_on_globals(self):
+        with tempfile.TemporaryDirectory() as directory,\
+                patch.object(expr.Load, 'get_data_dir', lambda _: Path(directory)),\
+                patch.dict(expr.Load.loaded_packages):
+            Path(directory).joinpath('twice.fn').write_text('fn twice(x) { helper(helper(x)) }\n')
+            self.assertEval(
+                '4',
+                '''
+                fn helper(n) { n * 2 }
+                load twice as p;
+                p.twice(1);
+                '''
+            )
+            self.assertEval(
+                'hi!!',
+                '''
+                fn helper(s) { s @@ "!" }
+                load twice as p;
+                p.twice("hi");
+                ''',
+                "the package is re-analysed against this program's helper"
+            )
+            self.assertError(
+                'PySchemeTypeError: int != list(char)',
+                '''
+                fn helper(s) { s @@ "!" }
+                load twice as p;
+                p.twice(1);
+                '''
+            )
@@ -0,0 +1,117 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from pyscheme.tests.integration.base import Base
+
+
+class TestMaps(Base):
+    def test_insert_and_lookup(self):
+        self.assertEval(
+            '1\n2\n2\n{a: 1, b: 2}',
+            '''
+            define m = insert("b", 2, insert("a", 1, emptymap));
+            lookup("a", m);
+            lookup("b", m);
+            size(m);
+            m;
+            '''
+        )
+
+    def test_insert_replaces(self):
+        self.assertEval(
+            '3\n1',
+            '''
+            define m = insert(1, 3, insert(1, 2, emptymap));
+            lookup(1, m);
+            size(m);
+            '''
+        )
+
+    def test_remove(self):
+        self.assertEval(
+            'false\ntrue\n1\n{}',
+            '''
+            define m = insert([1, 2], 'x', emptymap);
+            define n = remove([1, 2], m);
+            contains([1, 2], n);
+            contains([1, 2], m);
+            size(m);
+            n;
+            ''',
+            "removal leaves the original map unchanged"
+        )
+
+    def test_keys_compare_by_value(self):
+        self.assertEval(
+            'yes',
+            '''
+            typedef colour { red | green | rgb(int, int, int) }
+            lookup(rgb(1, 2, 3), insert(rgb(1, 2, 3), "yes", insert(red, "no", emptymap)));
+            '''
+        )
+
+    def test_many_keys(self):
+        self.assertEval(
+            '500\n[0, 499, 998]',
+            '''
+            fn fill {
+                (0, m) { m }
+                (n, m) { fill(n - 1, insert(n - 1, 2 * (n - 1), m)) }
+            }
+            define m = fill(500, emptymap);
+            size(m);
+            [lookup(0, m), lookup(499, m) / 2, lookup(499, m)];
+            '''
+        )
+
+    def test_maps_backtrack(self):
+        self.assertEval(
+            '{a: 2}',
+            '''
+            {
+                define m = insert("a", 1 then 2, emptymap);
+                if (lookup("a", m) == 1) { back } else { m }
+            }
+            ''',
+            "each alternative sees its own map, with nothing to undo"
+        )
+
+    def test_map_type(self):
+        self.assertError(
+            'PySchemeTypeError: list(char) != int',
+            '''
+            lookup(1, insert("a", 1, emptymap));
+            '''
+        )
+
+    def test_builtins_can_be_redefined(self):
+        self.assertEval(
+            '[2]',
+            '''
+            fn insert(x, l) { x @ l }
+            insert(2, []);
+            '''
+        )
+
+    def test_lookup_missing_key(self):
+        self.assertRunTimeError(
+            'key not found: b',
+            '''
+            lookup("b", insert("a", 1, emptymap));
+            '''
+        )
@@ -0,0 +1,77 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from pyscheme.tests.integration.base import Base
+from pyscheme.compiler import match
+import io
+
+
+class TestMatch(Base):
+    """
+    composite functions dispatching on a decision tree must behave exactly like trying each component in turn
+    """
+
+    programs = {
+        'map': '{ load utils.lists as lists; lists.map(fn (x) { x * x }, [1, 2, 3]); }',
+        'member': '{ load utils.lists as lists; [lists.member(2, [1, 2, 3]), lists.member(4, [1, 2, 3])]; }',
+        'constants': 'fn fib { (0) { 0 } (1) { 1 } (n) { fib(n - 1) + fib(n - 2) } } fib(10);',
+        'strings': 'fn greet { ("hello") { 1 } ("help") { 2 } (_) { 3 } }'
+                   ' [greet("hello"), greet("help"), greet("helps")];',
+        'constructors': 'typedef colour { red | green | blue } fn rgb { (red) { 1 } (green) { 2 } (blue) { 3 } }'
+                        ' [rgb(blue), rgb(red)];',
+        'nested': 'typedef tree(#t) { branch(tree(#t), #t, tree(#t)) | leaf }'
+                  ' fn depth { (leaf) { 0 } (branch(leaf, _, leaf)) { 1 } (branch(l, _, r)) { 1 + depth(l) + depth(r) } }'
+                  ' depth(branch(branch(leaf, 1, leaf), 2, branch(leaf, 3, branch(leaf, 4, leaf))));',
+        'two types': 'typedef colour { red | green } typedef shape { circle(int) | square(int) }'
+                     ' fn f { (red, circle(r)) { r } (green, circle(r)) { 0 - r } (_, square(s)) { s * s } }'
+                     ' [f(red, circle(1)), f(green, circle(2)), f(red, square(3))];',
+        'as': 'fn first { (x = h @ _) { [h, h] @ [x] } ([]) { [] } } first([1, 2]);',
+        'overlap': 'fn f { (0, _) { 1 } (_, 0) { 2 } (_, _) { 3 } } [f(0, 0), f(1, 0), f(1, 1)];',
+        'no match': 'fn f { (0) { 1 } } { x = f(1) then 2; x }',
+        'body fails': 'fn f { (0) { back } (_) { 1 } } { x = f(0) then 2; x }',
+        'over apply': 'fn f { (0) { fn (x) { x } } (_) { fn (x) { x + 1 } } } [f(0, 5), f(1, 5)];',
+        'curry': 'fn f { (0, b) { b } (a, b) { a + b } } g = f(0); g(3);',
+        'bound variable': '{ typedef lst(#t) { pair(#t, lst(#t)) | null }'
+                          ' fn g { (null, ys) { ys } (pair(_, _), ys) { null } }'
+                          ' ys = pair(4, null); [g(null, ys), g(ys, ys)]; }',
+    }
+
+    def assertSameResult(self, text: str):
+        expected = self.eval(text, io.StringIO())
+        match.Config.enabled = False
+        try:
+            self.assertEqual(expected, self.eval(text, io.StringIO()))
+        finally:
+            match.Config.enabled = True
+
+    def test_programs(self):
+        for name, text in self.programs.items():
+            with self.subTest(name):
+                self.assertSameResult(text)
+
+    def test_any_order(self):
+        for enabled in (True, False):
+            with self.subTest(enabled=enabled):
+                match.Config.enabled = enabled
+                try:
+                    self.assertEval(
+                        '3',
+                        'fn len { (_ @ t) { 1 + len(t) } ([]) { 0 } } len([1, 2, 3]);',
+                        'a list pattern does not have to come after the empty list'
+                    )
+                finally:
+                    match.Config.enabled = True
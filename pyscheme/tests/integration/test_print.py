@@ -16,6 +16,8 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from pyscheme.tests.integration.base import Base
+from pyscheme.repl import Repl
+import io
 
 
 class TestPrint(Base):
@@ -31,3 +33,17 @@ class TestPrint(Base):
             hello();
             """
         )
+
+    def test_print_sequence_with_literals(self):
+        for engine in Repl.engines:
+            with self.subTest(engine):
+                self.assertEqual(('one\ntwo\nc\nabc\n3\nb\n', ''), self.eval(
+                    '''
+                    fn f(x) { "ignored"; print(x); 5; length(x) }
+                    { 'a'; f("one"); print("two"); true; 'c' }
+                    f("abc");
+                    { 'a'; 'b' }
+                    ''',
+                    io.StringIO(),
+                    engine
+                ), "literal statements are skipped, but a literal last statement is the value")
@@ -17,12 +17,13 @@
 
 
 from pyscheme.tests.integration.base import Base
+import pyscheme.trampoline as trampoline
 
 
 class TestSpawn(Base):
     def test_spawn(self):
         self.assertEval(
-            'a\nb\na\nb\na\nb\na\nb\na\nb\na\nb\nb\n120\n720',
+            'a\nb\na\nb\na\nb\na\nb\na\nb\na\n120\nb\nb\n720',
             '''
             {
                 fn factorial {
@@ -44,3 +45,44 @@ class TestSpawn(Base):
             '''
         )
 
+
+    def test_many_threads(self):
+        self.assertEval(
+            '0\n' * 256,
+            '''
+            fn fan(n) {
+                if (n == 0) {
+                    0
+                } else if (spawn) {
+                    fan(n - 1)
+                } else {
+                    fan(n - 1)
+                }
+            }
+            fan(8);
+            '''
+        )
+
+    def test_time_slice(self):
+        trampoline.Config.time_slice = 1000
+        try:
+            self.assertEval(
+                'a\n120\nb\n720',
+                '''
+                {
+                    fn factorial {
+                        (label, 0) { 1 }
+                        (label, n) { n * factorial(label, n - 1) }
+                    }
+                    if (spawn) {
+                        print("a");
+                        factorial("a", 5)
+                    } else {
+                        print("b");
+                        factorial("b", 6);
+                    }
+                }
+                '''
+            )
+        finally:
+            trampoline.Config.time_slice = 1
@@ -62,3 +62,45 @@ class TestStrings(Base):
             """,
             ""
         )
+
+    def test_string_patterns(self):
+        self.assertEval(
+            '[1, 2, 0]',
+            """
+            {
+                fn greeting {
+                    ("hello") { 1 }
+                    ('h' @ _) { 2 }
+                    (_) { 0 }
+                }
+
+                [greeting("hello"), greeting("hi"), greeting("bye")]
+            }
+            """,
+            "string literals can be formal arguments"
+        )
+
+    def test_string_comparison(self):
+        self.assertEval(
+            '[true, true, false]',
+            """
+            ["abc" == ('a' @ "bc"), "abc" < "abd", ("ab" @@ "c") != "abc"];
+            """,
+            "strings compare with lists of chars"
+        )
+
+    def test_long_string(self):
+        self.assertEval(
+            '3000',
+            """
+            {
+                fn count {
+                    ([], n) { n }
+                    (_ @ t, n) { count(t, n + 1) }
+                }
+
+                count("%s", 0)
+            }
+            """ % ('x' * 3000),
+            "strings can be longer than the recursion limit"
+        )
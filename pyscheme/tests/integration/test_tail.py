@@ -0,0 +1,71 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from pyscheme.tests.integration.base import Base
+from pyscheme.repl import Repl
+import gc
+import io
+import tracemalloc
+
+
+class TestTail(Base):
+    """
+    tail-recursive loops must run in constant memory on every engine
+    """
+
+    loops = {
+        'function': 'fn loop(n) { if (n == 0) { 0 } else { n + 1; loop(n - 1) } } loop(%d);',
+        'composite': 'fn loop { (0, a) { a } (n, a) { loop(n - 1, a + 1) } } loop(%d, 0);',
+        'definitions': 'fn loop(n) { if (n == 0) { 0 } else { { m = n - 1; loop(m) } } } loop(%d);',
+    }
+
+    def peak_memory(self, text: str, engine: str) -> int:
+        in_file = io.StringIO(text)
+        repl = Repl(in_file, io.StringIO(), io.StringIO(), engine=engine)
+        gc.collect()  # so earlier tests' garbage doesn't decide when the collector runs during the loop
+        tracemalloc.start()
+        try:
+            repl.run()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_constant_memory(self):
+        for engine in Repl.engines:
+            for name, text in self.loops.items():
+                with self.subTest(engine + ' ' + name):
+                    self.peak_memory(text % 10, engine)  # anything done once, like compiling the prelude
+                    short, long = self.peak_memory(text % 300, engine), self.peak_memory(text % 3000, engine)
+                    self.assertLess(long, short * 1.5)
+
+    def test_definitions_still_undone(self):
+        for engine in Repl.engines:
+            with self.subTest(engine):
+                self.assertEqual(('[2, 6]\n', ''), self.eval(
+                    '''
+                    fn double(n) { { m = n * 2; m } }
+                    fn plus(a, b) { c = a + b; d = 0 then 1; if (d == 0) { back } else { c + d - 1 } }
+                    {
+                        a = 1 then 2 then 3;
+                        b = double(a);
+                        c = plus(a, b);
+                        if (b < 4) { back } else { [a, c] }
+                    }
+                    ''',
+                    io.StringIO(),
+                    engine
+                ))
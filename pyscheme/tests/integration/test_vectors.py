@@ -0,0 +1,101 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from pyscheme.tests.integration.base import Base
+
+
+class TestVectors(Base):
+    def test_vector_conversion(self):
+        self.assertEval(
+            'vector[1, 2, 3]\n[1, 2, 3]\n3',
+            '''
+            vector([1, 2, 3]);
+            vlist(vector([1, 2, 3]));
+            vlength(vector([4, 5, 6]));
+            '''
+        )
+
+    def test_vector_arithmetic(self):
+        self.assertEval(
+            'vector[5, 7, 9]\nvector[3, 3, 3]\nvector[4, 10, 18]\nvector[4, 2, 2]\nvector[0, 1, 0]',
+            '''
+            define a = vector([1, 2, 3]);
+            define b = vector([4, 5, 6]);
+            vadd(a, b);
+            vsub(b, a);
+            vmul(a, b);
+            vdiv(b, a);
+            vmod(b, a);
+            '''
+        )
+
+    def test_vector_reductions(self):
+        self.assertEval(
+            '15\n1\n5\n0',
+            '''
+            define v = vector([3, 1, 5, 2, 4]);
+            vsum(v);
+            vmin(v);
+            vmax(v);
+            vsum(vector([]));
+            '''
+        )
+
+    def test_vector_indexing(self):
+        self.assertEval(
+            '30\nvector[20, 30]\nvector[]',
+            '''
+            define v = vector([10, 20, 30, 40]);
+            vref(v, 2);
+            vslice(v, 1, 3);
+            vslice(v, 3, 1);
+            '''
+        )
+
+    def test_vector_equality(self):
+        self.assertEval(
+            'true\nfalse',
+            '''
+            vector(vlist(vector([1, 2]))) == vector([1, 2]);
+            vector([1, 2]) == vector([1, 3]);
+            '''
+        )
+
+    def test_vector_type(self):
+        self.assertError(
+            'PySchemeTypeError: vector(int) != list(#a)',
+            '''
+            vector([1, 2]) @@ [3];
+            '''
+        )
+
+    def test_vector_lengths_must_match(self):
+        self.assertRunTimeError(
+            'vectors of different lengths',
+            '''
+            vadd(vector([1, 2]), vector([1]));
+            '''
+        )
+
+    def test_vector_index_out_of_range(self):
+        self.assertRunTimeError(
+            'vector index out of range',
+            '''
+            vref(vector([1, 2]), 2);
+            '''
+        )
@@ -0,0 +1,63 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from pyscheme.tests.integration.base import Base
+from pyscheme.tests.integration.test_cps import TestCPS
+import io
+
+
+class TestVM(Base):
+    """
+    programs run on the register machine must behave exactly like the expression trees they are compiled from
+    """
+
+    programs = dict(
+        TestCPS.programs,
+        **{
+            'here in then': 'fn f(n) { here(fn (k) { (k(n) then k(n + 1)) }) } { x = f(1); if (x < 2) { back } else { x } }',
+            'define then back': '{ fn choose { ([]) { back } (h @ t) { h then choose(t) } }'
+                                ' x = choose([1, 2, 3]); y = x * 10; if (y < 30) { back } else { y } }',
+            'nest': 'fn f(x) { y = if (x > 1) { z = x * 2; z } else { 0 }; y + 1 } f(3);',
+            'special form value': 'fn f(op) { op(1 < 2, 2 < 1) } f(fn (a, b) { a and b });',
+            'curry and over-apply': 'fn add(a) { fn (b) { a + b } } add(1, 2); add(1)(2);',
+        }
+    )
+
+    def assertSameResult(self, text: str, reference: str):
+        self.assertEqual(self.eval(text, io.StringIO(), reference), self.eval(text, io.StringIO(), 'vm'))
+
+    def test_programs(self):
+        for name, text in self.programs.items():
+            with self.subTest(name):
+                # the tree bounces at every application, so its threads take turns at different points
+                self.assertSameResult(text, 'compile' if 'spawn' in text else 'tree')
+
+    def test_deep_recursion(self):
+        self.assertEqual(
+            ('5000\n', ''),
+            self.eval('fn count(n) { if (n == 0) { 0 } else { 1 + count(n - 1) } } count(5000);', io.StringIO(), 'vm')
+        )
+
+    def test_long_loop(self):
+        self.assertEqual(
+            ('0\n', ''),
+            self.eval('fn loop(n) { if (n == 0) { 0 } else { loop(n - 1) } } loop(20000);', io.StringIO(), 'vm')
+        )
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            self.eval('1;', io.StringIO(), 'jit')
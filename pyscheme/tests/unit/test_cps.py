@@ -0,0 +1,69 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+from pyscheme.compiler import cps
+import pyscheme.ambivalence as ambivalence
+import pyscheme.expr as expr
+
+
+class TestCPS(TestCase):
+    """
+    program(y, k) { fix f(x, k2) { k2(x + y) } in f(1, k) }
+    """
+
+    def setUp(self):
+        self.y, self.k, self.f, self.x, self.k2, self.w = [
+            cps.var(name) for name in ('y', 'k', 'f', 'x', 'k2', 'w')
+        ]
+        self.body = cps.FIX(
+            [(self.f, [self.x, self.k2],
+              cps.PRIMOP(cps.primop.add, [cps.VAR(self.x), cps.VAR(self.y)], [self.w],
+                         [cps.APP(cps.VAR(self.k2), [cps.VAR(self.w)])]))],
+            cps.APP(cps.VAR(self.f), [cps.CONST(expr.Number(1)), cps.VAR(self.k)])
+        )
+
+    def test_free_variables(self):
+        self.assertEqual([self.y, self.k], list(cps.free_variables(self.body, {})))
+
+    def test_closure_conversion(self):
+        functions = cps.ClosureConverter().convert_program([self.y, self.k], self.body)
+        self.assertEqual(['program', 'f'], [label.name for label, _, _ in functions])
+        _, params, body = functions[1]
+        self.assertEqual(['x', 'k2', 'closure'], [param.name for param in params])
+        self.assertIs(cps.SELECT, type(body), "free y is selected from the closure")
+        self.assertEqual(self.y, body.var)
+        self.assertEqual([], [v for v in cps.free_variables(body, {}) if v not in params])
+        _, _, program = functions[0]
+        self.assertIs(cps.RECORD, type(program), "the FIX became a closure record")
+
+    def test_closure_conversion_rejects_free_variables(self):
+        with self.assertRaises(cps.PySchemeInternalError):
+            cps.ClosureConverter().convert_program([self.k], self.body)
+
+    def test_run(self):
+        program = cps.assemble(cps.ClosureConverter().convert_program([self.y, self.k], self.body))
+        results = []
+
+        def k(value, amb):
+            results.append(value)
+            return None
+
+        promise = cps.run((program,), (expr.Number(2), k), ambivalence.Amb(lambda: None))
+        while promise is not None:
+            promise = promise()
+        self.assertEqual([expr.Number(3)], results)
@@ -41,7 +41,9 @@ class TestEnvironment(unittest.TestCase):
             nonlocal c
             c = v
 
-        new_env.lookup(a, cont, lambda: None)()  # we have to bounce the result to evaluate cont.
+        thunk = new_env.lookup(a, cont, lambda: None)  # cont may be called directly or via the trampoline.
+        while thunk is not None:
+            thunk = thunk()
         self.assertEqual(b, c, "lookup should find a = 10")
 
     def test_failed_lookup(self):
@@ -54,5 +56,50 @@ class TestEnvironment(unittest.TestCase):
             self.env.lookup(a, cont, lambda: None)
 
 
+class TestLexicalAddressing(unittest.TestCase):
+    def setUp(self):
+        self.a = expr.Symbol("a")
+        self.b = expr.Symbol("b")
+        self.globals = env.Environment().extend()
+        self.globals.non_eval_context_define(self.b, expr.Constant(1))
+
+    def lookup(self, frame, depth, index):
+        result = None
+
+        def cont(v, amb):
+            nonlocal result
+            result = v
+
+        thunk = frame.lookup_address(self.a, depth, index, cont, lambda: None)
+        while thunk is not None:
+            thunk = thunk()
+        return result
+
+    def test_slot(self):
+        frame = self.globals.extend(layout=env.Layout((self.b, self.a)))
+        frame.non_eval_context_define(self.a, expr.Constant(2))
+        self.assertIsNone(frame._dictionary, "laid out names are stored in slots")
+        self.assertEqual(expr.Constant(2), self.lookup(frame.extend(), 1, 1))
+        self.assertEqual(expr.Constant(2), frame[self.a])
+
+    def test_slot_fallback(self):
+        self.globals.non_eval_context_define(self.a, expr.Constant(3))
+        frame = self.globals.extend(layout=env.Layout((self.a,)))
+        self.assertEqual(expr.Constant(3), self.lookup(frame, 0, 0), "unbound slot falls back to lookup by name")
+        self.assertEqual(expr.Constant(3), self.lookup(frame, 5, 0), "too deep falls back to lookup by name")
+        self.assertEqual(expr.Constant(3), self.lookup(frame, 0, None))
+
+    def test_scope_address(self):
+        top = env.Scope()
+        top.bind(self.a)
+        outer = top.extend()
+        outer.bind(self.b)
+        outer.bind(self.a)
+        inner = outer.extend()
+        self.assertEqual((1, 1), inner.address(self.a))
+        self.assertEqual((0, None), top.address(self.a), "the top level is looked up by name")
+        self.assertEqual((1, None), inner.extend(opaque=True).address(self.a), "nothing is addressed past an opaque scope")
+
+
 if __name__ == "__main__":
     unittest.main()
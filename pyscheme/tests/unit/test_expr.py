@@ -70,6 +70,23 @@ class TestConstant(TestCase):
         self.assertEqual("10", str(self.constant_10), "string value should be sensible")
 
 
+class TestNumber(TestCase):
+    def test_small_numbers(self):
+        self.assertIs(expr.make_number(10), expr.make_number(10), "small numbers should be shared")
+        self.assertIs(expr.make_number(10), expr.Number(7) + expr.Number(3))
+        self.assertEqual(expr.Number(10 ** 20), expr.make_number(10 ** 20))
+
+    def test_arithmetic(self):
+        self.assertEqual(expr.Number(-2), expr.Number(7) // expr.Number(-4))
+        self.assertEqual(expr.Number(1), expr.Number(-7) % expr.Number(4))
+        self.assertEqual(expr.Number(2 ** 100), expr.Number(2) ** expr.Number(100))
+
+    def test_comparison(self):
+        self.assertIs(expr.T(), expr.Number(1).lt(expr.Number(2)))
+        self.assertIs(expr.F(), expr.Number(1).eq(expr.Number(2)))
+        self.assertIs(expr.T(), expr.Number(2).ge(expr.Number(2)))
+
+
 class TestBoolean(TestCase):
     def setUp(self):
         self.t = expr.T()
@@ -271,4 +288,119 @@ class TestList(TestCase):
         self.assertEqual(self.c, self.list.last(), "last item of list should be c")
 
     def test_last2(self):
-        self.assertEqual(self.null, self.null.last(), "last item of null should be null")
\ No newline at end of file
+        self.assertEqual(self.null, self.null.last(), "last item of null should be null")
+
+class TestString(TestCase):
+    def setUp(self):
+        self.string = expr.String("abc")
+        self.pairs = expr.LinkedList.list([expr.Char('a'), expr.Char('b'), expr.Char('c')])
+
+    def tearDown(self):
+        self.string = None
+        self.pairs = None
+
+    def test_same_as_pairs(self):
+        self.assertEqual(self.pairs, self.string, "string should equal the same list of chars")
+        self.assertEqual(self.string, self.pairs, "list of chars should equal the same string")
+        self.assertEqual(str(self.pairs), str(self.string))
+        self.assertEqual(repr(self.pairs), repr(self.string))
+
+    def test_car_cdr(self):
+        self.assertEqual(expr.Char('a'), self.string.car())
+        self.assertEqual(expr.String("bc"), self.string.cdr())
+        self.assertIs(self.string.cdr(), self.string.cdr(), "cdr should only be made once")
+        self.assertIs(expr.Null(), self.string.cdr().cdr().cdr())
+
+    def test_len(self):
+        self.assertEqual(3, len(self.string))
+        self.assertEqual(2, len(self.string.cdr()))
+
+    def test_append(self):
+        self.assertEqual(expr.String("abcabc"), self.string.append(self.string))
+        self.assertEqual("abcabc", str(self.string.append(self.pairs)))
+        self.assertEqual("abcabc", str(self.pairs.append(self.string)))
+
+    def test_compare(self):
+        self.assertLess(self.string, expr.String("abd"))
+        self.assertLess(self.string.cdr(), expr.String("c"))
+        self.assertGreater(self.string, expr.String("ab"))
+
+    def test_getitem(self):
+        self.assertEqual(expr.Char('b'), self.string[1])
+        with self.assertRaises(KeyError):
+            print(self.string[3])
+
+    def test_make_string(self):
+        self.assertIs(expr.Null(), expr.make_string(""))
+        self.assertEqual(self.string, expr.make_string("abc"))
+
+
+class TestConcat(TestCase):
+    def setUp(self):
+        self.a, self.b, self.c, self.d = [expr.Number(n) for n in range(4)]
+        self.concat = expr.LinkedList.list([self.a]).concat(expr.LinkedList.list([self.b, self.c]))\
+            .concat(expr.LinkedList.list([self.d]))
+
+    def tearDown(self):
+        self.concat = None
+
+    def test_concat(self):
+        self.assertIs(expr.Concat, type(self.concat))
+        self.assertEqual(4, len(self.concat))
+        self.assertEqual("[0, 1, 2, 3]", str(self.concat))
+        self.assertEqual([self.a, self.b, self.c, self.d], list(self.concat))
+
+    def test_car_cdr(self):
+        self.assertEqual(self.a, self.concat.car())
+        self.assertEqual(self.b, self.concat.cdr().car())
+        self.assertIs(self.concat.cdr(), self.concat.cdr(), "cdr should only be made once")
+        self.assertEqual(expr.LinkedList.list([self.c, self.d]), self.concat.cdr().cdr())
+
+    def test_equality(self):
+        self.assertEqual(expr.LinkedList.list([self.a, self.b, self.c, self.d]), self.concat)
+        self.assertEqual(self.concat, expr.LinkedList.list([self.a, self.b, self.c, self.d]))
+        self.assertNotEqual(self.concat, expr.LinkedList.list([self.a, self.b, self.c]))
+
+    def test_last(self):
+        self.assertEqual(self.d, self.concat.last())
+
+    def test_null(self):
+        lst = expr.LinkedList.list([self.a])
+        self.assertIs(lst, lst.concat(expr.Null()))
+        self.assertIs(lst, expr.Null().concat(lst))
+
+    def test_short_strings(self):
+        self.assertIs(expr.String, type(expr.String("ab").concat(expr.String("cd"))))
+
+    def test_long(self):
+        lst = expr.Null()
+        for n in range(5000):
+            lst = lst.concat(expr.LinkedList.list([expr.Number(n)]))
+        self.assertEqual(expr.Number(4999), lst.last())
+        self.assertEqual(expr.LinkedList.list([expr.Number(n) for n in range(5000)]), lst)
+        self.assertEqual(5000, len(str(lst).split(',')))
+
+
+class TestArguments(TestCase):
+    def setUp(self):
+        self.a, self.b, self.c = [expr.Number(n) for n in range(3)]
+        self.args = expr.make_arguments((self.a, self.b, self.c))
+
+    def tearDown(self):
+        self.args = None
+
+    def test_getitem(self):
+        self.assertEqual(self.b, self.args[1])
+        self.assertEqual(self.c, self.args.cdr()[1])
+        with self.assertRaises(KeyError):
+            print(self.args[3])
+
+    def test_same_as_pairs(self):
+        self.assertEqual(expr.LinkedList.list([self.a, self.b, self.c]), self.args)
+        self.assertEqual("[0, 1, 2]", str(self.args))
+        self.assertEqual(3, len(self.args))
+        self.assertEqual(self.c, self.args.last())
+        self.assertIs(expr.Null(), self.args.cdr().cdr().cdr())
+
+    def test_no_arguments(self):
+        self.assertIs(expr.Null(), expr.make_arguments(()))
@@ -0,0 +1,83 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+from pyscheme.hamt import HAMT
+
+
+class Colliding:
+    """
+    keys that all hash the same
+    """
+    def __init__(self, n: int):
+        self.n = n
+
+    def __hash__(self):
+        return 42
+
+    def __eq__(self, other):
+        return self.n == other.n
+
+
+class TestHAMT(TestCase):
+    def test_set_and_get(self):
+        m = HAMT()
+        for i in range(1000):
+            m = m.set(i, str(i))
+        self.assertEqual(1000, len(m))
+        for i in range(1000):
+            self.assertEqual(str(i), m.get(i))
+        self.assertIsNone(m.get(1000))
+        self.assertEqual('none', m.get(1000, 'none'))
+
+    def test_persistence(self):
+        empty = HAMT()
+        one = empty.set('a', 1)
+        two = one.set('a', 2)
+        self.assertEqual(0, len(empty))
+        self.assertEqual(1, one.get('a'))
+        self.assertEqual(2, two.get('a'))
+        self.assertEqual(1, len(two), "replacing a value does not change the size")
+        self.assertNotIn('a', one.remove('a'))
+        self.assertIn('a', one, "removal leaves the original intact")
+
+    def test_remove(self):
+        m = HAMT()
+        for i in range(1000):
+            m = m.set(i, i)
+        for i in range(0, 1000, 2):
+            m = m.remove(i)
+        self.assertEqual(500, len(m))
+        self.assertEqual(sorted(range(1, 1000, 2)), sorted(k for k, _ in m.items()))
+        self.assertIs(m, m.remove(0), "removing an absent key returns the same map")
+        for i in range(1, 1000, 2):
+            m = m.remove(i)
+        self.assertEqual(0, len(m))
+        self.assertEqual([], list(m.items()))
+
+    def test_collisions(self):
+        m = HAMT()
+        for i in range(5):
+            m = m.set(Colliding(i), i)
+        self.assertEqual(5, len(m))
+        self.assertEqual(3, m.get(Colliding(3)))
+        m = m.remove(Colliding(3))
+        self.assertNotIn(Colliding(3), m)
+        self.assertEqual([0, 1, 2, 4], sorted(v for _, v in m.items()))
+        m = m.set(Colliding(1), 10)
+        self.assertEqual(10, m.get(Colliding(1)))
+        self.assertEqual(4, len(m))
@@ -0,0 +1,107 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+from pyscheme.compiler import match
+import pyscheme.expr as expr
+
+
+def patterns(*fargs) -> list:
+    return [expr.LinkedList.list(list(args)) for args in fargs]
+
+
+class TestMatch(TestCase):
+    def setUp(self):
+        self.f, self.h, self.t = expr.Symbol('f'), expr.Symbol('h'), expr.Symbol('t')
+
+    def test_map(self):
+        tree = match.compile_components(patterns(
+            [self.f, expr.Null()],
+            [self.f, expr.Pair(self.h, self.t)],
+        ), {})
+        self.assertIs(match.Switch, type(tree))
+        self.assertEqual(1, tree.register)
+        self.assertIs(match.LIST, tree.kind)
+        self.assertEqual({True: 0, False: 1}, {key: leaf.index for key, leaf in tree.branches.items()})
+        self.assertIsNone(tree.default)
+
+        registers = [expr.Number(0), expr.LinkedList.list([expr.Number(1), expr.Number(2)])]
+        leaf = match.select(tree, registers)
+        self.assertEqual(1, leaf.index)
+        bound = {symbol: registers[register] for symbol, register in leaf.bindings}
+        self.assertEqual(expr.Number(1), bound[self.h])
+        self.assertEqual(expr.LinkedList.list([expr.Number(2)]), bound[self.t])
+
+        registers = [expr.Number(0), expr.String('ab')]
+        leaf = match.select(tree, registers)
+        self.assertEqual(1, leaf.index, "a string is a pair like any other list")
+        bound = {symbol: registers[register] for symbol, register in leaf.bindings}
+        self.assertEqual(expr.Char('a'), bound[self.h])
+        self.assertEqual(expr.String('b'), bound[self.t])
+
+    def test_constants_and_default(self):
+        n = expr.Symbol('n')
+        tree = match.compile_components(patterns([expr.Number(0)], [expr.Number(1)], [n]), {})
+        self.assertIs(match.CONSTANT, tree.kind)
+        self.assertEqual(0, match.select(tree, [expr.Number(0)]).index)
+        self.assertEqual(1, match.select(tree, [expr.Number(1)]).index)
+        self.assertEqual(2, match.select(tree, [expr.Number(7)]).index)
+
+    def test_constructors(self):
+        red, green = expr.Symbol('red'), expr.Symbol('green')
+        constructors = {red: (0, 0), green: (1, 0)}
+        tree = match.compile_components(patterns([red], [green]), constructors)
+        self.assertIs(match.TAG, tree.kind)
+        self.assertEqual({0: 0, 1: 1}, {key: leaf.index for key, leaf in tree.branches.items()})
+        self.assertEqual(1, match.select(tree, [expr.NamedTuple(green, expr.Null(), 1)]).index)
+        tree = match.compile_components(patterns([red], [green]), {})
+        self.assertIs(match.Leaf, type(tree), 'without constructors the symbols are just variables')
+
+    def test_repeated_variable_is_a_guard(self):
+        item = expr.Symbol('item')
+        tree = match.compile_components(patterns(
+            [item, expr.Null()],
+            [item, expr.Pair(item, self.t)],
+            [item, expr.Pair(expr.Wildcard(), self.t)],
+        ), {})
+        pair = tree.branches[False]
+        self.assertEqual(1, pair.index)
+        self.assertEqual([(0, 2)], pair.guards)
+        self.assertEqual(2, pair.otherwise.index)
+        one_two = expr.LinkedList.list([expr.Number(1), expr.Number(2)])
+        self.assertEqual(1, match.select(tree, [expr.Number(1), one_two]).index)
+        self.assertEqual(2, match.select(tree, [expr.Number(2), one_two]).index)
+
+    def test_no_match(self):
+        tree = match.compile_components(patterns([expr.Null()]), {})
+        self.assertIsNone(match.select(tree, [expr.LinkedList.list([expr.Number(1)])]))
+
+    def test_constructor_tags(self):
+        branch, leaf, n = expr.Symbol('branch'), expr.Symbol('leaf'), expr.Symbol('n')
+        tree = match.compile_components(patterns(
+            [leaf],
+            [expr.NamedTuple(branch, expr.LinkedList.list([expr.Wildcard(), n, expr.Wildcard()]))],
+        ), {branch: (0, 3), leaf: (1, 0)})
+        self.assertEqual({1: 0, 0: 1}, {key: node.index for key, node in tree.branches.items()})
+        registers = [expr.NamedTuple(branch, expr.LinkedList.list([expr.Number(1), expr.Number(2), expr.Number(3)]), 0)]
+        found = match.select(tree, registers)
+        self.assertEqual([(n, 2)], found.bindings)
+        self.assertEqual(expr.Number(2), registers[2])
+
+    def test_unsupported(self):
+        matcher = match.Matcher(patterns([expr.Nothing()]))
+        self.assertIs(False, matcher.tree({}))
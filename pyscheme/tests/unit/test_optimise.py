@@ -0,0 +1,125 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+from pyscheme.compiler import cps, optimise
+import pyscheme.expr as expr
+
+
+def number(n: int) -> cps.CONST:
+    return cps.CONST(expr.Number(n))
+
+
+class TestOptimise(TestCase):
+    def setUp(self):
+        self.passes = optimise.Config.passes
+        self.k = cps.var('k')
+
+    def tearDown(self):
+        optimise.Config.passes = self.passes
+
+    def optimise(self, c: cps.cexp, *passes) -> tuple:
+        optimise.Config.passes = list(passes)
+        optimiser = optimise.Optimiser()
+        return optimiser.optimise(c), optimiser.statistics
+
+    def test_fold_arithmetic(self):
+        w1, w2 = cps.var('w1'), cps.var('w2')
+        c = cps.PRIMOP(cps.primop.add, [number(2), number(3)], [w1], [
+            cps.PRIMOP(cps.primop.mul, [cps.VAR(w1), number(4)], [w2], [cps.APP(cps.VAR(self.k), [cps.VAR(w2)])])
+        ])
+        result, statistics = self.optimise(c, 'fold')
+        self.assertIs(cps.APP, type(result))
+        self.assertEqual(expr.Number(20), result.arguments[0].expr)
+        self.assertEqual({'fold': 2}, statistics.changes)
+
+    def test_fold_leaves_division_by_zero(self):
+        w = cps.var('w')
+        c = cps.PRIMOP(cps.primop.div, [number(1), number(0)], [w], [cps.APP(cps.VAR(self.k), [cps.VAR(w)])])
+        result, statistics = self.optimise(c, 'fold')
+        self.assertIs(cps.PRIMOP, type(result))
+        self.assertEqual({}, statistics.changes)
+
+    def test_fold_branch(self):
+        c = cps.PRIMOP(cps.primop.istrue, [cps.CONST(expr.F())], [], [
+            cps.APP(cps.VAR(self.k), [number(1)]),
+            cps.APP(cps.VAR(self.k), [number(2)]),
+        ])
+        result, _ = self.optimise(c, 'fold')
+        self.assertEqual(expr.Number(2), result.arguments[0].expr)
+
+    def test_propagate_definition(self):
+        env, w = cps.var('env'), cps.var('w')
+        a = expr.Symbol('a')
+        c = cps.PRIMOP(cps.primop.define, [cps.VAR(env), cps.CONST(a), number(5)], [], [
+            cps.PRIMOP(cps.primop.lookup, [cps.VAR(env), cps.CONST(a), cps.INT(0), cps.INT(0)], [w], [
+                cps.APP(cps.VAR(self.k), [cps.VAR(w)])
+            ])
+        ])
+        result, _ = self.optimise(c, 'fold')
+        self.assertIs(cps.primop.define, result.primop)
+        self.assertEqual(expr.Number(5), result.cexps[0].arguments[0].expr)
+
+    def test_contract_function_called_once(self):
+        f, x = cps.var('f'), cps.var('x')
+        c = cps.FIX([(f, [x], cps.APP(cps.VAR(self.k), [cps.VAR(x)]))], cps.APP(cps.VAR(f), [number(1)]))
+        result, statistics = self.optimise(c, 'contract')
+        self.assertIs(cps.APP, type(result))
+        self.assertIs(self.k, result.function.var)
+        self.assertEqual(expr.Number(1), result.arguments[0].expr)
+        self.assertEqual({'contract': 1}, statistics.changes)
+
+    def test_eta_reduce_forwarding_function(self):
+        f, x, g = cps.var('f'), cps.var('x'), cps.var('g')
+        c = cps.FIX([(f, [x], cps.APP(cps.VAR(self.k), [cps.VAR(x)]))],
+                    cps.APP(cps.VAR(g), [cps.VAR(f), cps.VAR(f)]))
+        result, _ = self.optimise(c, 'contract')
+        self.assertIs(cps.APP, type(result), "f is gone")
+        self.assertEqual([self.k, self.k], [arg.var for arg in result.arguments])
+
+    def test_eliminate_unused(self):
+        r, w, f = cps.var('r'), cps.var('w'), cps.var('f')
+        c = cps.RECORD([(number(1), cps.OFFp(0))], r,
+                       cps.PRIMOP(cps.primop.add, [number(1), cps.VAR(self.k)], [w], [
+                           cps.FIX([(f, [], cps.APP(cps.VAR(self.k), []))], cps.APP(cps.VAR(self.k), []))
+                       ]))
+        result, statistics = self.optimise(c, 'eliminate')
+        self.assertIs(cps.APP, type(result))
+        self.assertEqual({'eliminate': 3}, statistics.changes)
+
+    def test_eliminate_keeps_effects(self):
+        env = cps.var('env')
+        c = cps.PRIMOP(cps.primop.define, [cps.VAR(env), cps.CONST(expr.Symbol('a')), number(1)], [], [
+            cps.APP(cps.VAR(self.k), [number(1)])
+        ])
+        result, _ = self.optimise(c, 'eliminate')
+        self.assertIs(cps.PRIMOP, type(result))
+
+    def test_passes_expose_work_for_each_other(self):
+        j, x, w = cps.var('j'), cps.var('x'), cps.var('w')
+        c = cps.FIX([(j, [x], cps.APP(cps.VAR(self.k), [cps.VAR(x)]))],
+                    cps.PRIMOP(cps.primop.lt, [number(1), number(2)], [w], [
+                        cps.PRIMOP(cps.primop.istrue, [cps.VAR(w)], [], [
+                            cps.APP(cps.VAR(j), [number(1)]),
+                            cps.APP(cps.VAR(j), [number(2)]),
+                        ])
+                    ]))
+        result, statistics = self.optimise(c, 'contract', 'fold', 'eliminate')
+        self.assertIs(cps.APP, type(result))
+        self.assertIs(self.k, result.function.var)
+        self.assertEqual(expr.Number(1), result.arguments[0].expr)
+        self.assertGreater(statistics.rounds, 1)
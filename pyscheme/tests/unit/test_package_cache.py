@@ -0,0 +1,207 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+import pyscheme.reader as reader
+import pyscheme.expr as expr
+import pyscheme.package_cache as package_cache
+import pyscheme.inference as inference
+import io
+import os
+import tempfile
+from pathlib import Path
+
+
+class TestPackageCache(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = Path(self.directory.name).joinpath('test.fn')
+        self.write_source('fn double(x) { x * 2 }\nnothing;\n')
+        self.parses = 0
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_source(self, text: str):
+        self.source.write_text(text)
+
+    def get_reader(self, fh) -> reader.Reader:
+        return reader.Reader(reader.Tokeniser(fh), io.StringIO())
+
+    def parse(self) -> list:
+        self.parses += 1
+        contents = []
+        with self.source.open() as fh:
+            parser = self.get_reader(fh)
+            while True:
+                parsed_expr = parser.read()
+                if parsed_expr is None:
+                    return contents
+                contents += [parsed_expr]
+
+    def fetch(self) -> list:
+        return package_cache.PackageCache(self.source).fetch(self.parse, self.get_reader)
+
+    def test_miss_then_hit(self):
+        parsed = self.fetch()
+        cached = self.fetch()
+        self.assertEqual(1, self.parses)
+        self.assertEqual([str(e) for e in parsed], [str(e) for e in cached])
+        self.assertIsNot(parsed[0], cached[0])
+        self.assertIs(expr.Symbol('double'), cached[0]._symbol, "flyweights keep their identity")
+        self.assertIs(expr.Nothing(), cached[1], "singletons keep their identity")
+
+    def test_changed_source(self):
+        self.fetch()
+        self.write_source('fn treble(x) { x * 3 }\n')
+        self.assertIs(expr.Symbol('treble'), self.fetch()[0]._symbol)
+        self.assertEqual(2, self.parses)
+
+    def test_touched_source(self):
+        self.fetch()
+        stat = self.source.stat()
+        os.utime(str(self.source), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.fetch()
+        self.assertEqual(1, self.parses, "unchanged content is still a hit")
+
+    def test_version(self):
+        self.fetch()
+        version = package_cache.VERSION
+        package_cache.VERSION += 1
+        try:
+            self.fetch()
+        finally:
+            package_cache.VERSION = version
+        self.assertEqual(2, self.parses)
+
+    def test_source_digest(self):
+        self.fetch()
+        digest = package_cache.source_digest()
+        package_cache._source_digest = 'a different expr.py'
+        try:
+            self.fetch()
+        finally:
+            package_cache._source_digest = digest
+        self.assertEqual(2, self.parses, "a change to the pickled classes invalidates the entry")
+
+    def test_corrupt_entry(self):
+        self.fetch()
+        path = package_cache.PackageCache(self.source).entry.path
+        path.write_bytes(path.read_bytes()[:20])
+        self.fetch()
+        self.fetch()
+        self.assertEqual(2, self.parses, "a corrupt entry is a miss and is replaced")
+
+    def test_disabled(self):
+        package_cache.Config.enabled = False
+        try:
+            self.fetch()
+            self.fetch()
+        finally:
+            package_cache.Config.enabled = True
+        self.assertEqual(2, self.parses)
+        self.assertFalse(package_cache.PackageCache(self.source).entry.path.exists())
+
+    def test_nested_load(self):
+        self.write_source('load utils.sort as sort;\n')
+        self.fetch()
+        packages = expr.Load.loaded_packages
+        expr.Load.loaded_packages = {}
+        try:
+            load = self.fetch()[0]
+            self.assertIsInstance(load, expr.Load)
+            self.assertTrue(load.loaded(load.packages[0]), "restoring a load loads its packages")
+        finally:
+            expr.Load.loaded_packages = packages
+        self.assertEqual(1, self.parses)
+
+
+class TestTypeCache(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = Path(self.directory.name).joinpath('test.fn')
+        self.source.write_text('fn id(x) { x }\n')
+        parser = reader.Reader(reader.Tokeniser(io.StringIO(self.source.read_text())), io.StringIO())
+        self.body = expr.Sequence(expr.LinkedList.list([parser.read()]))
+        self.analyses = 0
+        self.memo = package_cache.TypeCache.memo
+        package_cache.TypeCache.memo = {}
+
+    def tearDown(self):
+        package_cache.TypeCache.memo = self.memo
+        package_cache.Config.persistent_types = False
+        self.directory.cleanup()
+
+    def fetch(self, parent: inference.TypeEnvironment) -> inference.EnvironmentType:
+        def analyse():
+            self.analyses += 1
+            return expr.Env(self.body, expr.Null()).analyse_internal(parent, set())
+
+        return package_cache.TypeCache(self.source).fetch(self.body, parent, analyse)
+
+    def test_reused(self):
+        expr.Symbol.reset()
+        parent = inference.TypeEnvironment().extend()
+        first = self.fetch(parent)
+        second = self.fetch(parent)
+        self.assertEqual(1, self.analyses)
+        self.assertIsNot(first.env(), second.env())
+        self.assertIs(parent, second.env()._parent, "copies extend the loading program's environment")
+        self.assertEqual('(#a -> #a)', str(first.env()[expr.Symbol('id')]))
+        self.assertEqual('(#b -> #b)', str(second.env()[expr.Symbol('id')]), "copies name their own variables")
+
+    def test_copies_are_independent(self):
+        parent = inference.TypeEnvironment().extend()
+        self.fetch(parent)
+        first = self.fetch(parent).env()[expr.Symbol('id')]
+        second = self.fetch(parent).env()[expr.Symbol('id')]
+        first.unify(inference.Function(inference.TypeOperator('int'), inference.TypeVariable()))
+        self.assertEqual('(int -> int)', str(first))
+        self.assertNotEqual('(int -> int)', str(second))
+
+    def test_rebased(self):
+        self.fetch(inference.TypeEnvironment().extend())
+        parent = inference.TypeEnvironment().extend()
+        self.assertIs(parent, self.fetch(parent).env()._parent)
+        self.assertEqual(1, self.analyses)
+
+    def test_persistent(self):
+        package_cache.Config.persistent_types = True
+        self.fetch(inference.TypeEnvironment().extend())
+        package_cache.TypeCache.memo = {}
+        self.fetch(inference.TypeEnvironment().extend())
+        self.assertEqual(1, self.analyses, "read back from disk")
+        self.source.write_text('fn id(y) { y }\n')
+        package_cache.TypeCache.memo = {}
+        self.fetch(inference.TypeEnvironment().extend())
+        self.assertEqual(2, self.analyses, "invalidated by a change to the source")
+
+    def test_builtins_redefined(self):
+        parser = reader.Reader(reader.Tokeniser(io.StringIO('fn inc(x) { succ(x) }\n')), io.StringIO())
+        self.body = expr.Sequence(expr.LinkedList.list([parser.read()]))
+        succ = inference.Function(inference.TypeOperator('int'), inference.TypeOperator('int'))
+        builtins = inference.TypeEnvironment().extend({expr.Symbol('succ'): succ})
+        self.fetch(builtins.extend())
+        self.fetch(builtins.extend())
+        self.assertEqual(1, self.analyses, "free symbols that are builtins can be cached")
+        parent = builtins.extend()
+        parent[expr.Symbol('succ')] = succ
+        self.fetch(parent)
+        self.fetch(parent)
+        self.assertEqual(3, self.analyses, "not once the program defines them itself")
@@ -18,6 +18,8 @@
 from unittest import TestCase
 import pyscheme.reader as reader
 import io
+import contextlib
+from pathlib import Path
 from pyscheme.exceptions import PySchemeSyntaxError
 
 
@@ -52,6 +54,28 @@ class TestReader(TestCase):
             some garbage } nonsense
             '''
         )
+
+    def test_syntax_error_line(self):
+        parser = reader.Reader(reader.Tokeniser(io.StringIO("1;\n\n2 )")), io.StringIO())
+        parser.read()
+        with self.assertRaises(PySchemeSyntaxError) as context:
+            parser.read()
+        self.assertEqual(3, context.exception.line)
+        self.assertEqual(')', context.exception.next_token)
+
+    def nested(self, depth: int) -> str:
+        """deeply nested fn and switch composite bodies"""
+        if depth == 0:
+            return 'x'
+        return 'fn (x) { switch (x) { (0) { 0 } (y) { %s } } }(x)' % self.nested(depth - 1)
+
+    def test_parse_deeply_nested(self):
+        parser = reader.Reader(reader.Tokeniser(io.StringIO(self.nested(30) + ';')), io.StringIO())
+        self.assertIsNotNone(parser.read())
+
+    def test_too_deeply_nested(self):
+        self.assertSyntaxError(self.nested(200) + ';', "python's recursion limit is reported as a syntax error")
+
     def test_parse_arithmetic(self):
         self.assertParse(
             ["(1 + (2 * 3))"],
@@ -199,3 +223,87 @@ class TestReader(TestCase):
             }
             '''
         )
+
+    def test_uninstrumented(self):
+        parser = reader.Reader(reader.Tokeniser(io.StringIO("1;")), io.StringIO())
+        for name in reader.Reader.traced:
+            self.assertNotIn(name, vars(parser), "uninstrumented reader runs the plain methods")
+
+    def test_debugging(self):
+        output = io.StringIO()
+        reader.Config.debugging = True
+        try:
+            parser = reader.Reader(reader.Tokeniser(io.StringIO("a + 1;")), io.StringIO())
+            with contextlib.redirect_stdout(output):
+                self.assertEqual("(a + 1)", str(parser.read()))
+        finally:
+            reader.Config.debugging = False
+        trace = output.getvalue()
+        self.assertIn("binop_add True caller=binop_cons", trace)
+        self.assertIn("swallow + - caller=binop_add", trace)
+        self.assertIn("read result=(a + 1)", trace)
+
+
+class TestTokeniser(TestCase):
+
+    def tokens(self, tokeniser_class, code):
+        tokeniser = tokeniser_class(io.StringIO(code))
+        result = []
+        while True:
+            token = tokeniser.next_token()
+            result += [(token.line, token.char, token.type, token.value)]
+            if token.type in ('EOF', 'ERROR'):
+                return result
+
+    def assertSameTokens(self, code, message=''):
+        self.assertEqual(
+            self.tokens(reader.RescanTokeniser, code),
+            self.tokens(reader.Tokeniser, code),
+            message
+        )
+
+    def test_tokens(self):
+        self.assertEqual(
+            [(1, 2, 'ID', 'a'), (1, 2, '@@', '@@'), (1, 7, 'STRING', 'b c'), (1, 7, ';', ';'), (1, 7, 'EOF', 'EOF')],
+            self.tokens(reader.Tokeniser, 'a @@ "b c";')
+        )
+
+    def test_same_tokens(self):
+        self.assertSameTokens(
+            """
+            // comment
+            fn foo(a, #t, 'x', '\\n', "s\\"t") { a->b ** c == d // trailing
+                -12abc }
+            """
+        )
+
+    def test_same_error(self):
+        self.assertSameTokens("a $ b")
+
+    def test_same_tokens_in_data(self):
+        data = Path(__file__).parents[3].joinpath('data')
+        for path in data.glob('**/*.fn'):
+            with self.subTest(path=path.name):
+                self.assertSameTokens(path.read_text())
+
+    def test_mark_reset(self):
+        tokeniser = reader.Tokeniser(io.StringIO("fn foo\n(a)"))
+        self.assertIsNone(tokeniser.match('ID'))
+        start = tokeniser.mark()
+        self.assertEqual('fn', tokeniser.match('FN').value)
+        self.assertEqual('foo', tokeniser.match('ID').value)
+        self.assertEqual('(', tokeniser.peek().value)
+        tokeniser.reset(start)
+        self.assertEqual('fn', tokeniser.next_token().value)
+        self.assertEqual(1, tokeniser.line_number())
+        tokeniser.next_token()
+        self.assertEqual(2, tokeniser.line_number(), "line of the next token")
+
+    def test_discard(self):
+        tokeniser = reader.Tokeniser(io.StringIO("a b c"))
+        tokeniser.next_token()
+        tokeniser.next_token()
+        tokeniser.discard()
+        self.assertEqual(0, tokeniser.mark())
+        token = tokeniser.next_token()
+        self.assertEqual((1, 5, 'ID', 'c'), (token.line, token.char, token.type, token.value))
@@ -0,0 +1,90 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+import pyscheme.trampoline as trampoline
+
+
+class TestTrampoline(TestCase):
+    def setUp(self):
+        self.max_depth = trampoline.Config.max_depth
+        trampoline.Config.max_depth = 3
+
+    def tearDown(self):
+        trampoline.Config.max_depth = trampoline.fuel = self.max_depth
+
+    def countdown(self, n, calls):
+        calls.append(n)
+        if n == 0:
+            return None
+        return trampoline.call(self.countdown, n - 1, calls)
+
+    def test_call_bounces_when_fuel_runs_out(self):
+        calls = []
+        trampoline.fuel = 3
+        promise = trampoline.call(self.countdown, 10, calls)
+        self.assertEqual([10, 9, 8], calls, "three direct calls then a promise")
+        bounces = 0
+        while promise is not None:
+            promise = promise()
+            bounces += 1
+        self.assertEqual(list(range(10, -1, -1)), calls)
+        self.assertEqual(2, bounces, "fuel refilled on each bounce")
+
+    def test_bounce(self):
+        calls = []
+        trampoline.fuel = 3
+        promise = trampoline.bounce(self.countdown, 0, calls)
+        self.assertEqual([], calls, "bounce never calls directly")
+        self.assertIsNone(promise())
+        self.assertEqual([0], calls)
+
+
+class TestScheduler(TestCase):
+    def thread(self, label, n, log):
+        def step():
+            log.append(label)
+            if n == 1:
+                return None
+            return self.thread(label, n - 1, log)
+        return step
+
+    def test_round_robin(self):
+        log = []
+        scheduler = trampoline.RoundRobin()
+        scheduler.run([self.thread('a', 3, log), self.thread('b', 2, log)])
+        self.assertEqual(['a', 'b', 'a', 'b', 'a'], log)
+
+    def test_time_slice(self):
+        log = []
+        scheduler = trampoline.RoundRobin(time_slice=2)
+        scheduler.run([self.thread('a', 3, log), self.thread('b', 3, log)])
+        self.assertEqual(['a', 'a', 'b', 'b', 'a', 'b'], log)
+        self.assertEqual(4, scheduler.statistics.turns)
+
+    def test_spawn(self):
+        log = []
+
+        def spawn():
+            return [self.thread('a', 2, log), self.thread('b', 1, log)]
+
+        scheduler = trampoline.RoundRobin(time_slice=10)
+        scheduler.run([spawn])
+        self.assertEqual(['a', 'a', 'b'], log, "spawned threads start after the spawning thread's turn")
+        self.assertEqual(3, scheduler.statistics.threads)
+        self.assertEqual(4, scheduler.statistics.bounces)
+        self.assertEqual(2, scheduler.statistics.max_threads)
@@ -0,0 +1,65 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+from pyscheme.compiler import vm
+import pyscheme.ambivalence as ambivalence
+import pyscheme.environment as environment
+import pyscheme.expr as expr
+
+
+class TestVM(TestCase):
+    def setUp(self):
+        self.machine = vm.Machine(environment.Environment().extend())
+
+    def run_machine(self, e: expr.Expr) -> list:
+        results = []
+
+        def ret(value, amb):
+            results.append(value)
+            return None
+
+        promise = self.machine.compiled(e).eval(self.machine.globals, ret, ambivalence.Amb(lambda: None))
+        while promise is not None:
+            promise = promise()
+        return results
+
+    def opcodes(self) -> list:
+        return [line.split()[1] for line in self.machine.disassemble()]
+
+    def test_conditional(self):
+        self.assertEqual([expr.Number(2)],
+                         self.run_machine(expr.Conditional(expr.F(), expr.Number(1), expr.Number(2))))
+        self.assertEqual(['CONST', 'JFALSE', 'CONST', 'CONTINUE', 'CONST', 'CONTINUE'], self.opcodes(),
+                         "both branches in tail position return, so need no jump")
+
+    def test_sequence(self):
+        self.assertEqual([expr.Number(2)], self.run_machine(expr.Sequence(expr.LinkedList.list([
+            expr.Number(1), expr.Number(2)
+        ]))))
+        self.assertEqual(['CONST', 'CONTINUE'], self.opcodes(), "a constant whose value is dropped isn't evaluated")
+
+    def test_code_is_shared(self):
+        self.run_machine(expr.Number(1))
+        self.run_machine(expr.Number(2))
+        self.assertEqual(['CONST', 'CONTINUE', 'CONST', 'CONTINUE'], self.opcodes())
+
+    def test_failure_is_an_amb(self):
+        outer = ambivalence.Amb(lambda: None, ambivalence.Amb(lambda: None))
+        failure = vm.Failure(self.machine, 0, self.machine.globals, None, (), outer)
+        self.assertIs(outer.cut(), failure.cut())
+        self.assertIsInstance(failure, ambivalence.Amb)
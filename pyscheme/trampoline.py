@@ -0,0 +1,142 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Bounded direct calls between continuations.
+#
+# Returning a promise to the trampoline for every step of evaluation keeps the python stack flat,
+# but costs a closure and a trip round the trampoline each time.
+# Instead each step calls the next directly with `call`, spending one unit of fuel,
+# and only returns a promise when the fuel runs out or at an explicit `bounce`.
+# A bounced promise refills the fuel when the trampoline runs it, with the stack back at the bottom,
+# so the stack never grows by more than Config.max_depth direct calls however long the computation,
+# and tail calls stay safe.
+#
+# Setting Config.max_depth to 0 bounces at every step.
+#
+# The Scheduler classes at the end run the promises, interleaving the threads created by `spawn`.
+
+from collections import deque
+from . import types
+
+
+class Config:
+    max_depth = 100
+    time_slice = 1  # bounces each thread runs for before switching to the next
+
+
+fuel = Config.max_depth
+
+
+def call(fn: callable, *args) -> 'types.Promise':
+    """
+    call fn(*args) now if there is fuel left, otherwise return a promise to call it from the trampoline
+    """
+    global fuel
+    if fuel > 0:
+        fuel -= 1
+        return fn(*args)
+    return bounce(fn, *args)
+
+
+def bounce(fn: callable, *args) -> 'types.Promise':
+    """
+    return a promise to call fn(*args) from the trampoline.
+    used at function application, where chains of direct calls would otherwise be longest
+    """
+    def promise() -> 'types.Promise':
+        global fuel
+        fuel = Config.max_depth
+        return fn(*args)
+    return promise
+
+
+class Statistics:
+    def __init__(self):
+        self.bounces = 0  # promises run by the scheduler
+        self.threads = 0  # threads started, including the first
+        self.turns = 0  # times a thread was given a time slice
+        self.max_threads = 0  # most threads waiting at once
+
+    def __str__(self) -> str:
+        return 'bounces: %d, threads: %d, turns: %d, max threads: %d' % (
+            self.bounces, self.threads, self.turns, self.max_threads
+        )
+
+
+class Scheduler:
+    """
+    Runs threads of promises to completion.
+    A thread is a promise, each time it is run it returns the next promise of the same thread,
+    None if the thread is finished, or a list of promises to replace it with new threads (i.e. `spawn`).
+    Each thread runs for up to `time_slice` bounces before the next waiting thread gets a turn.
+    Subclasses decide which thread that is by implementing add, next and __len__.
+    """
+
+    def __init__(self, time_slice: 'types.Maybe[int]'=None):
+        self.time_slice = Config.time_slice if time_slice is None else time_slice
+        self.statistics = Statistics()
+
+    def add(self, promise: 'types.CallablePromise'):
+        pass
+
+    def next(self) -> 'types.CallablePromise':
+        pass
+
+    def __len__(self) -> int:
+        return 0
+
+    def spawn(self, promises: list):
+        for promise in promises:
+            self.add(promise)
+        self.statistics.threads += len(promises)
+        self.statistics.max_threads = max(self.statistics.max_threads, len(self))
+
+    def run(self, promises: list):
+        self.spawn(promises)
+        statistics = self.statistics
+        time_slice = self.time_slice
+        while len(self) > 0:
+            promise = self.next()
+            statistics.turns += 1
+            for _ in range(time_slice):
+                promise = promise()
+                statistics.bounces += 1
+                if promise is None or type(promise) is list:
+                    break
+            if type(promise) is list:
+                self.spawn(promise)
+            elif promise is not None:
+                self.add(promise)
+
+
+class RoundRobin(Scheduler):
+    """
+    each thread takes its turn in the order it was started
+    """
+
+    def __init__(self, time_slice: 'types.Maybe[int]'=None):
+        super().__init__(time_slice)
+        self.queue = deque()
+
+    def add(self, promise: 'types.CallablePromise'):
+        self.queue.append(promise)
+
+    def next(self) -> 'types.CallablePromise':
+        return self.queue.popleft()
+
+    def __len__(self) -> int:
+        return len(self.queue)
@@ -35,4 +35,7 @@ Continuation = Callable[[Maybe['expr.Expr'], 'Amb'], Promise]
 
 # An Amb (backtracking continuation) is a callable of no arguments that returns a Promise to resume a
 # chronologically previous operation.
-Amb = Callable[[], Promise]
\ No newline at end of file
+Amb = Callable[[], Promise]
+
+# Code is what an Expr compiles to, a callable equivalent to its eval method.
+Code = Callable[['environment.Environment', Continuation, Amb], Promise]
@@ -0,0 +1,465 @@
+# PyScheme lambda language written in Python
+#
+# Copyright (C) 2018  Bill Hails
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import contextlib
+import io
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+import pyscheme.reader as reader
+import pyscheme.expr as expr
+import pyscheme.package_cache as package_cache
+import pyscheme.environment as environment
+import pyscheme.trampoline as trampoline
+from pyscheme.exceptions import PySchemeSyntaxError
+from pyscheme.repl import Repl
+from pyscheme import ambivalence
+from pyscheme.compiler import optimise
+from pyscheme.compiler import match
+
+DATA = Path(__file__).parent.joinpath('data')
+
+
+def sources() -> dict:
+    return {path.name: path.read_text() for path in sorted(DATA.glob('utils/*.fn'))}
+
+
+def best_of(fn: callable, number: int, repeat: int=5) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+
+def report(name: str, baseline: float, candidate: float, extra: str=''):
+    print('  %-16s %10.3fms %10.3fms %8.2fx' % (name, baseline * 1000, candidate * 1000, baseline / candidate), extra)
+
+
+def tokenise(tokeniser_class, text: str) -> int:
+    tokeniser = tokeniser_class(io.StringIO(text))
+    count = 0
+    while tokeniser.next_token().type != 'EOF':
+        count += 1
+    return count
+
+
+def bench_tokeniser():
+    """RescanTokeniser vs. the single-pattern Tokeniser over data/utils/*.fn"""
+    print('%-18s %12s %12s %9s' % ('tokeniser', 'rescan', 'table', 'speedup'))
+    for name, text in sources().items():
+        report(
+            name,
+            best_of(lambda: tokenise(reader.RescanTokeniser, text), 20),
+            best_of(lambda: tokenise(reader.Tokeniser, text), 20)
+        )
+    long_line = ' '.join(['fn(a, b) { a + b * 2 }'] * 400) + ';\n'
+    report(
+        'one long line',
+        best_of(lambda: tokenise(reader.RescanTokeniser, long_line), 2),
+        best_of(lambda: tokenise(reader.Tokeniser, long_line), 2)
+    )
+
+
+def parse(text: str) -> int:
+    parser = reader.Reader(reader.Tokeniser(io.StringIO(text)), io.StringIO())
+    count = 0
+    while parser.read() is not None:
+        count += 1
+    return count
+
+
+def parsable_sources() -> dict:
+    result = {}
+    for name, text in sources().items():
+        try:
+            parse(text)
+        except PySchemeSyntaxError as e:
+            print('  skipping %s: %s' % (name, e))
+        else:
+            result[name] = text
+    return result
+
+
+def parse_debugging(text: str) -> int:
+    reader.Config.debugging = True
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return parse(text)
+    finally:
+        reader.Config.debugging = False
+
+
+def bench_reader():
+    """parse data/utils/*.fn with Config.debugging off and on"""
+    parser = reader.Reader(reader.Tokeniser(io.StringIO('')), io.StringIO())
+    overrides = [name for name in reader.Reader.traced if name in vars(parser)]
+    print('instrumented methods with debugging off: %d' % len(overrides))
+    texts = parsable_sources()
+    print('%-18s %12s %12s %9s' % ('reader', 'debugging', 'plain', 'speedup'))
+    for name, text in texts.items():
+        report(name, best_of(lambda: parse_debugging(text), 5), best_of(lambda: parse(text), 5))
+
+
+def load(package: str, cached: bool) -> int:
+    expr.Load.loaded_packages = {}
+    package_cache.Config.enabled = cached
+    try:
+        parse('load ' + package + ';')
+    finally:
+        package_cache.Config.enabled = True
+    return len(expr.Load.loaded_packages)
+
+
+def bench_package_cache():
+    """load packages by parsing vs. from the on-disk cache"""
+    print('%-18s %12s %12s %9s' % ('load', 'parse', 'cached', 'speedup'))
+    for package in ('utils.compiler', 'utils.sort', 'utils.lists'):
+        load(package, True)  # make sure the cache is populated
+        report(package, best_of(lambda: load(package, False), 5), best_of(lambda: load(package, True), 5))
+
+
+def type_check(text: str, cached: bool) -> int:
+    repl = Repl(io.StringIO(text), io.StringIO(), io.StringIO())
+    package_cache.Config.enabled = cached
+    try:
+        count = 0
+        while True:
+            parsed = repl.reader.read()
+            if parsed is None:
+                return count
+            parsed.analyse(repl.type_env)
+            count += 1
+    finally:
+        package_cache.Config.enabled = True
+
+
+def bench_type_cache():
+    """type-check programs that load packages, inferring the packages each time vs. re-using their types"""
+    loads = '{ load utils.sort as sort; load utils.lists as lists; lists.map(1+, sort.qsort([3, 1, 2])); }\n'
+    print('%-18s %12s %12s %9s' % ('type check', 'inferred', 'cached', 'speedup'))
+    for count in (1, 12):
+        text = loads * count
+        report(str(count) + ' x 2 loads', best_of(lambda: type_check(text, False), 5), best_of(lambda: type_check(text, True), 5))
+
+
+def evaluate(text: str, resolve: bool, compile: bool=False, convert: bool=False, machine: bool=False) -> tuple:
+    """
+    read, analyse and evaluate, with or without resolving symbols to lexical addresses
+    and compiling the result to closures, converting it to CPS or compiling it for the register machine.
+    returns the output and the number of trampoline bounces
+    """
+    output = io.StringIO()
+    repl = Repl(io.StringIO(''), output, io.StringIO())
+    parser = reader.Reader(reader.Tokeniser(io.StringIO(text)), io.StringIO())
+    bounces = 0
+    while True:
+        parsed = parser.read()
+        if parsed is None:
+            return output.getvalue(), bounces
+        parsed.analyse(repl.type_env)
+        if resolve:
+            parsed = parsed.resolved()
+        if compile:
+            parsed = parsed.compiled()
+        if convert:
+            parsed = repl.converter.compiled(parsed)
+        if machine:
+            parsed = repl.machine.compiled(parsed)
+        thunk = parsed.eval(repl.env, lambda value, amb: repl.print(value, lambda v, a: None, amb), ambivalence.Amb(lambda: None))
+        while thunk is not None:
+            thunk = thunk()
+            bounces += 1
+
+
+def nested_closures(depth: int, n: int) -> str:
+    """a loop referring to the arguments of each of `depth` enclosing functions"""
+    args = ['a' + str(i) for i in range(depth)]
+    text = 'fn loop(n) { if (n == 0) { 0 } else { %s + loop(n - 1) } } loop(%d)' % (' + '.join(args), n)
+    for arg in reversed(args):
+        text = 'fn (%s) { %s }(1)' % (arg, text)
+    return text + ';'
+
+
+programs = {
+    'fib(15)': 'fn fib { (0) { 0 } (1) { 1 } (n) { fib(n - 1) + fib(n - 2) } } fib(15);',
+    'qsort 200': '{ load utils.sort as sort; sort.qsort([%s]); }' % ', '.join(str((i * 7919) % 1000) for i in range(200)),
+    'nested 2': nested_closures(2, 300),
+    'nested 8': nested_closures(8, 300),
+}
+
+
+def bench_lexical():
+    """evaluation with symbols looked up by name vs. by lexical address"""
+    print('%-18s %12s %12s %9s %12s %12s' % ('evaluate', 'by name', 'addressed', 'speedup', 'bounces', 'addressed'))
+    for name, text in programs.items():
+        by_name, by_address = evaluate(text, False), evaluate(text, True)
+        assert by_name[0] == by_address[0]
+        report(name, best_of(lambda: evaluate(text, False), 3), best_of(lambda: evaluate(text, True), 3),
+               '%12d %12d' % (by_name[1], by_address[1]))
+
+
+def bench_compile():
+    """evaluating the expression tree vs. the closures it compiles to"""
+    texts = dict(programs)
+    texts['tak'] = (
+        'fn tak(x, y, z) { if (y < x) { tak(tak(x - 1, y, z), tak(y - 1, z, x), tak(z - 1, x, y)) } else { z } }'
+        ' tak(12, 8, 4);'
+    )
+    print('%-18s %12s %12s %9s' % ('evaluate', 'tree', 'compiled', 'speedup'))
+    for name, text in texts.items():
+        assert evaluate(text, True)[0] == evaluate(text, True, True)[0]
+        report(name, best_of(lambda: evaluate(text, True), 3), best_of(lambda: evaluate(text, True, True), 3))
+
+
+def bench_cps():
+    """compiled closures vs. CPS conversion run on the machine"""
+    texts = dict(programs)
+    texts['tak'] = (
+        'fn tak(x, y, z) { if (y < x) { tak(tak(x - 1, y, z), tak(y - 1, z, x), tak(z - 1, x, y)) } else { z } }'
+        ' tak(12, 8, 4);'
+    )
+    texts['amb'] = (
+        'fn one_of { ([]) { back } (h @ t) { h then one_of(t) } }'
+        ' { x = one_of([%s]); y = one_of([1, 2, 3]); if (x * y < 900) { back } else { [x, y] } }'
+        % ', '.join(str(i) for i in range(400))
+    )
+    print('%-18s %12s %12s %9s' % ('evaluate', 'compiled', 'cps', 'speedup'))
+    for name, text in texts.items():
+        assert evaluate(text, True, True)[0] == evaluate(text, True, convert=True)[0]
+        report(name, best_of(lambda: evaluate(text, True, True), 3), best_of(lambda: evaluate(text, True, convert=True), 3))
+
+
+def bench_vm():
+    """compiled closures vs. the register machine"""
+    texts = dict(programs)
+    texts['tak'] = (
+        'fn tak(x, y, z) { if (y < x) { tak(tak(x - 1, y, z), tak(y - 1, z, x), tak(z - 1, x, y)) } else { z } }'
+        ' tak(12, 8, 4);'
+    )
+    texts['amb'] = (
+        'fn one_of { ([]) { back } (h @ t) { h then one_of(t) } }'
+        ' { x = one_of([%s]); y = one_of([1, 2, 3]); if (x * y < 900) { back } else { [x, y] } }'
+        % ', '.join(str(i) for i in range(400))
+    )
+    print('%-18s %12s %12s %9s' % ('evaluate', 'compiled', 'vm', 'speedup'))
+    for name, text in texts.items():
+        assert evaluate(text, True, True)[0] == evaluate(text, True, machine=True)[0]
+        report(name, best_of(lambda: evaluate(text, True, True), 3), best_of(lambda: evaluate(text, True, machine=True), 3))
+
+
+def bench_optimise():
+    """CPS with and without the optimisation passes"""
+    texts = dict(programs)
+    texts['arithmetic'] = (
+        'fn f(n) { if (n == 0) { 0 } else { { a = 2 * 3 + 4; b = a * 5 - 1; b + f(n - 1) } } } f(2000);'
+    )
+    passes = optimise.Config.passes
+    print('%-18s %12s %12s %9s' % ('cps', 'plain', 'optimised', 'speedup'))
+    try:
+        for name, text in texts.items():
+            optimise.Config.passes = []
+            plain = best_of(lambda: evaluate(text, True, convert=True), 3)
+            optimise.Config.passes = passes
+            report(name, plain, best_of(lambda: evaluate(text, True, convert=True), 3))
+    finally:
+        optimise.Config.passes = passes
+
+
+def bench_match():
+    """composite functions trying each component in turn vs. a decision tree"""
+    texts = {
+        'fib(15)': programs['fib(15)'],
+        'qsort 200': programs['qsort 200'],
+        'member': '{ load utils.lists as lists; fn loop { (0) { 0 } (n) { lists.member(n, %s); loop(n - 1) } } loop(100); }'
+                  % str(list(range(0, 60, 2))),
+        'colours': 'typedef colour { red | green | blue | cyan | magenta | yellow | black | white }'
+                   ' fn rgb { (red) { 1 } (green) { 2 } (blue) { 3 } (cyan) { 4 } (magenta) { 5 } (yellow) { 6 }'
+                   ' (black) { 7 } (white) { 8 } }'
+                   ' fn loop { (0, a) { a } (n, a) { loop(n - 1, a + rgb(white) + rgb(black)) } } loop(500, 0);',
+        'tree': 'typedef tree(#t) { branch(tree(#t), #t, tree(#t)) | leaf }'
+                ' fn insert { (t, leaf) { branch(leaf, t, leaf) } (t, x = branch(l, u, r)) {'
+                ' if (t < u) { branch(insert(t, l), u, r) } else if (t == u) { x } else { branch(l, u, insert(t, r)) } } }'
+                ' fn build { ([], t) { t } (h @ r, t) { build(r, insert(h, t)) } }'
+                ' build([%s], leaf);' % ', '.join(str((i * 7919) % 1000) for i in range(200)),
+    }
+    enabled = match.Config.enabled
+    print('%-18s %12s %12s %9s' % ('evaluate', 'in turn', 'tree', 'speedup'))
+    try:
+        for name, text in texts.items():
+            match.Config.enabled = False
+            in_turn = evaluate(text, True, True)
+            time_in_turn = best_of(lambda: evaluate(text, True, True), 3)
+            match.Config.enabled = True
+            assert in_turn[0] == evaluate(text, True, True)[0]
+            report(name, time_in_turn, best_of(lambda: evaluate(text, True, True), 3))
+    finally:
+        match.Config.enabled = enabled
+
+
+def bench_strings():
+    """string literals as lists of Char built pair by pair vs. python strs taken apart on demand"""
+    text = ' '.join('the quick brown fox jumps over the lazy dog' for _ in range(8))  # much longer and the pairs hit the recursion limit
+    texts = {
+        'print': 'fn loop { (0) { 0 } (n) { print("%s"); loop(n - 1) } } loop(50);' % text,
+        'append': 'fn loop { (0, s) { length(s) } (n, s) { loop(n - 1, s @@ "%s") } } loop(20, "");' % text[:200],
+        'count': 'fn count { ([], n) { n } (_ @ t, n) { count(t, n + 1) } } count("%s", 0);' % text,
+        'compare': 'fn loop { (0) { 0 } (n) { if ("%s" == "%s") { loop(n - 1) } else { 1 } } } loop(200);'
+                   % (text, text),
+    }
+    strings = expr.Config.strings
+    print('%-18s %12s %12s %9s' % ('evaluate', 'pairs', 'strings', 'speedup'))
+    try:
+        for name, text in texts.items():
+            expr.Config.strings = False
+            pairs = evaluate(text, True, True)
+            time_pairs = best_of(lambda: evaluate(text, True, True), 3)
+            expr.Config.strings = True
+            assert pairs[0] == evaluate(text, True, True)[0]
+            report(name, time_pairs, best_of(lambda: evaluate(text, True, True), 3))
+    finally:
+        expr.Config.strings = strings
+
+
+def frame_size(frame: environment.Frame) -> int:
+    size = sys.getsizeof(frame) + sys.getsizeof(frame._values)
+    if getattr(frame, '__dict__', None) is not None:
+        size += sys.getsizeof(frame.__dict__)
+    if frame._dictionary is not None:
+        size += sys.getsizeof(frame._dictionary)
+    return size
+
+
+def peak_memory(text: str) -> int:
+    """peak memory allocated while evaluating text, after it has been read and analysed"""
+    repl = Repl(io.StringIO(''), io.StringIO(), io.StringIO())
+    parser = reader.Reader(reader.Tokeniser(io.StringIO(text)), io.StringIO())
+    statements = []
+    while True:
+        parsed = parser.read()
+        if parsed is None:
+            break
+        parsed.analyse(repl.type_env)
+        statements.append(parsed.resolved())
+    tracemalloc.start()
+    try:
+        for statement in statements:
+            thunk = statement.eval(repl.env, lambda value, amb: None, ambivalence.Amb(lambda: None))
+            while thunk is not None:
+                thunk = thunk()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_frames():
+    """cost of creating and searching environment frames"""
+    a, b = expr.Symbol('a'), expr.Symbol('b')
+    layout = environment.Layout((a, b))
+    root = environment.Environment().extend()
+    frame = root.extend(layout=layout)
+    frame.non_eval_context_define(a, expr.Constant(1))
+    print('frame with two slots: %d bytes' % frame_size(frame))
+    print('create frame:      %8.3fus' % (best_of(lambda: root.extend(layout=layout), 100000) * 1e6))
+    print('look up a slot:    %8.3fus' % (best_of(lambda: frame.value_at(a, 0, 0), 100000) * 1e6))
+    print('look up by name:   %8.3fus' % (best_of(lambda: frame.local(a), 100000) * 1e6))
+    for name in ('qsort 200', 'fib(15)'):
+        print('peak memory %-10s %8.1fKiB' % (name, peak_memory(programs[name]) / 1024))
+
+
+def evaluate_bouncing(text: str, max_depth: int) -> tuple:
+    trampoline.Config.max_depth = max_depth
+    trampoline.fuel = max_depth
+    try:
+        return evaluate(text, True)
+    finally:
+        trampoline.Config.max_depth = trampoline.fuel = 100
+
+
+def bench_trampoline():
+    """bouncing every step off the trampoline vs. direct calls between continuations"""
+    print('%-18s %12s %12s %9s %12s %12s' % ('evaluate', 'bounce', 'direct', 'speedup', 'bounces', 'direct'))
+    for name, text in programs.items():
+        bouncing, direct = evaluate_bouncing(text, 0), evaluate(text, True)
+        assert bouncing[0] == direct[0]
+        report(name, best_of(lambda: evaluate_bouncing(text, 0), 3), best_of(lambda: evaluate(text, True), 3),
+               '%12d %12d' % (bouncing[1], direct[1]))
+
+
+class ListScheduler(trampoline.Scheduler):
+    """the scheduler Repl.trampoline used to have, a list popped from the front"""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def add(self, promise):
+        self.threads += [promise]
+
+    def next(self):
+        return self.threads.pop(0)
+
+    def __len__(self):
+        return len(self.threads)
+
+
+def fan_out(depth: int) -> str:
+    return (
+        'fn fan(n) { if (n == 0) { 0 } else if (spawn) { fan(n - 1) } else { fan(n - 1) } } fan(%d);' % depth
+    )
+
+
+def run_scheduled(text: str, scheduler: trampoline.Scheduler) -> trampoline.Statistics:
+    Repl(io.StringIO(text), io.StringIO(), io.StringIO(), scheduler).run()
+    return scheduler.statistics
+
+
+def bench_scheduler():
+    """threads in a list popped from the front vs. a round-robin deque"""
+    print('%-18s %12s %12s %9s' % ('spawn', 'list', 'deque', 'speedup'))
+    for depth in (8, 12, 14):
+        text = fan_out(depth)
+        report(
+            str(2 ** depth) + ' threads',
+            best_of(lambda: run_scheduled(text, ListScheduler()), 1, 3),
+            best_of(lambda: run_scheduled(text, trampoline.RoundRobin()), 1, 3)
+        )
+    print('  ' + str(run_scheduled(fan_out(14), trampoline.RoundRobin())))
+
+
+benchmarks = {
+    'tokeniser': bench_tokeniser,
+    'reader': bench_reader,
+    'package_cache': bench_package_cache,
+    'type_cache': bench_type_cache,
+    'lexical': bench_lexical,
+    'frames': bench_frames,
+    'trampoline': bench_trampoline,
+    'scheduler': bench_scheduler,
+    'compile': bench_compile,
+    'cps': bench_cps,
+    'optimise': bench_optimise,
+    'vm': bench_vm,
+    'match': bench_match,
+    'strings': bench_strings,
+}
+
+
+def run(names: list):
+    for name in names or benchmarks.keys():
+        benchmarks[name]()
+        print()
+
+
+run(sys.argv[1:])